@@ -1,42 +1,227 @@
 # Import necessary libraries
 import os
+import csv
+import json
 import math
+import time
 import hashlib
+import functools
 import random
 import sqlite3
-from flask import Flask, render_template, request, redirect, url_for, session, flash
-from werkzeug.security import generate_password_hash, check_password_hash
-from qiskit import QuantumCircuit
-from qiskit_aer import AerSimulator
-from qiskit.compiler import transpile
+import itertools
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+import click
+from flask import (Flask, render_template, request, redirect, url_for, session, flash, g, jsonify, abort, Response,
+                   make_response, stream_with_context)
+from backends import BACKENDS
+from ballots import BallotStore
+from events import ELECTION_EVENTS
+from hashing import HASHER, HasherBusy, hash_password
+from jobs import StateKeyedJob, create_jobs_table
+from ledger import (BALLOT_INDEX, BallotIndex, append_entries, circuit_digest, create_ledger_tables, head_block,
+                    inclusion_proof, seal_blocks, verification_report, verify_chain, verify_proof)
+from snapshots import RESULTS_CACHE
+from metrics import (CIRCUIT_BUILD_SECONDS, DB_QUERY_SECONDS, METRICS, TALLY_SECONDS, VOTES_CAST_TOTAL,
+                     instrument_app)
+from tally import (CIRCUIT_CACHE, DEFAULT_CONFIDENCE, DEFAULT_ESTIMATE_SHOTS, MAX_ESTIMATE_SHOTS, TALLY_SHARD_SIZE,
+                   ballot_uniforms, derive_seed, estimate_counts, new_seed, outcome_distribution, register_width,
+                   sample_ballots, sample_outcomes, shots_for_margin, tally_shard, vote_pattern)
 
 # Assuming the app.py is inside the 'src' directory
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # Get the directory of the current file (src folder)
-DATABASE_PATH = os.path.join(BASE_DIR, 'db', 'votes.db')  # Set the database path inside the src folder
+DATABASE_PATH = os.environ.get('QVOTE_DATABASE',  # Allow benchmarks and deployments to point elsewhere
+                               os.path.join(BASE_DIR, 'db', 'votes.db'))  # Set the database path inside the src folder
+
+# Level of the app's log messages; per-ballot messages are DEBUG, so the hot path stays quiet by default
+LOG_LEVEL = os.environ.get('QVOTE_LOG_LEVEL', 'WARNING').upper()
+logging.basicConfig(level=LOG_LEVEL, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+log = logging.getLogger(__name__)
+
+# SQLite connection tuning
+SQLITE_BUSY_TIMEOUT_MS = 5000  # How long a writer waits for the database lock before failing
+SQLITE_STATEMENT_CACHE_SIZE = 256  # Prepared statements kept per pooled connection
+
+# Bulk import tuning
+IMPORT_BATCH_SIZE = 10000  # Rows inserted per transaction
+IMPORT_HASH_CHUNK = 64  # Passwords sent to a hashing process at a time
+IMPORT_LOOKUP_CHUNK = 500  # Usernames per IN (...) lookup, below SQLite's variable limit
+
+# Election used when none is selected; databases from before multi-election support get it too
+DEFAULT_ELECTION_ID = 1
+DEFAULT_ELECTION_NAME = 'General Election'
+DEFAULT_CANDIDATES = ['Candidate 1', 'Candidate 2', 'Candidate 3', 'Candidate 4']
+MAX_CANDIDATES = 1024  # Keeps vote registers at 10 qubits or fewer
+
+# Number of vote circuits submitted to the simulator in a single batched tally job
+TALLY_CHUNK_SIZE = 1000
+
+# Ballots read per keyset page of votes JOIN users, and tallied at a time by recounts and rebuilds
+BALLOT_BATCH_SIZE = 1000
+
+# Live results streams: seconds between keep-alive comments, and how long one connection is held
+# before the browser is asked to reconnect (so a stream never pins a worker thread forever)
+STREAM_KEEPALIVE_SECONDS = 15
+STREAM_MAX_SECONDS = 300
+STREAM_RETRY_MS = 1000
+
+# Statement kinds the query histogram is labelled with; anything else is counted as OTHER
+SQL_STATEMENT_KINDS = {'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'BEGIN', 'COMMIT', 'ROLLBACK', 'CREATE', 'DROP',
+                       'ALTER', 'PRAGMA', 'WITH'}
 
 # Initialize Flask App
 app = Flask(__name__)
 app.secret_key = 'your_secret_key'
+instrument_app(app)  # Request and template timings, served with the rest at /metrics
 
-# Update the get_db_connection function
-def get_db_connection():
-    conn = sqlite3.connect(DATABASE_PATH)  # Connect using the absolute path
+# Per-thread connection pool, so each worker thread reuses one tuned connection across requests
+_connection_pool = threading.local()
+# Databases this process has brought up to date, see get_db_connection
+_migrated_databases = set()
+_migration_lock = threading.Lock()
+
+class TimedConnection(sqlite3.Connection):
+    """SQLite connection recording how long each statement takes in the query histogram."""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return sqlite3.Connection.execute(self, sql, parameters)
+        finally:
+            query_series(sql).observe(time.perf_counter() - start)
+
+    def executemany(self, sql, parameters):
+        start = time.perf_counter()
+        try:
+            return sqlite3.Connection.executemany(self, sql, parameters)
+        finally:
+            query_series(sql).observe(time.perf_counter() - start)
+
+@functools.lru_cache(maxsize=SQLITE_STATEMENT_CACHE_SIZE)
+def query_series(sql):
+    """The query histogram series of an SQL statement, labelled with its leading keyword."""
+    words = sql.lstrip()[:8].split(None, 1)
+    kind = words[0].upper() if words else ''
+    return DB_QUERY_SECONDS.labels(statement=kind if kind in SQL_STATEMENT_KINDS else 'OTHER')
+
+def open_db_connection():
+    """Open a new SQLite connection with WAL journaling and the pool's pragmas."""
+    conn = sqlite3.connect(DATABASE_PATH,  # Connect using the absolute path
+                           timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+                           cached_statements=SQLITE_STATEMENT_CACHE_SIZE,
+                           factory=TimedConnection)
     conn.row_factory = sqlite3.Row
+    # WAL lets readers proceed while a vote is being written; NORMAL sync is durable in WAL mode
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute(f'PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}')
     return conn
 
+def get_db_connection():
+    """Return this thread's pooled connection, bound to the current app context."""
+    if 'db' not in g:
+        pooled = getattr(_connection_pool, 'entry', None)
+        # Connections must not cross a fork (gunicorn workers) or a change of database
+        if pooled is None or pooled[0] != (os.getpid(), DATABASE_PATH):
+            migrate_once()
+            pooled = ((os.getpid(), DATABASE_PATH), open_db_connection())
+            _connection_pool.entry = pooled
+        g.db = pooled[1]
+    return g.db
+
+@app.teardown_appcontext
+def release_db_connection(exception):
+    """Return the connection to the pool, discarding any uncommitted work."""
+    conn = g.pop('db', None)
+    if conn is not None and conn.in_transaction:
+        conn.rollback()
+
+def migrate_once():
+    """Run create_tables the first time this process connects to a database.
+
+    Gunicorn workers and flask CLI commands then never meet a database missing tables, while
+    importing the app (e.g. to time it) leaves the database alone; `flask init-db` migrates up front.
+    """
+    with _migration_lock:
+        if DATABASE_PATH not in _migrated_databases:
+            create_tables()
+            _migrated_databases.add(DATABASE_PATH)
+
 def create_tables():
-    conn = get_db_connection()
+    """Create or upgrade the schema, in one transaction so app processes starting together take turns."""
+    conn = open_db_connection()
+    conn.execute('BEGIN IMMEDIATE')
     conn.execute('''CREATE TABLE IF NOT EXISTS users (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     username TEXT NOT NULL UNIQUE,
                     password TEXT NOT NULL,
                     has_voted BOOLEAN NOT NULL DEFAULT 0)''')
 
+    # Elections and their ordered candidate lists; turnout is maintained by the vote handler, the seed
+    # makes the election's quantum tally reproducible and every change to the results bumps the
+    # version and stamps modified_at, see results()
+    conn.execute('''CREATE TABLE IF NOT EXISTS elections (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL UNIQUE,
+                    turnout INTEGER NOT NULL DEFAULT 0,
+                    seed INTEGER NOT NULL,
+                    version INTEGER NOT NULL DEFAULT 0,
+                    modified_at REAL)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS candidates (
+                    election_id INTEGER NOT NULL,
+                    position INTEGER NOT NULL,
+                    name TEXT NOT NULL,
+                    PRIMARY KEY (election_id, position),
+                    FOREIGN KEY (election_id) REFERENCES elections (id))''')
+
     conn.execute('''CREATE TABLE IF NOT EXISTS votes (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     user_id INTEGER NOT NULL,
                     candidate INTEGER NOT NULL,
+                    election_id INTEGER NOT NULL DEFAULT 1,
                     FOREIGN KEY (user_id) REFERENCES users (id))''')
+    # Votes cast before multi-election support belong to the default election
+    vote_columns = [row['name'] for row in conn.execute('PRAGMA table_info(votes)')]
+    if 'election_id' not in vote_columns:
+        conn.execute(f'ALTER TABLE votes ADD COLUMN election_id INTEGER NOT NULL DEFAULT {DEFAULT_ELECTION_ID}')
+
+    # Measured quantum outcome counts per election, updated by every cast vote
+    conn.execute('''CREATE TABLE IF NOT EXISTS tallies (
+                    election_id INTEGER NOT NULL,
+                    candidate INTEGER NOT NULL,
+                    count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (election_id, candidate))''')
+
+    # Indexes for the hot queries; the unique one also makes casting a second vote impossible
+    # The old check-then-insert could record a vote twice: keep each user's first vote, recounted below
+    duplicate_votes = conn.execute('''DELETE FROM votes WHERE id NOT IN (
+                                          SELECT MIN(id) FROM votes GROUP BY election_id, user_id)''').rowcount
+    if duplicate_votes:
+        log.warning("Removed %d duplicate vote(s) cast before votes were unique per user", duplicate_votes)
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_votes_election_user ON votes (election_id, user_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_votes_election_candidate ON votes (election_id, candidate)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_votes_election_id ON votes (election_id, id)')  # Keyset pages
+
+    # Append-only ledger of every cast ballot, see ledger.py
+    create_ledger_tables(conn)
+    # State of the background recounts, shared by every app process, see jobs.py
+    create_jobs_table(conn)
+
+    if conn.execute('SELECT COUNT(*) FROM elections').fetchone()[0] == 0:
+        create_election(conn, DEFAULT_ELECTION_NAME, DEFAULT_CANDIDATES, election_id=DEFAULT_ELECTION_ID)
+
+    # Votes cast before the ledger existed are recorded once, in the order they were cast
+    if conn.execute('SELECT COUNT(*) FROM ledger_entries').fetchone()[0] == 0:
+        backfill_ledger(conn)
+
+    # Databases created before the tallies table existed need their tallies computed once, as do
+    # tallies that still count removed duplicate votes
+    tally_rows = conn.execute('SELECT COUNT(*) FROM tallies').fetchone()[0]
+    vote_rows = conn.execute('SELECT COUNT(*) FROM votes').fetchone()[0]
+    if (tally_rows == 0 and vote_rows > 0) or duplicate_votes:
+        rebuild_tally(conn)
     conn.commit()
     conn.close()
 
@@ -56,7 +241,7 @@ class Voter:
         """Encode the vote using quantum mechanics, superposition, and entanglement."""
         total_approvals = sum(vote)  # Count total approvals
         if total_approvals == 0:
-            print(f"{self.voter_id} has not approved any candidates, assigning default vote.")
+            log.debug("%s has not approved any candidates, assigning default vote.", self.voter_id)
             # Assign a default vote (e.g., approve the first candidate)
             vote[0] = 1
             total_approvals = 1  # Update total approvals to prevent division by zero
@@ -65,65 +250,217 @@ class Voter:
         n = 1 / math.sqrt(total_approvals)  # Normalization factor
         normalized_vote = [i * n for i in vote]
 
-        # Initialize a 2-qubit quantum circuit (since there are 4 candidates)
-        qc = QuantumCircuit(2, 2, name='Vote')  # 2 classical bits for measurement
-        qc.initialize(normalized_vote, [0, 1])
+        from qiskit import QuantumCircuit  # Imported on first use, see warmup.py
+
+        # Initialize a quantum circuit wide enough for every candidate (2 qubits for 4 candidates)
+        num_qubits = register_width(len(vote))
+        qc = QuantumCircuit(num_qubits, num_qubits, name='Vote')  # One classical bit per qubit for measurement
+
+        approved = [candidate for candidate, approval in enumerate(vote) if approval]
+        if len(approved) == 1:
+            # Sparse state preparation: a single approval is just the basis state |candidate>
+            for qubit in range(num_qubits):
+                if approved[0] >> qubit & 1:
+                    qc.x(qubit)
+        else:
+            # Spread the amplitude over every approved candidate, padding unused basis states with 0
+            qc.initialize(normalized_vote + [0] * (2 ** num_qubits - len(vote)), range(num_qubits))
 
         # Measure the qubits and store the result in classical bits
-        qc.measure([0, 1], [0, 1])  # Measure qubits and store in classical bits 0 and 1
+        qc.measure(range(num_qubits), range(num_qubits))
 
         return qc
 
     def sign_vote(self, vote_circuit):
         """Signs the vote using a signature method."""
-        sign_circuit = QuantumCircuit(2, name='Signature')
+        from qiskit import QuantumCircuit  # Imported on first use, see warmup.py
+
+        sign_circuit = QuantumCircuit(vote_circuit.num_qubits, name='Signature')
         sign_circuit.z(0)
-        sign_circuit.x(1)
+        sign_circuit.x(min(1, vote_circuit.num_qubits - 1))
 
         # Use compose method to combine circuits
         signed_vote = vote_circuit.compose(sign_circuit)
         return signed_vote
 
+    def signed_vote_circuit(self, vote):
+        """Returns the encoded and signed circuit for the vote, shared between voters with the same vote."""
+        pattern = vote_pattern(vote)
+
+        def build():
+            with CIRCUIT_BUILD_SECONDS.time():
+                signed_vote = self.sign_vote(self.encode_vote(list(vote)))
+            signed_vote.metadata = {'vote': pattern}  # Lets the tally reuse cached compilations
+            return signed_vote
+
+        return CIRCUIT_CACHE.get((pattern, None), build)
+
 # Tallyman Class
 class Tallyman:
-    def __init__(self):
-        self.voter_database = {}  # Store hash IDs and votes
+    def __init__(self, num_candidates=len(DEFAULT_CANDIDATES), seed=None):
+        self.num_candidates = num_candidates  # Number of candidates in the election being tallied
+        self.seed = seed  # Election seed; makes voter IDs and measurements reproducible
+        self.voter_database = BallotStore()  # Store hash IDs and votes
 
     def issue_voter_id(self, voter_name):
         """Issue a unique voter ID and generate secret keys."""
-        voter_id = f"{voter_name}_{random.randint(1000,9999)}"
-        secret_key_AB = bin(random.getrandbits(4))[2:].zfill(4)
-        secret_key_AC = bin(random.getrandbits(4))[2:].zfill(4)
+        # With an election seed the ID only depends on the seed and the voter, so a recount reissues it
+        rng = random if self.seed is None else random.Random(f"{self.seed}:{voter_name}")
+        voter_id = f"{voter_name}_{rng.randint(1000,9999)}"
+        secret_key_AB = bin(rng.getrandbits(4))[2:].zfill(4)
+        secret_key_AC = bin(rng.getrandbits(4))[2:].zfill(4)
         return voter_id, secret_key_AB, secret_key_AC
 
     def store_vote(self, hash_id, vote_circuit):
         """Store the vote in the database."""
-        self.voter_database[hash_id] = vote_circuit
-
-    def tally_votes(self):
-        """Tally votes and return the results."""
-        results = {0: 0, 1: 0, 2: 0, 3: 0}  # Initialize counts for candidates 1 to 4
-
-        # Initialize the Aer simulator
-        simulator = AerSimulator()
-
-        # Count the votes based on the stored circuits
-        for hash_id, vote_circuit in self.voter_database.items():
-            # Transpile the circuit for the simulator
-            compiled_circuit = transpile(vote_circuit, simulator)
+        self.voter_database.add(hash_id, vote_circuit)
+
+    def tally_votes(self, mode='analytic', chunk_size=None, workers=None, seed=None, simulate=False, backend=None):
+        """Tally votes and return the results.
+
+        mode='analytic' computes each circuit's outcome distribution with NumPy and samples the
+        whole electorate at once, falling back to a simulator for circuits it cannot handle.
+        mode='batched' runs the stored circuits on a simulator backend as one job per chunk of
+        `chunk_size` circuits (default TALLY_CHUNK_SIZE), mode='serial' runs one job per voter.
+        mode='parallel' splits the ballots into shards of `chunk_size` (default TALLY_SHARD_SIZE)
+        tallied on `workers` processes (default CPU count, 0 tallies inline), analytically unless
+        `simulate` is set; with a `seed` the result is the same for any number of workers.
+
+        `backend` names the registered simulator backend (see backends.py) that runs simulated
+        circuits; by default the cheapest one is selected for each circuit.
+
+        `seed` defaults to the election seed. When set, analytic tallies measure every ballot
+        with a random number derived from the seed and its hash ID, so identical ballots give
+        identical tallies, and simulator jobs run with derived seeds.
+        """
+        with TALLY_SECONDS.time(mode=mode):
+            return self._tally_votes(mode, chunk_size, workers, seed, simulate, backend)
+
+    def _tally_votes(self, mode, chunk_size, workers, seed, simulate, backend):
+        import numpy as np  # Imported on first use, see warmup.py
+
+        results = {candidate: 0 for candidate in range(self.num_candidates)}  # Initialize counts for every candidate
+        store = self.voter_database
+        patterns = store.patterns()  # Index into store.circuits of every ballot's circuit
+        positions = np.arange(len(patterns))  # Ballots left to run on the simulator
+        seed = self.seed if seed is None else seed
+
+        if mode == 'parallel':
+            return self._tally_parallel(patterns, results, chunk_size or TALLY_SHARD_SIZE, workers, seed, simulate,
+                                        backend)
+
+        if mode == 'analytic':
+            # Ballots only reference a handful of distinct circuits, so analyse each one once
+            ballots_per_pattern = np.bincount(patterns, minlength=len(store.circuits))
+
+            # Compute the exact distributions, keeping only circuits that need simulating
+            distributions, voters, simulated_patterns = [], [], []
+            for pattern in np.flatnonzero(ballots_per_pattern):
+                distribution = outcome_distribution(store.circuits[pattern])
+                if distribution is None:
+                    simulated_patterns.append(pattern)
+                elif seed is None:
+                    distributions.append(distribution)
+                    voters.append(int(ballots_per_pattern[pattern]))
+                else:
+                    # Seeded: measure each ballot with its own reproducible random number
+                    ballots = store.hash_ids(np.flatnonzero(patterns == pattern))
+                    counts = sample_ballots(distribution, ballot_uniforms(seed, ballots))
+                    for candidate_index, count in enumerate(counts[:self.num_candidates]):
+                        results[candidate_index] += int(count)
+
+            # Sample the whole (unseeded) electorate in one vectorized draw
+            for candidate_index, count in enumerate(sample_outcomes(distributions, voters)[:self.num_candidates]):
+                results[candidate_index] += int(count)
+
+            # Simulate the remaining ballots grouped by circuit, in casting order within each group
+            positions = np.flatnonzero(np.isin(patterns, simulated_patterns))
+            positions = positions[np.argsort(patterns[positions], kind='stable')]
+            mode = 'batched'
+            if not len(positions):
+                return results
+
+        if mode == 'serial':
+            # Count the votes based on the stored circuits, one simulator job per voter
+            for i, pattern in enumerate(patterns[positions].tolist()):
+                # Run the circuit once to get measurement results
+                counts = BACKENDS.run([store.circuits[pattern]], shots=1,  # Run with 1 shot for a single outcome
+                                      seed=self._job_seed(seed, i), backend=backend)[0]
+                self._count_outcomes(counts, results)
+        elif mode == 'batched':
+            chunk_size = chunk_size or TALLY_CHUNK_SIZE
+            for start in range(0, len(positions), chunk_size):
+                # Circuits are only materialized per ballot one chunk at a time
+                chunk = [store.circuits[pattern] for pattern in patterns[positions[start:start + chunk_size]].tolist()]
+
+                # Run the whole chunk as a single job per backend
+                for counts in BACKENDS.run(chunk, shots=1, seed=self._job_seed(seed, start), backend=backend):
+                    self._count_outcomes(counts, results)
+        else:
+            raise ValueError(f"Unknown tally mode: {mode}")
 
-            # Run the circuit once to get measurement results
-            sim_result = simulator.run(compiled_circuit, shots=1).result()  # Run with 1 shot for a single outcome
-            counts = sim_result.get_counts()
+        return results
 
-            # Count approvals based on the measured results
-            for outcome, count in counts.items():
-                candidate_index = int(outcome, 2)  # Convert binary string to integer index
-                if candidate_index < 4:  # Ensure we only consider the first 4 candidates
-                    results[candidate_index] += 1  # Increment the vote for the candidate
+    def estimate_votes(self, shots=None, margin=None, confidence=DEFAULT_CONFIDENCE, seed=None, backend=None):
+        """Estimate the expected tally with confidence intervals instead of measuring each ballot once.
+
+        Every distinct stored circuit runs once with `shots` shots, so the cost grows with the
+        number of distinct ballots rather than voters; see estimate_tally for the arguments.
+        """
+        import numpy as np  # Imported on first use, see warmup.py
+
+        store = self.voter_database
+        ballots_per_pattern = np.bincount(store.patterns(), minlength=len(store.circuits))
+        cast = np.flatnonzero(ballots_per_pattern)
+        return estimate_tally([store.circuits[pattern] for pattern in cast], ballots_per_pattern[cast].tolist(),
+                              self.num_candidates, shots, margin, confidence, self.seed if seed is None else seed,
+                              backend)
+
+    @staticmethod
+    def _job_seed(seed, *keys):
+        """Seed of a simulator job derived from the election seed, if there is one."""
+        return None if seed is None else derive_seed(seed, *keys)
+
+    def _tally_parallel(self, patterns, results, shard_size, workers, seed, simulate, backend):
+        """Tally fixed-size shards of ballots on a process pool and add up their counts."""
+        import numpy as np  # Imported on first use, see warmup.py
+
+        # Ship each distinct circuit once per shard together with the number of ballots cast with it
+        circuits = self.voter_database.circuits
+        shard_circuits, shard_voters = [], []
+        for start in range(0, len(patterns), shard_size):
+            voters_per_pattern = np.bincount(patterns[start:start + shard_size], minlength=len(circuits))
+            cast = np.flatnonzero(voters_per_pattern)
+            shard_circuits.append([circuits[pattern] for pattern in cast])
+            shard_voters.append(voters_per_pattern[cast].tolist())
+
+        # Shard i always gets the i-th child seed, whichever worker ends up tallying it
+        num_shards = len(shard_circuits)
+        args = (shard_circuits, shard_voters, [self.num_candidates] * num_shards,
+                np.random.SeedSequence(seed).spawn(num_shards), [simulate] * num_shards, [backend] * num_shards)
+
+        counts = np.zeros(self.num_candidates, dtype=np.int64)
+        if workers == 0 or num_shards <= 1:
+            for shard_counts in map(tally_shard, *args):
+                counts += shard_counts
+        else:
+            # Spawned rather than forked: forking after Aer has started its OpenMP threads can deadlock
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+                for shard_counts in pool.map(tally_shard, *args):
+                    counts += shard_counts
 
+        for candidate_index, count in enumerate(counts):
+            results[candidate_index] += int(count)
         return results
 
+    def _count_outcomes(self, counts, results):
+        """Add the measured outcomes of one circuit to the running results."""
+        # Count approvals based on the measured results
+        for outcome, count in counts.items():
+            candidate_index = int(outcome, 2)  # Convert binary string to integer index
+            if candidate_index < self.num_candidates:  # Ignore padding states beyond the last candidate
+                results[candidate_index] += 1  # Increment the vote for the candidate
+
 # Scrutineer Class
 class Scrutineer:
     def __init__(self, secret_key_AC):
@@ -133,6 +470,578 @@ class Scrutineer:
         """Verify if a vote exists in the database using hash ID."""
         return hash_id in voting_db
 
+    def verify_votes(self, hash_ids, index, conn=None, election_id=DEFAULT_ELECTION_ID):
+        """Verify a batch of hash IDs and return a compact report instead of a line per voter.
+
+        `index` is a BallotIndex over the persistent ledger (queried through `conn` for the
+        ballots of `election_id`), or any in-memory container of hash IDs such as a Tallyman's
+        voter database.
+        """
+        start = time.perf_counter()
+        hash_ids = list(hash_ids)
+        if isinstance(index, BallotIndex):
+            missing, stats = index.find_missing(conn, election_id, hash_ids)
+        elif isinstance(index, BallotStore):
+            missing, stats = index.find_missing(hash_ids)
+        else:
+            missing, stats = [hash_id for hash_id in hash_ids if hash_id not in index], {}
+        return verification_report(hash_ids, missing, time.perf_counter() - start, **stats)
+
+    def verify_inclusion(self, proof, trusted_block_hash=None):
+        """Verify a ledger inclusion proof for a single ballot without scanning the chain."""
+        return verify_proof(proof, trusted_block_hash)
+
+def tally_ballots(ballots, num_candidates=len(DEFAULT_CANDIDATES), seed=None, **tally_options):
+    """Encode, sign, verify and tally (username, candidate) ballots with the quantum protocol.
+
+    With the election `seed` the same ballots always give the same tally. `tally_options`
+    are passed on to Tallyman.tally_votes.
+    """
+    return issue_ballots(ballots, num_candidates, seed).tally_votes(**tally_options)
+
+def tally_ballot_shard(ballots, num_candidates, seed, shard, simulate=False, backend=None):
+    """Process pool task: issue and tally one shard of stored ballots for a parallel rebuild.
+
+    Seeded analytic tallies measure every ballot from its own hash ID, so the counts match an inline
+    rebuild; simulator jobs are seeded from `shard`, the shard's index among the election's ballots.
+    """
+    if simulate:
+        job_seed = None if seed is None else derive_seed(seed, 'shard', shard)
+        return issue_ballots(ballots, num_candidates, seed).tally_votes(mode='batched', seed=job_seed, backend=backend)
+    return issue_ballots(ballots, num_candidates, seed).tally_votes(backend=backend)
+
+def estimate_tally(circuits, voters, num_candidates, shots=None, margin=None, confidence=DEFAULT_CONFIDENCE, seed=None,
+                   backend=None):
+    """Estimate the expected counts of distinct vote circuits from `shots` shots of each, run as one job per backend.
+
+    Operators trade shots for precision: give `shots` (default DEFAULT_ESTIMATE_SHOTS), or a `margin`
+    in votes to run the fewest shots whose intervals are at most that wide at the `confidence` level.
+    `voters` is the number of ballots cast with each circuit; `seed` makes the estimate reproducible.
+
+    Returns {'shots': shots, 'confidence': confidence, 'counts': {candidate: {'expected', 'low', 'high'}}}.
+    """
+    import numpy as np  # Imported on first use, see warmup.py
+
+    with TALLY_SECONDS.time(mode='estimate'):
+        if shots is None:
+            shots = DEFAULT_ESTIMATE_SHOTS if margin is None else shots_for_margin(voters, margin, confidence)
+        elif not 1 <= shots <= MAX_ESTIMATE_SHOTS:
+            raise ValueError(f"Shots must be between 1 and {MAX_ESTIMATE_SHOTS}")
+        outcome_counts = np.zeros((len(circuits), num_candidates), dtype=np.int64)
+        job_seed = None if seed is None else derive_seed(seed, 'estimate', shots)
+        for row, counts in enumerate(BACKENDS.run(circuits, shots=shots, seed=job_seed, backend=backend)):
+            for outcome, count in counts.items():
+                if int(outcome, 2) < num_candidates:  # Ignore padding states beyond the last candidate
+                    outcome_counts[row, int(outcome, 2)] += count
+        expected, low, high = estimate_counts(outcome_counts, voters, shots, confidence)
+
+    return {'shots': shots, 'confidence': confidence,
+            'counts': {candidate: {'expected': float(expected[candidate]), 'low': float(low[candidate]),
+                                   'high': float(high[candidate])} for candidate in range(num_candidates)}}
+
+def estimate_election(conn, election, **estimate_options):
+    """Estimate an election's expected tally from its per-candidate vote counts, without loading any ballot.
+
+    Voters with the same vote share one signed circuit, so only one circuit per candidate is run.
+    `estimate_options` are passed on to estimate_tally.
+    """
+    num_candidates = len(election['candidates'])
+    counts = count_votes(conn, election['id'], num_candidates)
+    voted = [candidate for candidate in range(num_candidates) if counts[candidate]]
+    voter = Voter('estimate', '0000', '0000')  # Signed vote circuits do not depend on the voter
+    circuits = [voter.signed_vote_circuit([1 if i == candidate else 0 for i in range(num_candidates)])
+                for candidate in voted]
+    return estimate_tally(circuits, [counts[candidate] for candidate in voted], num_candidates,
+                          seed=election['seed'], **estimate_options)
+
+def issue_ballots(ballots, num_candidates=len(DEFAULT_CANDIDATES), seed=None):
+    """Encode, sign and verify (username, candidate) ballots, returning the Tallyman holding them."""
+    tallyman = Tallyman(num_candidates, seed)
+    secret_key_AC = bin(random.getrandbits(4))[2:].zfill(4)
+    scrutineer = Scrutineer(secret_key_AC)
+
+    for user, user_vote in ballots:
+        voter_id, secret_key_AB, secret_key_AC = tallyman.issue_voter_id(user)
+        voter = Voter(voter_id, secret_key_AB, secret_key_AC)
+
+        signed_vote = voter.signed_vote_circuit([1 if i == user_vote else 0 for i in range(num_candidates)])
+        tallyman.store_vote(voter.hash_id, signed_vote)
+
+    # One batch check and one summary line, however many ballots there are
+    report = scrutineer.verify_votes(tallyman.voter_database, tallyman.voter_database)
+    if report['missing']:
+        log.warning("Scrutineer could not verify %d of %d vote(s).", report['missing'], report['checked'])
+    else:
+        log.debug("Scrutineer verified %d vote(s).", report['verified'])
+
+    return tallyman
+
+def ledger_entries(tallyman):
+    """Ledger entries (hash ID, signed vote digest) of the ballots held by a Tallyman, in casting order."""
+    return [(hash_id, circuit_digest(vote_circuit)) for hash_id, vote_circuit in tallyman.voter_database.items()]
+
+def ballot_hash_id(election, username):
+    """Recompute the anonymous hash ID a user's ballot was recorded under, from the election seed."""
+    voter_id, secret_key_AB, secret_key_AC = Tallyman(len(election['candidates']), election['seed']).issue_voter_id(
+        username)
+    return Voter(voter_id, secret_key_AB, secret_key_AC).hash_id
+
+def backfill_ledger(conn):
+    """Record every stored vote in the ledger, election by election in casting order (caller commits)."""
+    for row in conn.execute('SELECT id FROM elections ORDER BY id').fetchall():
+        election = load_election(conn, row['id'])
+        for ballots in iter_ballot_batches(conn, election['id']):
+            tallyman = issue_ballots(ballots, len(election['candidates']), election['seed'])
+            append_entries(conn, election['id'], ledger_entries(tallyman))
+
+def create_election(conn, name, candidates, election_id=None, seed=None):
+    """Create an election with its ordered candidate names and tally seed, and return its id (caller commits)."""
+    if not 2 <= len(candidates) <= MAX_CANDIDATES:
+        raise ValueError(f"An election needs between 2 and {MAX_CANDIDATES} candidates")
+    cursor = conn.execute('INSERT INTO elections (id, name, seed, modified_at) VALUES (?, ?, ?, ?)',
+                          (election_id, name, new_seed() if seed is None else seed, time.time()))
+    conn.executemany('INSERT INTO candidates (election_id, position, name) VALUES (?, ?, ?)',
+                     [(cursor.lastrowid, position, candidate) for position, candidate in enumerate(candidates)])
+    return cursor.lastrowid
+
+def load_election(conn, election_id):
+    """Read an election as a dict with its candidate names in ballot order, or None if it does not exist."""
+    election = conn.execute('SELECT id, name, turnout, seed, version, modified_at FROM elections WHERE id = ?',
+                            (election_id,)).fetchone()
+    if election is None:
+        return None
+    candidates = [row['name'] for row in conn.execute(
+        'SELECT name FROM candidates WHERE election_id = ? ORDER BY position', (election_id,))]
+    return {'id': election['id'], 'name': election['name'], 'turnout': election['turnout'], 'seed': election['seed'],
+            'version': election['version'], 'modified_at': election['modified_at'], 'candidates': candidates}
+
+def add_to_tally(conn, election_id, results):
+    """Add measured vote counts to an election's persisted tally (caller commits)."""
+    conn.executemany('''INSERT INTO tallies (election_id, candidate, count) VALUES (?, ?, ?)
+                        ON CONFLICT (election_id, candidate) DO UPDATE SET count = count + excluded.count''',
+                     [(election_id, candidate, count) for candidate, count in results.items() if count])
+
+def count_votes(conn, election_id, num_candidates):
+    """Count the stored votes per candidate with one GROUP BY over the (election_id, candidate) index."""
+    counts = {candidate: 0 for candidate in range(num_candidates)}
+    for row in conn.execute('SELECT candidate, COUNT(*) AS count FROM votes WHERE election_id = ? GROUP BY candidate',
+                            (election_id,)):
+        counts[row['candidate']] = row['count']
+    return counts
+
+def iter_ballot_batches(conn, election_id, batch_size=BALLOT_BATCH_SIZE):
+    """Yield an election's (username, candidate) ballots in casting order, as lists of up to `batch_size`.
+
+    Each batch is one keyset page of votes JOIN users after the last vote ID seen, so no cursor
+    stays open while a batch is tallied and memory does not grow with the electorate. Votes cast
+    after the generator started are left out, keeping the batches a consistent snapshot.
+    """
+    last_id = conn.execute('SELECT MAX(id) FROM votes WHERE election_id = ?', (election_id,)).fetchone()[0]
+    after = 0
+    while last_id is not None and after < last_id:
+        rows = conn.execute('''SELECT votes.id, users.username, votes.candidate FROM votes
+                               JOIN users ON users.id = votes.user_id
+                               WHERE votes.election_id = ? AND votes.id > ? AND votes.id <= ?
+                               ORDER BY votes.id LIMIT ?''', (election_id, after, last_id, batch_size)).fetchall()
+        if not rows:
+            break
+        after = rows[-1]['id']
+        yield [(row['username'], row['candidate']) for row in rows]
+
+def tally_ballot_batches(conn, election, batch_size=BALLOT_BATCH_SIZE, progress=None, workers=None, **tally_options):
+    """Tally an election's stored ballots batch by batch; returns (results, number of ballots).
+
+    Seeded tallies measure every ballot from its own hash ID, so the batch size does not change
+    the result. `progress(done)` is called after every batch. With `workers`, each batch is a shard
+    issued and tallied by tally_ballot_shard on a pool of that many processes.
+    """
+    if workers:
+        return _tally_ballot_shards(conn, election, batch_size, progress, workers, **tally_options)
+    num_candidates = len(election['candidates'])
+    results = {candidate: 0 for candidate in range(num_candidates)}
+    done = 0
+    for ballots in iter_ballot_batches(conn, election['id'], batch_size):
+        for candidate, count in tally_ballots(ballots, num_candidates, election['seed'], **tally_options).items():
+            results[candidate] += count
+        done += len(ballots)
+        if progress is not None:
+            progress(done)
+    return results, done
+
+def _tally_ballot_shards(conn, election, shard_size, progress, workers, simulate=False, backend=None):
+    """Tally an election's stored ballots as shards of `shard_size` on one process pool, started once."""
+    num_candidates = len(election['candidates'])
+    results = {candidate: 0 for candidate in range(num_candidates)}
+    done = 0
+    pending = {}  # future -> number of ballots in its shard
+
+    def collect(futures):
+        nonlocal done
+        for future in futures:
+            for candidate, count in future.result().items():
+                results[candidate] += count
+            done += pending.pop(future)
+            if progress is not None:
+                progress(done)
+
+    # Spawned rather than forked: forking after Aer has started its OpenMP threads can deadlock
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        for shard, ballots in enumerate(iter_ballot_batches(conn, election['id'], shard_size)):
+            # Keep a couple of shards queued per worker, so memory does not grow with the electorate
+            if len(pending) >= 2 * workers:
+                collect(wait(pending, return_when=FIRST_COMPLETED).done)
+            future = pool.submit(tally_ballot_shard, ballots, num_candidates, election['seed'], shard, simulate,
+                                 backend)
+            pending[future] = len(ballots)
+        collect(list(pending))
+    return results, done
+
+def read_tally(conn, election_id, num_candidates):
+    """Read an election's persisted tally as {candidate: count} for candidates 0 to num_candidates - 1."""
+    results = {candidate: 0 for candidate in range(num_candidates)}
+    for row in conn.execute('SELECT candidate, count FROM tallies WHERE election_id = ?', (election_id,)):
+        results[row['candidate']] = row['count']
+    return results
+
+def rebuild_tally(conn, election_id=None, batch_size=BALLOT_BATCH_SIZE, **tally_options):
+    """Recompute the persisted tally and turnout of one election, or of all of them, from the stored votes.
+
+    The votes are read and tallied `batch_size` at a time; `tally_options` are passed on to
+    tally_ballot_batches. Returns {election_id: results} (caller commits).
+    """
+    if election_id is None:
+        election_ids = [row['id'] for row in conn.execute('SELECT id FROM elections')]
+    else:
+        election_ids = [election_id]
+
+    rebuilt = {}
+    for election_id in election_ids:
+        election = load_election(conn, election_id)
+        results, turnout = tally_ballot_batches(conn, election, batch_size, **tally_options)
+        conn.execute('DELETE FROM tallies WHERE election_id = ?', (election_id,))
+        add_to_tally(conn, election_id, results)
+        conn.execute('UPDATE elections SET turnout = ?, version = version + 1, modified_at = ? WHERE id = ?',
+                     (turnout, time.time(), election_id))
+        rebuilt[election_id] = results
+    return rebuilt
+
+def recount_election(state, progress):
+    """Background job: re-run the quantum tally over every vote stored for an election, reporting progress.
+
+    Returns the recounted count of every candidate, as a list in candidate order.
+    """
+    election_id, _ = state
+    conn = open_db_connection()
+    try:
+        election = load_election(conn, election_id)
+        total = sum(count_votes(conn, election_id, len(election['candidates'])).values())
+        progress(0, total)
+        results, _ = tally_ballot_batches(conn, election, progress=lambda done: progress(done, total))
+        return [results[candidate] for candidate in range(len(election['candidates']))]
+    finally:
+        conn.close()
+
+# Full recounts run in the background, one job per election keyed by (election, turnout) so new votes
+# trigger a fresh one; all elections share a single worker thread. Jobs keep their state in the
+# database, so of all the app's processes only the one claiming a state recounts it
+RECOUNT_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix='recount')
+RECOUNT_JOBS = {}
+RECOUNT_JOBS_LOCK = threading.Lock()
+
+def recount_job(election_id):
+    """Return the background recount job of an election, creating it on first use."""
+    with RECOUNT_JOBS_LOCK:
+        if election_id not in RECOUNT_JOBS:
+            RECOUNT_JOBS[election_id] = StateKeyedJob(f'recount-{election_id}', recount_election,
+                                                      open_db_connection, executor=RECOUNT_EXECUTOR)
+        return RECOUNT_JOBS[election_id]
+
+def audit_tally(conn, election):
+    """Recount an election from its stored votes and compare it with the published tally.
+
+    Returns {candidate: (published, recounted)} for every candidate whose counts differ; with the
+    election seed an untampered tally recounts bit-identically, so the result is empty.
+    """
+    published = read_tally(conn, election['id'], len(election['candidates']))
+    recounted = recount_election((election['id'], election['turnout']), lambda done, total: None)
+    return {candidate: (published[candidate], recounted[candidate])
+            for candidate in published if published[candidate] != recounted[candidate]}
+
+def cast_vote(conn, election, user_id, username, candidate):
+    """Atomically record a vote in an election, its measured outcome and the turnout.
+
+    Returns False without changing anything if the user has already voted in that election.
+    """
+    election_id = election['id']
+    # Measure the ballot before taking the write lock to keep the transaction short
+    tallyman = issue_ballots([(username, candidate)], len(election['candidates']), election['seed'])
+    measured = tallyman.tally_votes()
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        # The unique index on votes (election_id, user_id) turns a second vote into a no-op
+        inserted = conn.execute('''INSERT INTO votes (election_id, user_id, candidate) VALUES (?, ?, ?)
+                                   ON CONFLICT (election_id, user_id) DO NOTHING''',
+                                (election_id, user_id, candidate)).rowcount
+        if inserted:
+            conn.execute('UPDATE users SET has_voted = ? WHERE id = ?', (True, user_id))
+            conn.execute('''UPDATE elections SET turnout = turnout + 1, version = version + 1, modified_at = ?
+                            WHERE id = ?''', (time.time(), election_id))
+            add_to_tally(conn, election_id, measured)
+            append_entries(conn, election_id, ledger_entries(tallyman))
+            turnout = read_turnout(conn, election_id)
+        # Publish in commit order, so live results streams can drop events their snapshot already counts
+        with PUBLISH_LOCK:
+            conn.commit()
+            if inserted:
+                VOTES_CAST_TOTAL.inc()
+                ELECTION_EVENTS.publish({'election': election_id, 'turnout': turnout,
+                                         'delta': {candidate: count for candidate, count in measured.items() if count}})
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return bool(inserted)
+
+# Held while committing and publishing a vote, see cast_vote
+PUBLISH_LOCK = threading.Lock()
+
+def has_voted_in(conn, election_id, user_id):
+    """Check whether a user has already voted in an election, using the unique votes index."""
+    return conn.execute('SELECT 1 FROM votes WHERE election_id = ? AND user_id = ?',
+                        (election_id, user_id)).fetchone() is not None
+
+def read_turnout(conn, election_id):
+    """Read the number of users who have voted in an election from the maintained counter."""
+    row = conn.execute('SELECT turnout FROM elections WHERE id = ?', (election_id,)).fetchone()
+    return row['turnout'] if row else 0
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create the tables, or bring an existing database up to date (safe to run again)."""
+    migrate_once()
+    print(f"Database {DATABASE_PATH} is up to date")
+
+@app.cli.command('create-election')
+@click.argument('name')
+@click.argument('candidates', nargs=-1, required=True)
+@click.option('--seed', default=None, type=click.IntRange(0, 2 ** 63 - 1),
+              help='Seed of the quantum tally (default: random).')
+def create_election_command(name, candidates, seed):
+    """Create a new election with the given candidate names, in ballot order."""
+    conn = get_db_connection()
+    try:
+        election_id = create_election(conn, name, list(candidates), seed=seed)
+        conn.commit()
+    except (ValueError, sqlite3.IntegrityError) as err:
+        conn.rollback()
+        raise click.ClickException(str(err))
+    print(f"Created election {election_id} ({name}) with {len(candidates)} candidates "
+          f"on {register_width(len(candidates))} qubit(s)")
+
+@app.cli.command('rebuild-tally')
+@click.option('--election', 'election_id', default=None, type=int, help='Election to rebuild (default: all).')
+@click.option('--workers', default=None, type=int,
+              help='Tally shards of ballots on this many processes (default: tally on one core).')
+def rebuild_tally_command(election_id, workers):
+    """Recompute the results tally from scratch, e.g. for an audit."""
+    conn = get_db_connection()
+    # Workers get fixed-size shards, so the shards (and the tally) do not depend on the worker count
+    batch_size = TALLY_SHARD_SIZE if workers else BALLOT_BATCH_SIZE
+    rebuilt = rebuild_tally(conn, election_id, batch_size, workers=workers)
+    conn.commit()
+    for election_id, results in rebuilt.items():
+        print(f"Rebuilt tally of election {election_id}:", results)
+
+@app.cli.command('audit-tally')
+@click.option('--election', 'election_id', default=DEFAULT_ELECTION_ID, show_default=True,
+              help='Election to audit.')
+def audit_tally_command(election_id):
+    """Recount an election with its seed and diff the result against the published tally."""
+    conn = get_db_connection()
+    election = load_election(conn, election_id)
+    if election is None:
+        raise click.ClickException(f"Election {election_id} does not exist")
+    differences = audit_tally(conn, election)
+    if not differences:
+        print(f"Tally of election {election_id} verified: recount of {election['turnout']} vote(s) matches")
+        return
+    for candidate, (published, recounted) in differences.items():
+        print(f"{election['candidates'][candidate]}: published {published}, recounted {recounted}")
+    raise click.ClickException(f"Tally of election {election_id} does not match its recount")
+
+@app.cli.command('estimate-tally')
+@click.option('--election', 'election_id', default=DEFAULT_ELECTION_ID, show_default=True,
+              help='Election to estimate.')
+@click.option('--shots', default=None, type=click.IntRange(1, MAX_ESTIMATE_SHOTS),
+              help=f'Shots per distinct ballot (default: {DEFAULT_ESTIMATE_SHOTS}, or enough for --margin).')
+@click.option('--margin', default=None, type=click.FloatRange(0, min_open=True),
+              help='Widest confidence interval wanted, in votes either side; picks the number of shots.')
+@click.option('--confidence', default=DEFAULT_CONFIDENCE, show_default=True,
+              type=click.FloatRange(0, 1, min_open=True, max_open=True), help='Confidence level of the intervals.')
+@click.option('--backend', default=None, help='Simulator backend (default: selected per circuit).')
+def estimate_tally_command(election_id, shots, margin, confidence, backend):
+    """Estimate an election's expected tally with confidence intervals from multi-shot runs."""
+    conn = get_db_connection()
+    election = load_election(conn, election_id)
+    if election is None:
+        raise click.ClickException(f"Election {election_id} does not exist")
+    try:
+        estimate = estimate_election(conn, election, shots=shots, margin=margin, confidence=confidence,
+                                     backend=backend)
+    except ValueError as err:
+        raise click.ClickException(str(err))
+    print(f"Estimated tally of election {election_id} ({election['turnout']} vote(s), {estimate['shots']} shot(s) "
+          f"per distinct ballot, {estimate['confidence']:.0%} confidence):")
+    for candidate, count in estimate['counts'].items():
+        print(f"{election['candidates'][candidate]}: {count['expected']:.1f} "
+              f"[{count['low']:.1f}, {count['high']:.1f}]")
+
+@app.cli.command('seal-ledger')
+def seal_ledger_command():
+    """Seal the ballots still pending in the ledger into a final block, e.g. when an election closes."""
+    conn = get_db_connection()
+    conn.execute('BEGIN IMMEDIATE')
+    sealed = seal_blocks(conn, force=True)
+    conn.commit()
+    head = head_block(conn)
+    print(f"Sealed {len(sealed)} block(s); head is block {head['height']} ({head['block_hash'].hex()})"
+          if head else "The ledger is empty")
+
+@app.cli.command('verify-ledger')
+def verify_ledger_command():
+    """Audit the whole ledger: Merkle roots of every block and the hash chain between them."""
+    problems = verify_chain(get_db_connection())
+    for problem in problems:
+        print(problem)
+    if problems:
+        raise click.ClickException("The ledger failed verification")
+    print("Ledger verified")
+
+@app.cli.command('verify-ballots')
+@click.argument('path', type=click.File('r'))
+@click.option('--election', 'election_id', default=DEFAULT_ELECTION_ID, show_default=True,
+              help='Election the ballots were cast in.')
+@click.option('--no-bloom', is_flag=True, help='Query the index for every hash ID, without the Bloom filter.')
+def verify_ballots_command(path, election_id, no_bloom):
+    """Check the hash IDs listed in a file (one per line, - for stdin) against an election's ledger entries."""
+    hash_ids = [line.strip() for line in path if line.strip()]
+    index = BallotIndex(bloom=False) if no_bloom else BALLOT_INDEX
+    scrutineer = Scrutineer(bin(random.getrandbits(4))[2:].zfill(4))
+    print(json.dumps(scrutineer.verify_votes(hash_ids, index, get_db_connection(), election_id), indent=2))
+
+def read_import_rows(path):
+    """Stream voter rows (username, password and optional 1-based candidate) from a CSV or JSONL file."""
+    with open(path, newline='', encoding='utf-8') as handle:
+        if path.endswith(('.jsonl', '.ndjson')):
+            rows = (json.loads(line) for line in handle if line.strip())
+        else:
+            rows = csv.DictReader(handle)
+        for row in rows:
+            yield row
+
+def import_batch(conn, election, rows, pool):
+    """Insert one batch of voters and their pre-cast ballots in an election in a single transaction.
+
+    Returns (users_inserted, votes_inserted, rows_skipped), where skipped rows added neither a user nor a vote.
+    """
+    election_id, num_candidates = election['id'], len(election['candidates'])
+    valid_rows, skipped = [], 0
+    for row in rows:
+        try:
+            candidate = row.get('candidate')
+            candidate = int(candidate) - 1 if candidate not in (None, '') else None
+        except ValueError:
+            candidate = -1
+        if not row.get('username') or not row.get('password') or not (
+                candidate is None or 0 <= candidate < num_candidates):
+            skipped += 1
+            continue
+        valid_rows.append((row['username'], row['password'], candidate))
+
+    # Existing users keep their password, so don't spend PBKDF2 time on them
+    existing = {row['username'] for row in select_users_by_name(
+        conn, 'SELECT username FROM users WHERE username IN ({names})', [username for username, _, _ in valid_rows])}
+    new_users = {username: password for username, password, _ in valid_rows if username not in existing}
+
+    # PBKDF2 dominates the import, so hash the whole batch across the process pool
+    hashes = dict(zip(new_users, pool.map(hash_password, new_users.values(), chunksize=IMPORT_HASH_CHUNK)))
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        # Users registered while the batch was hashed are existing users too
+        registered = {row['username'] for row in select_users_by_name(
+            conn, 'SELECT username FROM users WHERE username IN ({names})', list(new_users))}
+        inserted = [username for username in new_users if username not in registered]
+        conn.executemany('INSERT INTO users (username, password, has_voted) VALUES (?, ?, ?)',
+                         [(username, hashes[username], False) for username in inserted])
+
+        # Only ballots of users who have not voted in this election yet are counted
+        ballots = {username: candidate for username, _, candidate in valid_rows if candidate is not None}
+        voters = select_users_by_name(
+            conn, f'''SELECT id, username FROM users WHERE username IN ({{names}}) AND NOT EXISTS (
+                          SELECT 1 FROM votes WHERE votes.election_id = {int(election_id)}
+                                              AND votes.user_id = users.id)''', list(ballots))
+
+        conn.executemany('INSERT INTO votes (election_id, user_id, candidate) VALUES (?, ?, ?)',
+                         [(election_id, voter['id'], ballots[voter['username']]) for voter in voters])
+        conn.executemany('UPDATE users SET has_voted = ? WHERE id = ?', [(True, voter['id']) for voter in voters])
+        if voters:
+            conn.execute('''UPDATE elections SET turnout = turnout + ?, version = version + 1, modified_at = ?
+                            WHERE id = ?''', (len(voters), time.time(), election_id))
+        tallyman = issue_ballots(((voter['username'], ballots[voter['username']]) for voter in voters),
+                                 num_candidates, election['seed'])
+        add_to_tally(conn, election_id, tallyman.tally_votes())
+        append_entries(conn, election_id, ledger_entries(tallyman))
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    # A row counts as imported if it added its user or their ballot; repeated usernames only count once
+    imported = set(inserted) | {voter['username'] for voter in voters}
+    return len(inserted), len(voters), skipped + len(valid_rows) - len(imported)
+
+def select_users_by_name(conn, query, usernames):
+    """Run `query` with its {names} placeholder bound to the usernames, in chunks below SQLite's variable limit."""
+    rows = []
+    for start in range(0, len(usernames), IMPORT_LOOKUP_CHUNK):
+        chunk = usernames[start:start + IMPORT_LOOKUP_CHUNK]
+        rows += conn.execute(query.format(names=', '.join('?' * len(chunk))), chunk).fetchall()
+    return rows
+
+@app.cli.command('import-voters')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--election', 'election_id', default=DEFAULT_ELECTION_ID, show_default=True,
+              help='Election the ballots are cast in.')
+@click.option('--batch-size', default=IMPORT_BATCH_SIZE, show_default=True, help='Rows per transaction.')
+@click.option('--workers', default=None, type=int, help='Password hashing processes (default: CPU count).')
+def import_voters_command(path, election_id, batch_size, workers):
+    """Bulk import voters, and optionally their ballots, from a CSV or JSONL file.
+
+    Each row needs a username and password; an optional 1-based candidate records a ballot
+    for that voter unless they have already voted in the election. Existing usernames are not overwritten.
+    """
+    conn = get_db_connection()
+    election = load_election(conn, election_id)
+    if election is None:
+        raise click.ClickException(f"Election {election_id} does not exist")
+
+    totals = [0, 0, 0]  # users, votes, skipped
+    processed = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        rows = read_import_rows(path)
+        while True:
+            batch = list(itertools.islice(rows, batch_size))
+            if not batch:
+                break
+            totals = [t + n for t, n in zip(totals, import_batch(conn, election, batch, pool))]
+            processed += len(batch)
+            elapsed = time.perf_counter() - start
+            print(f"{processed} rows imported ({processed / elapsed:.0f} rows/s)")
+
+    print(f"Done: {totals[0]} users and {totals[1]} votes added, {totals[2]} rows skipped "
+          f"in {time.perf_counter() - start:.1f}s")
+
 @app.route('/')
 def index():
     # If the user is logged in
@@ -143,14 +1052,38 @@ def index():
         return redirect(url_for('register'))
 
 
+@app.errorhandler(HasherBusy)
+def hasher_busy(err):
+    """Shed load with a 503 when the password hashing pool is saturated."""
+    return "Server is busy, please try again shortly.", 503, {'Retry-After': '1'}
+
+@app.route('/metrics/hashing')
+def hashing_metrics():
+    """Report password hashing queue depth and latency."""
+    return jsonify(HASHER.stats())
+
+# Counters kept by other components, exported at /metrics next to the timings
+METRICS.callback('qvote_circuit_cache_hits_total', 'Vote circuit cache hits.',
+                 lambda: CIRCUIT_CACHE.stats()['hits'], 'counter')
+METRICS.callback('qvote_circuit_cache_misses_total', 'Vote circuit cache misses (circuits built).',
+                 lambda: CIRCUIT_CACHE.stats()['misses'], 'counter')
+METRICS.callback('qvote_stream_subscribers', 'Open live results streams.',
+                 lambda: ELECTION_EVENTS.stats()['subscribers'])
+METRICS.callback('qvote_hashing_queue_depth', 'Password hashes in flight.',
+                 lambda: HASHER.stats()['queue_depth'])
+METRICS.callback('qvote_hashing_rejected_total', 'Password hashes shed with a 503.',
+                 lambda: HASHER.stats()['rejected'], 'counter')
+METRICS.callback('qvote_results_cache_hits_total', 'Results pages served from a cached snapshot.',
+                 lambda: RESULTS_CACHE.stats()['hits'] + RESULTS_CACHE.stats()['shared_hits'], 'counter')
+METRICS.callback('qvote_results_cache_misses_total', 'Results pages rendered.',
+                 lambda: RESULTS_CACHE.stats()['misses'], 'counter')
+
 # Registration route
 @app.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
-        hashed_password = generate_password_hash(password, method='pbkdf2:sha256', salt_length=16)
-
         conn = get_db_connection()
         try:
             # Check if username already exists
@@ -159,16 +1092,15 @@ def register():
                 return render_template('register.html', username=username,
                                        message="Username already taken, please try a different one.")
 
+            hashed_password = HASHER.hash(password)  # Runs on the hashing pool, may raise HasherBusy
             conn.execute('INSERT INTO users (username, password, has_voted) VALUES (?, ?, ?)', 
                          (username, hashed_password, False))
             conn.commit()
-            conn.close()
             flash("Registration successful. Please log in.", 'success')
             return redirect(url_for('login'))
-        # Print general errors for further optimizations
-        except sqlite3.Error as err:
-            conn.close()
-            print(err)
+        # Log database errors for further optimizations
+        except sqlite3.Error:
+            log.exception("Registration of %s failed", username)
             return render_template('register.html', username=username,
                                    message="Internal server error, please try again.")
     return render_template('register.html')
@@ -183,24 +1115,52 @@ def login():
         conn = get_db_connection()
         try:
             user = conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
-            conn.close()
 
             if user is None:
                 return render_template('login.html', username=username, message="User not found. Please register first.")
 
-            if user and check_password_hash(user['password'], password):
+            if user and HASHER.verify(user['password'], password):
                 session['user_id'] = user['id']
                 session['username'] = username
                 return redirect(url_for('vote'))
             else:
                 return render_template('login.html', username=username, message="Invalid credentials. Please try again.")
-        except sqlite3.Error as err:
-            conn.close()
-            print(err)
+        except sqlite3.Error:
+            log.exception("Login of %s failed", username)
             return render_template('login.html', username=username,
                                    message="Internal server error, please try again.")
     return render_template('login.html')
 
+def selected_election(conn):
+    """Load the election picked by the request's `election` parameter (default election if absent).
+
+    Aborts with 400 if the parameter is not an integer and 404 if no such election exists.
+    """
+    election_id = request.values.get('election', str(DEFAULT_ELECTION_ID))
+    try:
+        election_id = int(election_id)
+    except ValueError:
+        abort(400, description="Election must be an integer id.")
+    election = load_election(conn, election_id)
+    if election is None:
+        abort(404, description="Election not found.")
+    return election
+
+# Elections route
+@app.route('/elections')
+def elections():
+    """List the elections a user can vote in."""
+    if 'user_id' not in session:
+        flash("Please log in to view elections.")
+        return redirect(url_for('login'))
+
+    conn = get_db_connection()
+    rows = conn.execute('''SELECT elections.id, elections.name, elections.turnout,
+                                  EXISTS (SELECT 1 FROM votes WHERE votes.election_id = elections.id
+                                                              AND votes.user_id = ?) AS voted
+                           FROM elections ORDER BY elections.id''', (session['user_id'],)).fetchall()
+    return render_template('elections.html', elections=rows)
+
 # Voting route
 @app.route('/vote', methods=['GET', 'POST'])
 def vote():
@@ -209,30 +1169,30 @@ def vote():
         return redirect(url_for('login'))
 
     conn = get_db_connection()
-    user = conn.execute('SELECT * FROM users WHERE id = ?', (session['user_id'],)).fetchone()
-
-    # Check if user has already voted
-    if user['has_voted']:
-        conn.close()
-        flash("You have already voted. You cannot vote again.", category='error')
-        return redirect(url_for('results'))
+    election = selected_election(conn)
+    num_candidates = len(election['candidates'])
 
     if request.method == 'POST':
-        candidate = int(request.form['candidate'])
+        candidate = request.form.get('candidate', type=int)
+        if candidate is None or not 1 <= candidate <= num_candidates:
+            abort(400, description="Unknown candidate.")
         adjusted_candidate = candidate - 1
 
-        # Insert the vote
-        conn.execute('INSERT INTO votes (user_id, candidate) VALUES (?, ?)', (session['user_id'], adjusted_candidate))
-        conn.execute('UPDATE users SET has_voted = ? WHERE id = ?', (True, session['user_id']))
-        conn.commit()
-        conn.close()
+        # Insert the vote and add its measured outcome to the tally in one transaction
+        if not cast_vote(conn, election, session['user_id'], session['username'], adjusted_candidate):
+            flash("You have already voted. You cannot vote again.", category='error')
+            return redirect(url_for('results', election=election['id']))
         flash("Your vote has been recorded successfully!", category='success')
-        return redirect(url_for('results'))
+        return redirect(url_for('results', election=election['id']))
+
+    # Check if user has already voted
+    if has_voted_in(conn, election['id'], session['user_id']):
+        flash("You have already voted. You cannot vote again.", category='error')
+        return redirect(url_for('results', election=election['id']))
 
     # Fetch total number of user who have done voting
-    total_vote_count = conn.execute('SELECT COUNT(*) as count FROM users WHERE has_voted = ?', (True, )).fetchone()[0]
-    conn.close()
-    return render_template('vote.html', total_vote_count=total_vote_count)
+    total_vote_count = election['turnout']
+    return render_template('vote.html', election=election, total_vote_count=total_vote_count)
 
 # Result route
 @app.route('/results')
@@ -242,40 +1202,122 @@ def results():
         return redirect(url_for('login'))
 
     conn = get_db_connection()
-    votes_from_db = conn.execute('SELECT candidate FROM votes').fetchall()
-    users_from_db = conn.execute('SELECT username FROM users').fetchall()
-    conn.close()
+    election = selected_election(conn)
+
+    # Never wait for the full recount; just start a new one if votes arrived since the last
+    job = recount_job(election['id'])
+    job.refresh(conn, (election['id'], election['turnout']))
+    recount = job.status(conn)
+
+    # The page only changes with the election's version and what it shows of the recount, so
+    # every viewer in between gets the same snapshot (or a 304 if they already have it); the
+    # seed tells apart elections of a database that was recreated under a shared cache file
+    key = ('results', election['id'], election['seed'], election['version'], recount_fingerprint(recount))
+    body, etag = RESULTS_CACHE.get(key, lambda: render_results(conn, election, recount))
+    response = make_response(body)
+    response.set_etag(etag)
+    if recount['status'] != 'running' and election['modified_at'] is not None:
+        response.last_modified = max(election['modified_at'], recount['last_finished_at'] or 0)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True  # Revalidate every time, new votes can land any moment
+    return response.make_conditional(request)
+
+def recount_fingerprint(recount):
+    """The parts of a recount status the results page shows, identical across workers in the same state."""
+    running = recount['status'] == 'running'
+    last_state = tuple(recount['last_state']) if recount['last_state'] is not None else None
+    return (recount['status'], last_state, tuple(recount['last_result'] or ()),
+            (recount['progress']['done'], recount['progress']['total']) if running else None)
+
+def render_results(conn, election, recount):
+    """Render an election's results page from its persisted tally."""
+    # Read the incrementally maintained tally instead of re-simulating the election
+    results = read_tally(conn, election['id'], len(election['candidates']))
 
-    user_votes_db = [row['candidate'] for row in votes_from_db]
-    usernames_db = [row['username'] for row in users_from_db]
-
-    tallyman = Tallyman()
-    secret_key_AC = bin(random.getrandbits(4))[2:].zfill(4)
-    scrutineer = Scrutineer(secret_key_AC)
+    # Adjust the results to be 1-based
+    adjusted_results = {k+1: v for k, v in results.items()}
 
-    for user, user_vote in zip(usernames_db, user_votes_db):
-        voter_id, secret_key_AB, secret_key_AC = tallyman.issue_voter_id(user)
-        voter = Voter(voter_id, secret_key_AB, secret_key_AC)
+    max_votes = max(adjusted_results.values())
+    winners = [candidate for candidate, count in adjusted_results.items() if count == max_votes]
 
-        vote_circuit = voter.encode_vote([1 if i == user_vote else 0 for i in range(4)])
-        signed_vote = voter.sign_vote(vote_circuit)
-        tallyman.store_vote(voter.hash_id, signed_vote)
+    return render_template('results.html', election=election, vote_counts=adjusted_results, winners=winners,
+                           max_votes=max_votes, recount=recount)
 
-        if scrutineer.verify_vote(voter.hash_id, tallyman.voter_database):
-            print(f"Vote verified by Scrutineer for voter hash ID: {voter.hash_id}")
-        else:
-            print(f"Vote could not be verified by Scrutineer.")
+@app.route('/results/status')
+def results_status():
+    """JSON status and progress of an election's background recount, for polling."""
+    if 'user_id' not in session:
+        return jsonify({'error': "Please log in to view results."}), 401
+    conn = get_db_connection()
+    election = selected_election(conn)
+    return jsonify(recount_job(election['id']).status(conn))
+
+def read_results_snapshot(conn, election_id, num_candidates):
+    """Read an election's turnout and counts consistently, as (turnout, [count per candidate])."""
+    conn.execute('BEGIN')  # One read transaction, so the counts match the turnout
+    try:
+        turnout = read_turnout(conn, election_id)
+        counts = read_tally(conn, election_id, num_candidates)
+    finally:
+        conn.commit()
+    return turnout, [counts[candidate] for candidate in range(num_candidates)]
 
-    results = tallyman.tally_votes()
-    print("Quantum Vote Counts:", results)
+def sse_message(event, data):
+    """Format one server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-    # Adjust the results to be 1-based
-    adjusted_results = {k+1: v for k, v in results.items()}
+@app.route('/results/stream')
+def results_stream():
+    """Server-sent events with an election's turnout and per-candidate count deltas as votes are committed.
 
-    max_votes = max(adjusted_results.values())
-    winners = [candidate for candidate, count in adjusted_results.items() if count == max_votes]
+    The stream starts with a `snapshot` event ({election, turnout, counts}) and then sends a `vote`
+    event ({election, turnout, delta}) per committed vote; a new snapshot follows if it fell behind.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': "Please log in to view results."}), 401
+    conn = get_db_connection()
+    election = selected_election(conn)
+    election_id, num_candidates = election['id'], len(election['candidates'])
 
-    return render_template('results.html', vote_counts=adjusted_results, winners=winners, max_votes=max_votes)
+    def stream():
+        ELECTION_EVENTS.subscribed(1)
+        try:
+            # Take the cursor before the snapshot: nothing is missed, and duplicates are filtered by turnout
+            cursor = ELECTION_EVENTS.head
+            turnout, counts = read_results_snapshot(conn, election_id, num_candidates)
+            yield f"retry: {STREAM_RETRY_MS}\n\n"
+            yield sse_message('snapshot', {'election': election_id, 'turnout': turnout, 'counts': counts})
+
+            deadline = time.monotonic() + STREAM_MAX_SECONDS
+            while time.monotonic() < deadline:
+                events, cursor, lost = ELECTION_EVENTS.read(cursor, STREAM_KEEPALIVE_SECONDS)
+                if lost:
+                    turnout, counts = read_results_snapshot(conn, election_id, num_candidates)
+                    yield sse_message('snapshot', {'election': election_id, 'turnout': turnout, 'counts': counts})
+                    continue
+                if not events:
+                    yield ": keepalive\n\n"
+                for event in events:
+                    if event['election'] == election_id and event['turnout'] > turnout:
+                        turnout = event['turnout']
+                        yield sse_message('vote', event)
+        finally:
+            ELECTION_EVENTS.subscribed(-1)
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/ledger/proof')
+def ledger_proof():
+    """JSON inclusion proof of the logged-in user's ballot in an election, verifiable on its own."""
+    if 'user_id' not in session:
+        return jsonify({'error': "Please log in to view your ballot receipt."}), 401
+    conn = get_db_connection()
+    election = selected_election(conn)
+    proof = inclusion_proof(conn, election['id'], ballot_hash_id(election, session['username']))
+    if proof is None:
+        return jsonify({'error': "You have not voted in this election."}), 404
+    return jsonify(proof)
 
 # Logout route
 @app.route('/logout')
@@ -300,36 +1342,30 @@ def main():
     secret_key_AC = bin(random.getrandbits(4))[2:].zfill(4)
     scrutineer = Scrutineer(secret_key_AC)
 
-    # Retrieve votes from the database (simulate database query)
-    conn = get_db_connection()
-    votes_from_db = conn.execute('SELECT candidate FROM votes').fetchall()
-    conn.close()
-
-    # Convert database votes to list of approvals (1 for approval, 0 for disapproval)
-    user_votes_db = [row['candidate'] for row in votes_from_db]
-
-    # List of users to simulate voting (for this example)
-    users = ["user1", "user2", "user3", "user4", "user5"]
+    # Stream each stored vote together with the user who cast it, one keyset page at a time
+    conn = open_db_connection()
+    for ballots in iter_ballot_batches(conn, DEFAULT_ELECTION_ID):
+        for user, user_vote in ballots:
+            # Simulate each user as a voter
+            voter_id, secret_key_AB, secret_key_AC = tallyman.issue_voter_id(user)
+            voter = Voter(voter_id, secret_key_AB, secret_key_AC)
 
-    for user, user_vote in zip(users, user_votes_db):
-        # Simulate each user as a voter
-        voter_id, secret_key_AB, secret_key_AC = tallyman.issue_voter_id(user)
-        voter = Voter(voter_id, secret_key_AB, secret_key_AC)
+            # Voter encodes their vote into quantum circuit and signs it (shared by identical votes)
+            signed_vote = voter.signed_vote_circuit(
+                [1 if i == user_vote else 0 for i in range(len(DEFAULT_CANDIDATES))])
 
-        # Voter encodes their vote into quantum circuit
-        vote_circuit = voter.encode_vote([1 if i == user_vote else 0 for i in range(4)])  # 4 candidates
+            # Store the vote in Tallyman's database before verification
+            tallyman.store_vote(voter.hash_id, signed_vote)
 
-        # Voter signs their vote
-        signed_vote = voter.sign_vote(vote_circuit)
-
-        # Store the vote in Tallyman's database before verification
-        tallyman.store_vote(voter.hash_id, signed_vote)
+            # Verify if the vote exists in the database
+            if scrutineer.verify_vote(voter.hash_id, tallyman.voter_database):
+                log.debug("Vote verified by Scrutineer for voter hash ID: %s", voter.hash_id)
+            else:
+                log.warning("Vote could not be verified by Scrutineer.")
 
-        # Verify if the vote exists in the database
-        if scrutineer.verify_vote(voter.hash_id, tallyman.voter_database):
-            print(f"Vote verified by Scrutineer for voter hash ID: {voter.hash_id}")
-        else:
-            print(f"Vote could not be verified by Scrutineer.")
+    # The classical count straight from SQL, to compare the quantum tally with
+    print("Votes Cast:", count_votes(conn, DEFAULT_ELECTION_ID, len(DEFAULT_CANDIDATES)))
+    conn.close()
 
     # Tally the votes
     results = tallyman.tally_votes()
@@ -0,0 +1,328 @@
+"""Registry of the simulator backends that run vote circuits.
+
+Both tally paths, the Tallyman's and the blockchain simulation's, run their
+circuits through a backend from this registry instead of creating simulators
+of their own. Four backends are registered:
+
+- classical: exact counts for circuits whose outcome is certain (a one-hot vote
+  is a basis state), without any simulation;
+- numpy: a small NumPy statevector simulator that samples all shots from the
+  final distribution at once, for narrow registers;
+- aer_qasm: Aer's simulator with its automatic method;
+- aer_statevector: Aer's simulator forced to the statevector method.
+
+`BACKENDS.select` picks one per circuit from its width and the number of shots
+(see `select_backend`), and `BACKENDS.get` creates each backend once per
+process, so every request shares the same simulator instances. Further
+backends can be added with `BACKENDS.register`.
+
+NumPy, Qiskit and Aer are imported on first use, see warmup.py.
+"""
+import threading
+from collections import OrderedDict
+
+from metrics import SIMULATE_SECONDS
+from tally import compile_circuits, outcome_distribution
+
+# Widest register counted classically or simulated with NumPy whatever the shot count
+NUMPY_MAX_QUBITS = 16
+# Widest register simulated with NumPy when there are enough shots to amortize its statevector
+NUMPY_MANY_SHOTS_MAX_QUBITS = 18
+# Shots from which NumPy's single statevector beats Aer on the wider registers
+NUMPY_MIN_SHOTS = 10000
+# Distributions kept per backend for circuits that are run again (vote circuits are shared)
+DISTRIBUTION_CACHE_SIZE = 256
+
+
+def statevector_distribution(circuit):
+    """
+    Computes the measurement distribution of a circuit by simulating its statevector with NumPy.
+
+    Handles a state preparation of the fresh register, any gates with a matrix
+    definition and measurements that are not followed by gates entangling the
+    measured qubits with the rest.
+
+    Args:
+        circuit (QuantumCircuit): The circuit to simulate.
+
+    Returns:
+        numpy.ndarray | None: Probabilities indexed by the integer value of the classical
+        register, or None if the circuit has instructions the simulator does not handle.
+    """
+    import numpy as np
+
+    num_qubits = circuit.num_qubits
+    state = np.zeros((2,) * num_qubits, dtype=complex)
+    state[(0,) * num_qubits] = 1.0
+    applied = False
+    measured = {}  # qubit index -> clbit index
+
+    for instruction in circuit.data:
+        operation = instruction.operation
+        qubits = [circuit.find_bit(q).index for q in instruction.qubits]
+        if operation.name in ('barrier', 'id'):
+            continue
+        if operation.name == 'measure':
+            if qubits[0] in measured:
+                return None
+            measured[qubits[0]] = circuit.find_bit(instruction.clbits[0]).index
+            continue
+        if measured.keys() >= set(qubits):
+            continue  # Gates after the measurement (like the signature) no longer change the recorded bits
+        if measured.keys() & set(qubits):
+            return None  # Entangling with an already measured qubit is left to Aer
+
+        if operation.name in ('initialize', 'state_preparation'):
+            # Only a preparation of the fresh register is a plain amplitude load
+            amplitudes = np.asarray(operation.params, dtype=complex)
+            if applied or amplitudes.shape != (2 ** len(qubits),):
+                return None
+            index = np.zeros(len(amplitudes), dtype=np.int64)
+            for position, qubit in enumerate(qubits):
+                index |= ((np.arange(len(amplitudes)) >> position) & 1) << qubit
+            state = np.zeros(2 ** num_qubits, dtype=complex)
+            state[index] = amplitudes / np.linalg.norm(amplitudes)
+            state = state.reshape((2,) * num_qubits)
+            applied = True
+            continue
+        try:
+            matrix = np.asarray(operation.to_matrix(), dtype=complex)
+        except Exception:
+            return None
+
+        # Qiskit orders the matrix's bits little-endian, axis 0 of the state is the last qubit
+        k = len(qubits)
+        axes = [num_qubits - 1 - qubit for qubit in reversed(qubits)]
+        state = np.tensordot(matrix.reshape((2,) * 2 * k), state, axes=(list(range(k, 2 * k)), axes))
+        state = np.moveaxis(state, list(range(k)), axes)
+        applied = True
+
+    probabilities = np.abs(state.ravel()) ** 2
+    basis = np.arange(2 ** num_qubits)
+    outcomes = np.zeros(len(basis), dtype=np.int64)
+    for qubit, clbit in measured.items():
+        outcomes |= ((basis >> qubit) & 1) << clbit
+    distribution = np.zeros(2 ** circuit.num_clbits)
+    np.add.at(distribution, outcomes, probabilities)
+    return distribution / distribution.sum()
+
+
+def outcome_counts(outcomes, num_clbits):
+    """Converts {outcome value: count} into Aer style counts keyed by bitstring."""
+    return {format(int(outcome), f'0{num_clbits}b'): int(count) for outcome, count in outcomes.items() if count}
+
+
+class DistributionCache:
+    """
+    Bounded LRU cache of measurement distributions, keyed by circuit identity.
+
+    Args:
+        compute (callable): Computes a circuit's distribution (or None if it cannot).
+        maxsize (int): Number of distributions kept.
+    """
+
+    def __init__(self, compute, maxsize=DISTRIBUTION_CACHE_SIZE):
+        self.compute = compute
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # id(circuit) -> (circuit, distribution); the circuit pins its id
+        self._lock = threading.Lock()
+
+    def get(self, circuit):
+        """Returns the distribution of a circuit, computing it on a miss."""
+        with self._lock:
+            entry = self._entries.get(id(circuit))
+            if entry is not None and entry[0] is circuit:
+                self._entries.move_to_end(id(circuit))
+                return entry[1]
+
+        distribution = self.compute(circuit)
+        with self._lock:
+            self._entries[id(circuit)] = (circuit, distribution)
+            self._entries.move_to_end(id(circuit))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return distribution
+
+
+def exact_distribution(circuit):
+    """Distribution of a circuit from the cheap analytic path if it applies, else its NumPy statevector."""
+    distribution = outcome_distribution(circuit)
+    return distribution if distribution is not None else statevector_distribution(circuit)
+
+
+class ClassicalBackend:
+    """Counts circuits whose measurement outcome is certain, without simulating them."""
+
+    name = 'classical'
+
+    def __init__(self):
+        self.distributions = DistributionCache(outcome_distribution)
+
+    def supports(self, circuit):
+        distribution = self.distributions.get(circuit)
+        return distribution is not None and distribution.max() > 1 - 1e-9
+
+    def run(self, circuits, shots=1, seed=None, **options):
+        """Returns the counts of every circuit: all shots land on its one possible outcome."""
+        counts = []
+        for circuit in circuits:
+            if not self.supports(circuit):
+                raise ValueError(f"Circuit {circuit.name!r} has no certain outcome to count classically")
+            outcome = int(self.distributions.get(circuit).argmax())
+            counts.append(outcome_counts({outcome: shots}, circuit.num_clbits))
+        return counts
+
+
+class NumpyBackend:
+    """Samples circuits from their NumPy-simulated statevector, all shots in one draw."""
+
+    name = 'numpy'
+
+    def __init__(self):
+        self.distributions = DistributionCache(exact_distribution)
+
+    def supports(self, circuit):
+        return self.distributions.get(circuit) is not None
+
+    def run(self, circuits, shots=1, seed=None, **options):
+        """Returns the counts of every circuit, sampled from a generator seeded with `seed`."""
+        import numpy as np
+
+        rng = np.random.default_rng(seed)
+        counts = []
+        for circuit in circuits:
+            distribution = self.distributions.get(circuit)
+            if distribution is None:
+                raise ValueError(f"Circuit {circuit.name!r} cannot be simulated with NumPy")
+            sampled = rng.multinomial(shots, distribution)
+            counts.append(outcome_counts(dict(enumerate(sampled)), circuit.num_clbits))
+        return counts
+
+
+class AerBackend:
+    """
+    Runs circuits on an Aer simulator, transpiled through the circuit cache.
+
+    Args:
+        method (str): Aer simulation method.
+    """
+
+    def __init__(self, method='automatic'):
+        from qiskit_aer import AerSimulator  # Imported on first use, see warmup.py
+
+        self.simulator = AerSimulator(method=method)
+        self.name = 'aer_qasm' if method == 'automatic' else f"aer_{method}"
+
+    def supports(self, circuit):
+        return True
+
+    def run(self, circuits, shots=1, seed=None, **options):
+        """Returns the counts of every circuit, run as a single Aer job; `options` go to Aer."""
+        if seed is not None:
+            options['seed_simulator'] = seed
+        result = self.simulator.run(compile_circuits(circuits, self.simulator), shots=shots, **options).result()
+        return [result.get_counts(i) for i in range(len(circuits))]
+
+
+def select_backend(registry, circuit, shots=1):
+    """
+    Picks the backend name for a circuit: the cheapest one that can run it.
+
+    Up to NUMPY_MAX_QUBITS qubits (every ballot we tally), circuits with a certain
+    outcome are counted classically and the others simulated with NumPy. Wider
+    circuits stay on NumPy up to NUMPY_MANY_SHOTS_MAX_QUBITS when they are run with
+    at least NUMPY_MIN_SHOTS shots, and otherwise go to Aer, whose automatic method
+    picks e.g. the stabilizer simulator for Clifford circuits. Forcing Aer's
+    statevector method never came out ahead in benchmarks/bench_backends.py, so it
+    is only used when asked for by name.
+
+    Args:
+        registry (BackendRegistry): Registry holding the backends.
+        circuit (QuantumCircuit): The circuit to run.
+        shots (int): Number of shots it is run with.
+
+    Returns:
+        str: Name of the selected backend.
+    """
+    if circuit.num_qubits <= NUMPY_MAX_QUBITS:
+        for name in ('classical', 'numpy'):
+            if registry.get(name).supports(circuit):
+                return name
+    elif (circuit.num_qubits <= NUMPY_MANY_SHOTS_MAX_QUBITS and shots >= NUMPY_MIN_SHOTS
+          and registry.get('numpy').supports(circuit)):
+        return 'numpy'
+    return 'aer_qasm'
+
+
+class BackendRegistry:
+    """
+    Named backend factories and the one instance of each created in this process.
+
+    Args:
+        selector (callable): `selector(registry, circuit, shots)` returning a backend name.
+    """
+
+    def __init__(self, selector=select_backend):
+        self.selector = selector
+        self._factories = OrderedDict()
+        self._instances = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, factory):
+        """Registers a backend factory, called with no arguments on first use."""
+        with self._lock:
+            self._factories[name] = factory
+            self._instances.pop(name, None)
+
+    def names(self):
+        """Returns the names of the registered backends."""
+        return list(self._factories)
+
+    def get(self, name):
+        """Returns the process-wide instance of a backend, creating it on first use."""
+        with self._lock:
+            if name not in self._factories:
+                raise ValueError(f"Unknown backend: {name}")
+            if name not in self._instances:
+                self._instances[name] = self._factories[name]()
+            return self._instances[name]
+
+    def select(self, circuit, shots=1):
+        """Returns the backend automatically selected for a circuit."""
+        return self.get(self.selector(self, circuit, shots))
+
+    def run(self, circuits, shots=1, seed=None, backend=None, **options):
+        """
+        Runs circuits, grouping them into one job per backend.
+
+        Args:
+            circuits (list): Circuits to run; repeated circuit objects are selected for once.
+            shots (int): Shots per circuit.
+            seed (int): Seed of every job (default: unseeded).
+            backend (str): Backend name for all circuits (default: selected per circuit).
+            **options: Run options passed on to the backends (Aer ones are ignored by the others).
+
+        Returns:
+            list: Counts keyed by bitstring for every circuit, in the same order.
+        """
+        selected, groups = {}, OrderedDict()
+        for i, circuit in enumerate(circuits):
+            if id(circuit) not in selected:
+                selected[id(circuit)] = self.get(backend) if backend else self.select(circuit, shots)
+            groups.setdefault(selected[id(circuit)].name, []).append(i)
+
+        counts = [None] * len(circuits)
+        for name, indices in groups.items():
+            with SIMULATE_SECONDS.time(backend=name):
+                group_counts = self.get(name).run([circuits[i] for i in indices], shots, seed, **options)
+            for i, circuit_counts in zip(indices, group_counts):
+                counts[i] = circuit_counts
+        return counts
+
+
+# Process-wide registry shared by the Tallyman, the parallel tally shards and the simulation app
+BACKENDS = BackendRegistry()
+BACKENDS.register('classical', ClassicalBackend)
+BACKENDS.register('numpy', NumpyBackend)
+BACKENDS.register('aer_qasm', AerBackend)
+BACKENDS.register('aer_statevector', lambda: AerBackend('statevector'))
@@ -0,0 +1,243 @@
+"""Compact, array-backed store of the ballots a Tallyman holds.
+
+A ballot is a voter's anonymous hash ID and the signed vote circuit they cast.
+Keeping a dict entry, a 64-character hex string and a circuit reference per
+voter costs a couple of hundred bytes per ballot (and several KB when every
+voter carries their own circuit). The store instead keeps
+
+- hash IDs as raw 32-byte SHA-256 digests in one NumPy array,
+- one circuit per distinct vote pattern, and
+- the pattern each ballot was cast with as a uint32 in another array,
+
+about 36 bytes per ballot. Circuits are materialized per ballot only when a
+simulator needs them; analytic tallies work on the pattern counts alone.
+
+Membership is answered from a sorted index over the digests that is rebuilt
+lazily, with the few ballots appended since then scanned directly. The store
+behaves like the dict it replaces: `store[hash_id]`, `get`, `in`, `len`, `keys`,
+`values` and `items` work as on a dict, it iterates over hex hash IDs in casting
+order, and storing a hash ID again replaces that ballot's vote in place.
+
+NumPy is imported on first use, see warmup.py.
+"""
+
+# Ballots the store has room for before it first grows
+STORE_INITIAL_CAPACITY = 1024
+# Ballots appended after the last index rebuild that membership tests scan directly
+STORE_INDEX_TAIL = 4096
+# Hash IDs converted to hex at a time when iterating
+STORE_ITER_CHUNK = 65536
+
+
+class BallotStore:
+    """
+    Hash IDs and vote patterns of cast ballots, kept in NumPy arrays.
+
+    Args:
+        capacity (int): Number of ballots to allocate room for up front.
+    """
+
+    def __init__(self, capacity=STORE_INITIAL_CAPACITY):
+        import numpy as np
+
+        self.circuits = []  # One vote circuit per distinct pattern, in order of first use
+        self._pattern_index = {}  # Pattern key -> index into self.circuits
+        self._digests = np.empty(max(1, capacity), dtype='S32')
+        self._patterns = np.empty(max(1, capacity), dtype=np.uint32)
+        self._count = 0
+        self._order = np.empty(0, dtype=np.uint32)  # Sorts the first self._indexed digests
+        self._indexed = 0
+
+    def add(self, hash_id, vote_circuit):
+        """
+        Stores a ballot.
+
+        Args:
+            hash_id (str): The voter's hex SHA-256 hash ID.
+            vote_circuit (QuantumCircuit): The signed vote circuit; circuits carrying the same
+                `vote` pattern in their metadata are kept once.
+        """
+        digest = bytes.fromhex(hash_id)
+        if len(digest) != 32:
+            raise ValueError(f"Not a SHA-256 hash ID: {hash_id!r}")
+
+        key = (vote_circuit.metadata or {}).get('vote', id(vote_circuit))
+        pattern = self._pattern_index.get(key)
+        if pattern is None:
+            pattern = self._pattern_index[key] = len(self.circuits)
+            self.circuits.append(vote_circuit)
+
+        if self._count == len(self._digests):
+            self._grow()
+        self._digests[self._count] = digest
+        self._patterns[self._count] = pattern
+        self._count += 1
+
+    def __setitem__(self, hash_id, vote_circuit):
+        self.add(hash_id, vote_circuit)
+
+    def _grow(self):
+        import numpy as np
+
+        capacity = len(self._digests) * 3 // 2 + 1
+        digests = np.empty(capacity, dtype='S32')
+        patterns = np.empty(capacity, dtype=np.uint32)
+        digests[:self._count] = self._digests[:self._count]
+        patterns[:self._count] = self._patterns[:self._count]
+        self._digests, self._patterns = digests, patterns
+
+    def _seal(self):
+        """Resolves hash IDs stored more than once and rebuilds the sorted index."""
+        import numpy as np
+
+        if self._indexed == self._count:
+            return
+        digests = self._digests[:self._count]
+        order = np.argsort(digests, kind='stable')
+        ordered = digests[order]
+        repeated = ordered[1:] == ordered[:-1]
+        if repeated.any():
+            # Like a dict: the ballot keeps its first position and takes the vote stored last
+            starts = np.flatnonzero(np.concatenate(([True], ~repeated)))
+            ends = np.concatenate((starts[1:], [len(order)])) - 1
+            self._patterns[order[starts]] = self._patterns[order[ends]]
+            keep = np.ones(self._count, dtype=bool)
+            keep[order[np.flatnonzero(repeated) + 1]] = False
+            kept = int(keep.sum())
+            self._digests[:kept] = digests[keep]
+            self._patterns[:kept] = self._patterns[:self._count][keep]
+            self._count = kept
+            order = np.argsort(self._digests[:kept], kind='stable')
+        self._order = order.astype(np.uint32)
+        self._indexed = self._count
+
+    def __len__(self):
+        self._seal()
+        return self._count
+
+    def __contains__(self, hash_id):
+        import numpy as np
+
+        try:
+            digest = bytes.fromhex(hash_id)
+        except (TypeError, ValueError):
+            return False
+        if len(digest) != 32:
+            return False
+        if self._count - self._indexed > STORE_INDEX_TAIL:
+            self._seal()
+        key = np.array(digest, dtype='S32')
+        if (self._digests[self._indexed:self._count] == key).any():
+            return True
+        if not self._indexed:
+            return False
+        position = np.searchsorted(self._digests[:self._indexed], key, sorter=self._order)
+        return position < self._indexed and self._digests[self._order[position]] == key
+
+    def _position(self, hash_id):
+        """Returns the casting-order position of a hash ID's ballot, or None if it is not stored."""
+        import numpy as np
+
+        try:
+            digest = bytes.fromhex(hash_id)
+        except (TypeError, ValueError):
+            return None
+        if len(digest) != 32:
+            return None
+        self._seal()
+        if not self._count:
+            return None
+        key = np.array(digest, dtype='S32')
+        position = np.searchsorted(self._digests[:self._count], key, sorter=self._order)
+        if position < self._count and self._digests[self._order[position]] == key:
+            return int(self._order[position])
+        return None
+
+    def __getitem__(self, hash_id):
+        position = self._position(hash_id)
+        if position is None:
+            raise KeyError(hash_id)
+        return self.circuits[self._patterns[position]]
+
+    def get(self, hash_id, default=None):
+        """Returns the vote circuit of a hash ID's ballot, or `default` if it is not stored."""
+        position = self._position(hash_id)
+        return default if position is None else self.circuits[self._patterns[position]]
+
+    def __iter__(self):
+        return iter(self.hash_ids())
+
+    def keys(self):
+        """Returns the hex hash IDs, in casting order."""
+        return self.hash_ids()
+
+    def hash_ids(self, positions=None):
+        """
+        Returns hex hash IDs, in casting order.
+
+        Args:
+            positions (numpy.ndarray): Positions of the ballots wanted (default all).
+
+        Returns:
+            list: The hash IDs.
+        """
+        self._seal()
+        digests = self._digests[:self._count] if positions is None else self._digests[:self._count][positions]
+        hash_ids = []
+        for start in range(0, len(digests), STORE_ITER_CHUNK):
+            text = digests[start:start + STORE_ITER_CHUNK].tobytes().hex()
+            hash_ids += [text[i:i + 64] for i in range(0, len(text), 64)]
+        return hash_ids
+
+    def patterns(self):
+        """Returns the index into `circuits` of every ballot's vote circuit, in casting order."""
+        self._seal()
+        return self._patterns[:self._count].copy()
+
+    def items(self):
+        """Yields (hash ID, vote circuit) pairs in casting order, materializing circuits one at a time."""
+        patterns = self.patterns()
+        for hash_id, pattern in zip(self.hash_ids(), patterns.tolist()):
+            yield hash_id, self.circuits[pattern]
+
+    def values(self):
+        """Yields every ballot's vote circuit in casting order."""
+        for pattern in self.patterns().tolist():
+            yield self.circuits[pattern]
+
+    def find_missing(self, hash_ids):
+        """
+        Checks a batch of hash IDs against the store in one vectorized lookup.
+
+        Args:
+            hash_ids (list): Hex hash IDs to check.
+
+        Returns:
+            tuple: (hash IDs not in the store, in batch order, lookup counters)
+        """
+        import numpy as np
+
+        self._seal()
+        keys = np.empty(len(hash_ids), dtype='S32')
+        valid = np.ones(len(hash_ids), dtype=bool)
+        for i, hash_id in enumerate(hash_ids):
+            try:
+                digest = bytes.fromhex(hash_id)
+            except (TypeError, ValueError):
+                digest = b''
+            if len(digest) == 32:
+                keys[i] = digest
+            else:
+                valid[i] = False
+        found = np.zeros(len(hash_ids), dtype=bool)
+        if self._count:
+            positions = np.minimum(np.searchsorted(self._digests[:self._count], keys, sorter=self._order),
+                                   self._count - 1)
+            found = valid & (self._digests[self._order[positions]] == keys)
+        missing = [hash_ids[i] for i in np.flatnonzero(~found)]
+        return missing, {'index_lookups': len(hash_ids)}
+
+    def stats(self):
+        """Returns the store's size and footprint as a dict for export."""
+        return {'ballots': len(self), 'patterns': len(self.circuits), 'capacity': len(self._digests),
+                'bytes': self._digests.nbytes + self._patterns.nbytes + self._order.nbytes}
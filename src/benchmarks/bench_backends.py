@@ -0,0 +1,70 @@
+"""Benchmark matrix of the simulator backends on ballot-sized circuits.
+
+Usage (from the src directory):
+    python benchmarks/bench_backends.py --candidates 4 16 256 1024 --shots 1 1000 100000
+
+Every backend runs each kind of circuit we tally: a signed one-hot vote, a signed
+approval vote (half of the candidates approved) and the blockchain simulation's
+entangled vote. Times are the best of --repeat runs after a warm-up run, so the
+one-off backend creation and transpilation (cached per vote pattern) are left out.
+Each run gets a fresh copy of the circuit, so distributions are not cached. The
+last column shows the backend the registry selects automatically.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import Voter  # noqa: E402
+from backends import BACKENDS  # noqa: E402
+from blockchain import build_vote_circuit  # noqa: E402
+from tally import register_width  # noqa: E402
+
+
+def ballot_circuits(num_candidates):
+    """Returns the circuits of each kind for an election with `num_candidates` candidates."""
+    voter = Voter('voter', '0000', '0000')
+    return {
+        'one-hot': voter.signed_vote_circuit([1 if c == num_candidates - 1 else 0 for c in range(num_candidates)]),
+        'approval': voter.signed_vote_circuit([c % 2 for c in range(num_candidates)]),
+        'entangled': build_vote_circuit(num_candidates - 1, register_width(num_candidates)),
+    }
+
+
+def time_backend(name, circuit, shots, repeat):
+    """Returns the best time of running `circuit` on a backend, or None if it cannot run it."""
+    backend = BACKENDS.get(name)
+    if not backend.supports(circuit):
+        return None
+    backend.run([circuit], shots, seed=1)  # Warm up: creation and transpilation
+    best = float('inf')
+    for _ in range(repeat):
+        # A fresh copy each time, so cached distributions of the same circuit object do not count
+        copy = circuit.copy()
+        start = time.perf_counter()
+        backend.run([copy], shots, seed=1)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--candidates', type=int, nargs='+', default=[4, 16, 256, 1024])
+    parser.add_argument('--shots', type=int, nargs='+', default=[1, 1000, 100000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    names = BACKENDS.names()
+    print(f"{'circuit':<10} {'qubits':>6} {'shots':>7} " + ' '.join(f"{name:>15}" for name in names) + '  selected')
+    for num_candidates in args.candidates:
+        for kind, circuit in ballot_circuits(num_candidates).items():
+            for shots in args.shots:
+                times = [time_backend(name, circuit, shots, args.repeat) for name in names]
+                cells = ' '.join(f"{'-':>15}" if t is None else f"{t * 1000:>12.3f} ms" for t in times)
+                print(f"{kind:<10} {circuit.num_qubits:>6} {shots:>7} {cells}  {BACKENDS.select(circuit, shots).name}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Measure the memory a Tallyman needs per stored ballot.
+
+Usage (from the src directory):
+    python benchmarks/bench_ballot_memory.py --voters 1000000
+
+Three layouts are compared, each filled with the same one-hot votes for 4 candidates:
+a dict holding a freshly built circuit per voter (limited to --circuit-voters, it is
+slow to build), a dict of hex hash IDs sharing cached circuits, and the array-backed
+BallotStore the Tallyman now uses. Memory is what tracemalloc sees still allocated
+once the ballots are stored.
+"""
+import argparse
+import gc
+import hashlib
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import Tallyman, Voter  # noqa: E402
+from ballots import BallotStore  # noqa: E402
+
+
+def one_hot(choice):
+    """Approval vector for a single candidate out of 4."""
+    return [1 if c == choice else 0 for c in range(4)]
+
+
+def fill(store, num_voters, circuit):
+    """Stores `num_voters` ballots using `circuit(voter, vote)` to build each vote circuit."""
+    voter = Voter('voter', '0000', '0000')
+    for i in range(num_voters):
+        hash_id = hashlib.sha256(f"voter{i}".encode()).hexdigest()
+        vote_circuit = circuit(voter, one_hot(i % 4))
+        if isinstance(store, dict):
+            store[hash_id] = vote_circuit
+        else:
+            store.add(hash_id, vote_circuit)
+    return store
+
+
+def measure(name, num_voters, build):
+    """Prints the bytes still allocated per ballot after `build()` has stored them."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    store = build()
+    seconds = time.perf_counter() - start
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<24} {num_voters:>9} ballots  {current / num_voters:>8.1f} B/ballot  "
+          f"peak {peak / num_voters:>8.1f} B/ballot  {seconds:.2f}s")
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--voters', type=int, default=1000000)
+    parser.add_argument('--circuit-voters', type=int, default=2000,
+                        help='Ballots stored with a circuit of their own.')
+    args = parser.parse_args()
+
+    # Build the shared circuits outside the measurements
+    for choice in range(4):
+        Voter('voter', '0000', '0000').signed_vote_circuit(one_hot(choice))
+
+    measure('dict, circuit per voter', args.circuit_voters,
+            lambda: fill({}, args.circuit_voters, lambda voter, vote: voter.sign_vote(voter.encode_vote(vote))))
+    measure('dict, shared circuits', args.voters,
+            lambda: fill({}, args.voters, Voter.signed_vote_circuit))
+    store = measure('BallotStore', args.voters,
+                    lambda: fill(BallotStore(), args.voters, Voter.signed_vote_circuit))
+
+    tallyman = Tallyman()
+    tallyman.voter_database = store
+    start = time.perf_counter()
+    results = tallyman.tally_votes(seed=1)
+    print(f"analytic tally of the store: {time.perf_counter() - start:.2f}s {results}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Measure how the parallel tally scales with the number of worker processes.
+
+Usage (from the src directory):
+    python benchmarks/bench_parallel_tally.py --voters 200000 --workers 1 2 4 8 --simulate
+
+Every run uses the same seed, so besides timing each worker count the benchmark
+checks that the counts are identical however many workers tallied the shards.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import Tallyman, Voter  # noqa: E402
+from tally import TALLY_SHARD_SIZE  # noqa: E402
+
+
+def build_tallyman(num_voters, num_candidates):
+    """Fill a Tallyman with approval ballots, so the tally actually has to sample outcomes."""
+    tallyman = Tallyman(num_candidates)
+    for i in range(num_voters):
+        voter_id, secret_key_AB, secret_key_AC = tallyman.issue_voter_id(f"voter{i}")
+        voter = Voter(voter_id, secret_key_AB, secret_key_AC)
+        vote = [(i >> candidate) & 1 for candidate in range(num_candidates)]
+        tallyman.store_vote(voter.hash_id, voter.signed_vote_circuit(vote))
+    return tallyman
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--voters', type=int, default=100000)
+    parser.add_argument('--candidates', type=int, default=4)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument('--shard-size', type=int, default=TALLY_SHARD_SIZE)
+    parser.add_argument('--seed', type=int, default=2024)
+    parser.add_argument('--simulate', action='store_true', help='Run the shards on Aer instead of analytically.')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    tallyman = build_tallyman(args.voters, args.candidates)
+    shards = -(-args.voters // args.shard_size)
+    print(f"{args.voters} voters in {shards} shards, {'Aer' if args.simulate else 'analytic'} shards")
+    print(f"{'workers':>8} {'seconds':>10} {'voters/s':>12} {'speedup':>8}  counts")
+
+    baseline, reference = None, None
+    for workers in sorted(set(args.workers)):
+        best = float('inf')
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            counts = tallyman.tally_votes(mode='parallel', chunk_size=args.shard_size, workers=workers,
+                                          seed=args.seed, simulate=args.simulate)
+            best = min(best, time.perf_counter() - start)
+        baseline = baseline or best
+        reference = reference or counts
+        flag = '' if counts == reference else '  MISMATCH'
+        print(f"{workers:>8} {best:>10.4f} {args.voters / best:>12.1f} {baseline / best:>7.2f}x  {counts}{flag}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Measure live results fan-out to many concurrent /results/stream watchers.
+
+Start the app on one threaded gunicorn worker with a throwaway database first, e.g. (from src):
+    QVOTE_DATABASE=/tmp/qvote-bench.db flask --app app init-db
+    QVOTE_DATABASE=/tmp/qvote-bench.db gunicorn -w 1 -k gthread --threads 2100 -b 127.0.0.1:5000 app:app
+
+then run (raise the open file limit, e.g. `ulimit -n 8192`, for thousands of watchers):
+    python benchmarks/bench_results_stream.py --url http://127.0.0.1:5000 --watchers 2000 --votes 20
+
+All watchers share one logged-in session and are multiplexed over plain sockets with a
+selector, so the client side stays cheap. Each vote's fan-out latency is the time from
+sending its POST until the last watcher has received its event.
+"""
+import argparse
+import selectors
+import socket
+import threading
+import time
+import urllib.parse
+import uuid
+
+from bench_vote_load import cast_vote, logged_in_client
+
+VOTE_EVENT = b'event: vote\n'
+
+
+def session_cookie(opener):
+    """Returns the Cookie header value of a logged-in opener."""
+    cookies = next(handler.cookiejar for handler in opener.handlers if hasattr(handler, 'cookiejar'))
+    return '; '.join(f"{cookie.name}={cookie.value}" for cookie in cookies)
+
+
+def open_watchers(url, cookie, count, selector):
+    """Opens `count` streaming connections and registers them with the selector."""
+    parts = urllib.parse.urlsplit(url)
+    request = (f"GET /results/stream HTTP/1.1\r\nHost: {parts.netloc}\r\nCookie: {cookie}\r\n"
+               f"Accept: text/event-stream\r\n\r\n").encode()
+    watchers = []
+    for _ in range(count):
+        sock = socket.create_connection((parts.hostname, parts.port or 80))
+        sock.sendall(request)
+        sock.setblocking(False)
+        watcher = {'events': 0, 'tail': b'', 'arrivals': []}
+        selector.register(sock, selectors.EVENT_READ, watcher)
+        watchers.append(watcher)
+    return watchers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--watchers', type=int, default=1000)
+    parser.add_argument('--votes', type=int, default=20)
+    parser.add_argument('--interval', type=float, default=0.2, help='Seconds between votes.')
+    args = parser.parse_args()
+
+    run_id = uuid.uuid4().hex[:8]
+    cookie = session_cookie(logged_in_client(args.url, f"watch_{run_id}"))
+    voters = [logged_in_client(args.url, f"stream_{run_id}_{i}") for i in range(args.votes)]
+
+    selector = selectors.DefaultSelector()
+    start = time.perf_counter()
+    watchers = open_watchers(args.url, cookie, args.watchers, selector)
+    print(f"watchers:     {len(watchers)} connected in {time.perf_counter() - start:.2f}s")
+
+    sent = []
+
+    def vote():
+        time.sleep(1.0)  # Let every stream send its snapshot first
+        for i, opener in enumerate(voters):
+            sent_at = time.perf_counter()
+            cast_vote(args.url, opener, i % 4 + 1)
+            sent.append(sent_at)
+            time.sleep(args.interval)
+
+    voting = threading.Thread(target=vote)
+    voting.start()
+    deadline = time.perf_counter() + 1.0 + args.votes * (args.interval + 1.0) + 10
+    while time.perf_counter() < deadline and any(w['events'] < args.votes for w in watchers):
+        for key, _ in selector.select(timeout=0.5):
+            data = key.fileobj.recv(65536)
+            watcher = key.data
+            buffer = watcher['tail'] + data
+            received = buffer.count(VOTE_EVENT)
+            watcher['arrivals'] += [time.perf_counter()] * received
+            watcher['events'] += received
+            watcher['tail'] = buffer[-(len(VOTE_EVENT) - 1):]
+            if not data:
+                selector.unregister(key.fileobj)
+    voting.join()
+    for key in list(selector.get_map().values()):
+        key.fileobj.close()
+
+    latencies = sorted(max(w['arrivals'][i] for w in watchers) - sent[i]
+                       for i in range(len(sent)) if all(len(w['arrivals']) > i for w in watchers))
+    delivered = sum(w['events'] for w in watchers)
+    print(f"votes:        {len(sent)}")
+    print(f"delivered:    {delivered} of {len(sent) * len(watchers)} events")
+    if latencies:
+        print(f"fan-out p50:  {latencies[len(latencies) // 2] * 1000:.1f} ms")
+        print(f"fan-out max:  {latencies[-1] * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Measure import (startup) time of the Q-Vote apps with `python -X importtime`.
+
+Usage (from the src directory):
+    python benchmarks/bench_startup.py --modules app blockchain --history startup_history.jsonl
+
+Each run prints the slowest imports and, with --history, appends one JSON line per
+module so startup cost can be tracked across commits.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_times(module):
+    """Imports `module` in a fresh interpreter and returns {imported module: cumulative microseconds}."""
+    # Importing must not touch a database, but point the app at a throwaway one in case it ever does
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, QVOTE_DATABASE=os.path.join(tmp, 'startup.db'))
+        completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                                   cwd=SRC_DIR, env=env, capture_output=True, text=True, check=True)
+    times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def git_revision():
+    """Returns the current commit hash, or None outside a git checkout."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SRC_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modules', nargs='+', default=['app', 'blockchain'])
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per module; the best one is reported.')
+    parser.add_argument('--top', type=int, default=10, help='Number of slowest imports to list.')
+    parser.add_argument('--history', help='JSONL file to append the results to.')
+    args = parser.parse_args()
+
+    revision = git_revision()
+    for module in args.modules:
+        runs = [import_times(module) for _ in range(args.repeat)]
+        best = min(runs, key=lambda times: times[module])
+        print(f"{module}: {best[module] / 1000:.1f} ms")
+        slowest = sorted(((t, name) for name, t in best.items() if name != module), reverse=True)
+        for cumulative, name in slowest[:args.top]:
+            print(f"    {cumulative / 1000:>8.1f} ms  {name}")
+
+        if args.history:
+            record = {'time': time.time(), 'revision': revision, 'module': module,
+                      'import_ms': best[module] / 1000, 'python': sys.version.split()[0]}
+            with open(args.history, 'a', encoding='utf-8') as handle:
+                handle.write(json.dumps(record) + '\n')
+
+
+if __name__ == '__main__':
+    main()
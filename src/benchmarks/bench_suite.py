@@ -0,0 +1,197 @@
+"""Run the voting pipeline benchmark suite against a throwaway database and write JSON results.
+
+Usage (from the src directory):
+    python benchmarks/bench_suite.py --output results.json
+    python benchmarks/bench_suite.py --output new.json --compare results.json
+
+Micro-benchmarks time Voter.encode_vote, Voter.sign_vote, Tallyman.tally_votes at
+several ballot counts and the blockchain app's /vote; the load test drives the
+register -> login -> vote -> results flow through Flask's test client, with one
+client per simulated voter. Everything runs in-process on a temporary SQLite
+database, so the suite needs no server.
+
+The JSON records the git revision and the settings next to every result, so runs
+of different commits can be compared: --compare reports the change of each result
+against a previous run and exits with status 1 when one got slower than
+--tolerance allows.
+"""
+import argparse
+import importlib
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_startup import git_revision  # noqa: E402
+
+
+def best_time(fn, repeat, number):
+    """Returns the best mean seconds per call of `fn` over `repeat` runs of `number` calls."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def percentiles(samples):
+    """Returns the p50, p95 and max of a list of latencies, in seconds."""
+    samples = sorted(samples)
+    return {'p50': samples[len(samples) // 2], 'p95': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+            'max': samples[-1]}
+
+
+def micro_benchmarks(args):
+    """Times the building blocks of the pipeline; returns {name: result}."""
+    import blockchain
+    from app import Voter, issue_ballots
+
+    voter = Voter('voter_1234', '0101', '1010')
+    one_hot = [0, 0, 1, 0]
+    approval = [1, 1, 0, 1]
+    vote_circuit = voter.encode_vote(list(one_hot))
+    results = {
+        'voter.encode_vote.one_hot': {'seconds': best_time(lambda: voter.encode_vote(list(one_hot)),
+                                                            args.repeat, 200)},
+        'voter.encode_vote.approval': {'seconds': best_time(lambda: voter.encode_vote(list(approval)),
+                                                             args.repeat, 200)},
+        'voter.sign_vote': {'seconds': best_time(lambda: voter.sign_vote(vote_circuit), args.repeat, 200)},
+        'voter.signed_vote_circuit.cached': {'seconds': best_time(lambda: voter.signed_vote_circuit(one_hot),
+                                                                   args.repeat, 2000)},
+    }
+
+    rng = random.Random(1)
+    for ballots in args.ballots:
+        start = time.perf_counter()
+        tallyman = issue_ballots([(f"voter{i}", rng.randrange(4)) for i in range(ballots)], 4, seed=1)
+        results[f"issue_ballots.{ballots}"] = {'seconds': time.perf_counter() - start, 'ballots': ballots}
+        for mode in args.modes:
+            results[f"tally_votes.{mode}.{ballots}"] = {
+                'seconds': best_time(lambda: tallyman.tally_votes(mode=mode, workers=0), args.repeat, 1),
+                'ballots': ballots}
+
+    client = blockchain.app.test_client()
+    for voters in args.simulated_voters:
+        url = f"/vote?voters={voters}&seed=1"
+        results[f"blockchain.vote.{voters}"] = {
+            'seconds': best_time(lambda: client.get(url), args.repeat, 5), 'voters': voters}
+    return results
+
+
+def voter_flow(client, username, candidate):
+    """Registers, logs in, votes and reads the results as one voter; returns {step: seconds}."""
+    steps = (
+        ('register', lambda: client.post('/register', data={'username': username, 'password': 'benchmark'})),
+        ('login', lambda: client.post('/login', data={'username': username, 'password': 'benchmark'})),
+        ('vote', lambda: client.post('/vote', data={'candidate': candidate})),
+        ('results', lambda: client.get('/results')),
+    )
+    timings = {}
+    for step, request in steps:
+        start = time.perf_counter()
+        response = request()
+        timings[step] = time.perf_counter() - start
+        if response.status_code >= 400:
+            raise RuntimeError(f"{step} for {username} answered {response.status_code}")
+    return timings
+
+
+def load_test(args):
+    """Runs the register -> login -> vote -> results flow for --voters voters; returns {name: result}."""
+    import app
+
+    def run(i):
+        return voter_flow(app.app.test_client(), f"load_{i}", i % 4 + 1)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        flows = list(pool.map(run, range(args.voters)))
+    elapsed = time.perf_counter() - start
+
+    results = {'load.flow': {'seconds': elapsed / args.voters, 'voters': args.voters,
+                             'concurrency': args.concurrency, 'voters_per_second': args.voters / elapsed}}
+    for step in flows[0]:
+        latencies = percentiles([flow[step] for flow in flows])
+        results[f"load.{step}"] = {'seconds': latencies['p50'], **latencies}
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Prints each result's change against a baseline run; returns the names that regressed."""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get('results', {}).get(name)
+        if not before or not before.get('seconds'):
+            continue
+        ratio = result['seconds'] / before['seconds']
+        slower = ratio > 1 + tolerance
+        if slower:
+            regressions.append(name)
+        print(f"{name:<40} {before['seconds'] * 1000:>10.3f} ms -> {result['seconds'] * 1000:>10.3f} ms  "
+              f"{ratio:>5.2f}x{'  REGRESSION' if slower else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--ballots', type=int, nargs='+', default=[10, 1000, 100000],
+                        help='Ballot counts Tallyman.tally_votes is timed at.')
+    parser.add_argument('--modes', nargs='+', default=['analytic', 'batched', 'parallel'],
+                        help='Tally modes to time (parallel runs its shards inline).')
+    parser.add_argument('--simulated-voters', type=int, nargs='+', default=[4, 100000],
+                        help='Voters per blockchain /vote simulation.')
+    parser.add_argument('--voters', type=int, default=50, help='Voters going through the load test flow.')
+    parser.add_argument('--concurrency', type=int, default=4, help='Voters going through the flow at once.')
+    parser.add_argument('--hash-iterations', type=int, default=600000,
+                        help='PBKDF2 iterations for the load test (the production default is 600000).')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per micro-benchmark; the best one is kept.')
+    parser.add_argument('--skip-load', action='store_true', help='Only run the micro-benchmarks.')
+    parser.add_argument('--output', help='File to write the JSON results to (default: stdout).')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare against.')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Slowdown (as a fraction) tolerated by --compare before it reports a regression.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # The app reads its settings when it is imported, so point it at the throwaway database first
+        os.environ['QVOTE_DATABASE'] = os.path.join(tmp, 'bench.db')
+        os.environ['QVOTE_HASH_ITERATIONS'] = str(args.hash_iterations)
+        importlib.import_module('app')
+
+        results = micro_benchmarks(args)
+        if not args.skip_load:
+            results.update(load_test(args))
+
+    report = {
+        'revision': git_revision(),
+        'time': time.time(),
+        'python': sys.version.split()[0],
+        'machine': {'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'settings': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'results': results,
+    }
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            handle.write(text + '\n')
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as handle:
+            regressions = compare(results, json.load(handle), args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} result(s) regressed by more than {args.tolerance:.0%}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Benchmark the Tallyman tally modes against each other.
+
+Simulated modes run on Aer, as they did before the backend registry existed;
+pass `--backend auto` to let the registry pick (one-hot ballots are then
+counted classically) or name another backend. The analytic mode computes the
+ballots' distributions without a simulator, so its backend shows as "-".
+
+Usage (from the src directory):
+    python benchmarks/bench_tally.py --voters 10 100 1000 --backend aer_qasm
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import Tallyman, Voter  # noqa: E402
+from backends import BACKENDS  # noqa: E402
+from tally import CIRCUIT_CACHE  # noqa: E402
+
+
+def build_tallyman(num_voters):
+    """Fill a Tallyman with `num_voters` signed one-hot vote circuits."""
+    tallyman = Tallyman()
+    for i in range(num_voters):
+        voter_id, secret_key_AB, secret_key_AC = tallyman.issue_voter_id(f"voter{i}")
+        voter = Voter(voter_id, secret_key_AB, secret_key_AC)
+        choice = random.randrange(4)
+        tallyman.store_vote(voter.hash_id, voter.signed_vote_circuit([1 if c == choice else 0 for c in range(4)]))
+    return tallyman
+
+
+def time_mode(tallyman, mode, repeat, backend=None):
+    """Return the best wall-clock time of `repeat` tallies in the given mode, on `backend` (default: selected)."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        tallyman.tally_votes(mode=mode, backend=backend)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--voters', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--modes', nargs='+', default=['serial', 'batched', 'analytic'])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--backend', default='aer_qasm', choices=['auto'] + BACKENDS.names(),
+                        help='Backend of the simulated modes (default: aer_qasm; auto selects per circuit).')
+    args = parser.parse_args()
+    backend = None if args.backend == 'auto' else args.backend
+
+    print(f"{'voters':>8} {'mode':>10} {'backend':>16} {'seconds':>10} {'voters/s':>12}")
+    for num_voters in args.voters:
+        tallyman = build_tallyman(num_voters)
+        for mode in args.modes:
+            elapsed = time_mode(tallyman, mode, args.repeat, backend)
+            label = '-' if mode == 'analytic' else args.backend
+            print(f"{num_voters:>8} {mode:>10} {label:>16} {elapsed:>10.4f} {num_voters / elapsed:>12.1f}")
+    print("Circuit cache:", CIRCUIT_CACHE.stats())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Benchmark batch ballot verification against the ledger index, with and without the Bloom filter.
+
+Usage (from the src directory):
+    python benchmarks/bench_verify.py --ledger 1000000 --batch 1000000 --present 0.5
+
+A throwaway database is filled with synthetic ledger entries; the batch mixes
+recorded hash IDs with unknown ones in the given proportion.
+"""
+import argparse
+import hashlib
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import Scrutineer  # noqa: E402
+from ledger import BallotIndex, create_ledger_tables  # noqa: E402
+
+
+def synthetic_hash_ids(prefix, count):
+    """Returns `count` distinct hex SHA-256 hash IDs."""
+    return [hashlib.sha256(f"{prefix}{i}".encode()).hexdigest() for i in range(count)]
+
+
+def build_ledger(path, hash_ids):
+    """Creates a ledger holding `hash_ids` and returns a connection to it."""
+    conn = sqlite3.connect(path)
+    create_ledger_tables(conn)
+    conn.executemany('INSERT INTO ledger_entries (election_id, hash_id, digest) VALUES (1, ?, ?)',
+                     ((hash_id, bytes(32)) for hash_id in hash_ids))
+    conn.commit()
+    return conn
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--ledger', type=int, default=1000000, help='Ballots recorded in the ledger.')
+    parser.add_argument('--batch', type=int, default=1000000, help='Hash IDs verified per batch.')
+    parser.add_argument('--present', type=float, default=0.5, help='Share of the batch that is recorded.')
+    args = parser.parse_args()
+
+    recorded = synthetic_hash_ids('voter', args.ledger)
+    present = int(args.batch * args.present)
+    batch = random.sample(recorded, min(present, len(recorded))) + synthetic_hash_ids('unknown', args.batch - present)
+    random.shuffle(batch)
+
+    scrutineer = Scrutineer('0000')
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        conn = build_ledger(os.path.join(tmp, 'ledger.db'), recorded)
+        print(f"ledger:       {args.ledger} entries built in {time.perf_counter() - start:.1f}s")
+
+        for name, index in (('index only', BallotIndex(bloom=False)), ('bloom+index', BallotIndex(bloom=True))):
+            if index.bloom:
+                start = time.perf_counter()
+                index.find_missing(conn, 1, [])  # Build the filter outside the measurement
+                print(f"bloom build:  {time.perf_counter() - start:.2f}s")
+            report = scrutineer.verify_votes(batch, index, conn, 1)
+            counters = {key: value for key, value in report.items() if key not in ('missing_sample', 'seconds')}
+            print(f"{name:<13} {report['seconds']:.2f}s  {len(batch) / report['seconds']:>12.0f} IDs/s  {counters}")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Load-test vote POST throughput against a running Q-Vote server.
+
+Start the app under gunicorn with a throwaway database first, e.g. (from src):
+    QVOTE_DATABASE=/tmp/qvote-bench.db flask --app app init-db
+    QVOTE_DATABASE=/tmp/qvote-bench.db gunicorn -w 4 --threads 4 -b 127.0.0.1:5000 app:app
+
+then run:
+    python benchmarks/bench_vote_load.py --url http://127.0.0.1:5000 --voters 400 --concurrency 32
+"""
+import argparse
+import http.cookiejar
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Keep redirects as responses so each request is timed on its own."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+def logged_in_client(base_url, username):
+    """Register and log in a fresh voter, returning an opener carrying its session cookie."""
+    opener = urllib.request.build_opener(
+        urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), NoRedirect())
+    credentials = urllib.parse.urlencode({'username': username, 'password': 'benchmark'}).encode()
+    for path in ('/register', '/login'):
+        post(opener, base_url + path, credentials)
+    return opener
+
+
+def post(opener, url, data):
+    """POST form data and return the HTTP status code."""
+    try:
+        with opener.open(url, data=data) as response:
+            return response.status
+    except urllib.error.HTTPError as err:
+        return err.code
+
+
+def cast_vote(base_url, opener, candidate):
+    """Cast one vote and return (status, seconds)."""
+    data = urllib.parse.urlencode({'candidate': candidate}).encode()
+    start = time.perf_counter()
+    status = post(opener, base_url + '/vote', data)
+    return status, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--voters', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args()
+
+    run_id = uuid.uuid4().hex[:8]
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        # Registration and login are not part of the measured vote path
+        openers = list(pool.map(lambda i: logged_in_client(args.url, f"bench_{run_id}_{i}"),
+                                range(args.voters)))
+
+        start = time.perf_counter()
+        outcomes = list(pool.map(lambda item: cast_vote(args.url, item[1], item[0] % 4 + 1),
+                                 enumerate(openers)))
+        elapsed = time.perf_counter() - start
+
+    latencies = sorted(seconds for _, seconds in outcomes)
+    failures = sum(1 for status, _ in outcomes if status != 302)
+    print(f"votes:        {len(outcomes)} ({failures} failed)")
+    print(f"concurrency:  {args.concurrency}")
+    print(f"throughput:   {len(outcomes) / elapsed:.1f} votes/s")
+    print(f"latency p50:  {latencies[len(latencies) // 2] * 1000:.1f} ms")
+    print(f"latency p99:  {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,33 +1,138 @@
-from flask import Flask, render_template, jsonify
-import random
-import numpy as np
-from qiskit import QuantumCircuit
-from qiskit_aer import Aer
-from qiskit.visualization import plot_histogram
-import matplotlib.pyplot as plt
-import io
+from flask import Flask, render_template, jsonify, request, make_response, url_for, abort
+import zlib
 import base64
+import secrets
+from backends import BACKENDS
+from metrics import instrument_app
+from rendering import HISTOGRAM_CACHE
+from tally import register_width
 
 # Constants for quantum voting
 NUM_CANDIDATES = 4  # Number of candidates in the election
-NUM_QUBITS = 2      # Number of qubits needed (2 qubits can represent 4 states, 00, 01, 10, 11)
 NUM_VOTERS = 4     # Number of voters participating in the voting simulation
+MAX_CANDIDATES = 256       # Upper bound for the `candidates` request parameter
+MAX_VOTERS = 10_000_000    # Upper bound for the `voters` request parameter
+# Longest decoded counts text and simulation id accepted by the histogram route
+MAX_COUNTS_TEXT_LENGTH = 2 ** register_width(MAX_CANDIDATES) * (len(str(MAX_VOTERS)) + 1)
+MAX_SIMULATION_ID_LENGTH = 2 * MAX_COUNTS_TEXT_LENGTH
 
-# Function to encode votes using amplitude encoding into a quantum circuit
-def amplitude_encoding(vote_vec, quantum_circuit):
+def build_vote_circuit(vote_choice, num_qubits):
     """
-    Encodes a vote vector into a quantum circuit using amplitude encoding.
-    
+    Builds the measured voting circuit for a single candidate choice.
+
+    Args:
+        vote_choice (int): Index of the chosen candidate.
+        num_qubits (int): Width of the register holding the one-hot vote.
+
+    Returns:
+        QuantumCircuit: The encoded, entangled and measured vote circuit.
+    """
+    from qiskit import QuantumCircuit  # Imported on first use, see warmup.py
+
+    qc = QuantumCircuit(num_qubits, num_qubits)
+
+    # A one-hot vote vector is the basis state |vote_choice>, so prepare it with X gates on its set bits
+    # instead of a dense amplitude encoding over all 2**num_qubits states
+    for qubit in range(num_qubits):
+        if vote_choice >> qubit & 1:
+            qc.x(qubit)
+
+    # Apply Hadamard gate to create superposition and entangle the first qubit with the others
+    qc.h(0)
+    for target in range(1, num_qubits):
+        qc.cx(0, target)
+
+    # Measure the qubits and store the results in classical bits
+    qc.measure(list(range(num_qubits)), list(range(num_qubits)))
+    return qc
+
+def simulate_votes(num_voters, num_candidates, rng=None, seed=None):
+    """
+    Simulates an election with randomly chosen votes.
+
+    The number of voters choosing each candidate is drawn as one multinomial sample, and each
+    distinct choice is simulated with a single multi-shot job (shots = number of voters who made
+    that choice), so time and memory grow with the number of candidates rather than voters. Each job runs on the backend
+    the process-wide registry selects for it (see backends.py).
+
     Args:
-        vote_vec (list): A list representing a vote vector (one-hot encoded).
-        quantum_circuit (QuantumCircuit): A quantum circuit object to encode the vote.
+        num_voters (int): Number of simulated voters.
+        num_candidates (int): Number of candidates to choose from.
+        rng (numpy.random.Generator): Random generator used to draw the votes.
+        seed (int): Seed for a new generator when `rng` is not given. The simulator seeds are
+            drawn from the generator too, so a seeded simulation is fully reproducible.
+
+    Returns:
+        dict: Counts for every measured outcome, keyed by bitstring.
+    """
+    import numpy as np
+
+    rng = rng if rng is not None else np.random.default_rng(seed)
+    num_qubits = register_width(num_candidates)
+
+    # Draw how many voters chose each candidate directly, without materializing every voter's choice
+    voters_per_choice = rng.multinomial(num_voters, [1 / num_candidates] * num_candidates)
+
+    vote_counts = {format(outcome, f'0{num_qubits}b'): 0 for outcome in range(2 ** num_qubits)}
+    for vote_choice, shots in enumerate(voters_per_choice):
+        if shots == 0:
+            continue
+        qc = build_vote_circuit(vote_choice, num_qubits)
+        seed_simulator = int(rng.integers(2 ** 31))
+        counts = BACKENDS.run([qc], shots=int(shots), seed=seed_simulator)[0]
+
+        # Update vote counts based on the measurement outcomes
+        for outcome, count in counts.items():
+            vote_counts[outcome] += count
+    return vote_counts
+
+# A simulation's id holds its counts, so the histogram endpoint can be served by any worker process
+# without keeping simulations around
+def encode_simulation(vote_counts):
+    """
+    Encodes a simulation's counts as its id.
+
+    Args:
+        vote_counts (dict): Counts for every measured outcome, keyed by bitstring.
+
+    Returns:
+        str: URL-safe id holding the compressed counts in outcome order.
     """
-    norm = np.linalg.norm(vote_vec)  # Normalize the vote vector
-    normalized_vector = vote_vec / norm
-    quantum_circuit.initialize(normalized_vector, [0, 1])  # Initialize the circuit with the normalized vector
+    packed = zlib.compress(','.join(str(count) for _, count in sorted(vote_counts.items())).encode())
+    return base64.urlsafe_b64encode(packed).decode().rstrip('=')
+
+def decode_simulation(simulation_id):
+    """
+    Decodes the counts held by a simulation id made by `encode_simulation`.
+
+    Args:
+        simulation_id (str): The simulation id.
+
+    Returns:
+        dict | None: Counts keyed by measured bitstring, or None if the id is not a valid simulation id.
+    """
+    if len(simulation_id) > MAX_SIMULATION_ID_LENGTH:
+        return None
+    try:
+        packed = base64.urlsafe_b64decode(simulation_id + '=' * (-len(simulation_id) % 4))
+        decompressor = zlib.decompressobj()
+        text = decompressor.decompress(packed, MAX_COUNTS_TEXT_LENGTH)  # Bounded, ids come from anyone
+        if not decompressor.eof:
+            return None
+        counts = [int(count) for count in text.decode('ascii').split(',')]
+    except (ValueError, zlib.error):
+        return None
+
+    # Only what /vote can produce: one count per outcome of a register of up to MAX_CANDIDATES
+    num_qubits = len(counts).bit_length() - 1
+    if (not 2 <= len(counts) <= 2 ** register_width(MAX_CANDIDATES) or len(counts) != 2 ** num_qubits
+            or min(counts) < 0 or sum(counts) > MAX_VOTERS):
+        return None
+    return {format(outcome, f'0{num_qubits}b'): count for outcome, count in enumerate(counts)}
 
 # Flask app initialization
 app = Flask(__name__)
+instrument_app(app)  # Request timings, served with the simulation and render timings at /metrics
 
 # Homepage route
 @app.route('/')
@@ -43,70 +148,80 @@ def vote():
     """
     Route to simulate a quantum voting system. It simulates votes from multiple voters, 
     encodes them into quantum circuits, and then determines the winner based on the quantum measurement results.
+
+    Query parameters:
+        voters (int): Number of simulated voters (default NUM_VOTERS).
+        candidates (int): Number of candidates (default NUM_CANDIDATES).
+        seed (int): Seed of the simulation (default: random); the same seed gives the same counts.
     
     Returns:
         JSON response containing:
             - vote_counts: A dictionary with the counts of each vote outcome.
             - winner: The winner candidate based on the highest vote count.
             - votes: The total number of votes received by the winner.
-            - image: Base64-encoded image of the vote distribution histogram.
+            - id: Identifier of this simulation, which holds its counts.
+            - seed: Seed that reproduces this simulation.
+            - histogram_url: URL of the vote distribution histogram PNG.
+            - image: Base64-encoded histogram, only when requested with image=1.
     """
-    vote_counts = {'00': 0, '01': 0, '10': 0, '11': 0}  # Dictionary to store vote counts for each candidate (binary)
-
-    for _ in range(NUM_VOTERS):
-        # Create a new quantum circuit for each voter with 2 qubits and 2 classical bits
-        qc = QuantumCircuit(NUM_QUBITS, NUM_QUBITS)
-
-        # Generate a random vote for one of the 4 candidates (represented as binary 00, 01, 10, 11)
-        vote_choice = random.randint(0, NUM_CANDIDATES - 1)
-
-        # Create a one-hot encoded vote vector (e.g., [0, 1, 0, 0] for vote 01)
-        vote_vector = [0] * NUM_CANDIDATES
-        vote_vector[vote_choice] = 1
-
-        # Encode the vote in the quantum circuit using amplitude encoding
-        amplitude_encoding(vote_vector, qc)
-
-        # Apply Hadamard gate to create superposition and entangle qubits
-        qc.h(0)  # Apply Hadamard gate on the first qubit
-        qc.cx(0, 1)  # Entangle the first qubit with the second
-
-        # Measure the qubits and store the results in classical bits
-        qc.measure([0, 1], [0, 1])
-
-        # Use Aer's qasm_simulator to simulate the quantum circuit
-        backend = Aer.get_backend('qasm_simulator')
-
-        # Run the circuit and simulate with 1 shot (single vote measurement per voter)
-        job = backend.run(qc, shots=1)
-        result = job.result()
-        counts = result.get_counts(qc)  # Get the result of the quantum measurement
-
-        # Update vote counts based on the measurement outcomes
-        for outcome in counts:
-            vote_counts[outcome] += 1
-
-        print(vote_counts)
-
-    # Determine the winner by finding the candidate with the highest vote count
-    winner = max(vote_counts, key=vote_counts.get)
+    try:
+        num_voters = int(request.args.get('voters', NUM_VOTERS))
+        num_candidates = int(request.args.get('candidates', NUM_CANDIDATES))
+        seed = int(request.args['seed']) if 'seed' in request.args else secrets.randbits(63)
+    except ValueError:
+        return jsonify({'error': 'voters, candidates and seed must be integers'}), 400
+    if not 1 <= num_voters <= MAX_VOTERS or not 2 <= num_candidates <= MAX_CANDIDATES:
+        return jsonify({'error': f'voters must be in 1..{MAX_VOTERS} and candidates in 2..{MAX_CANDIDATES}'}), 400
+
+    if seed < 0:
+        return jsonify({'error': 'seed must not be negative'}), 400
+
+    vote_counts = simulate_votes(num_voters, num_candidates, seed=seed)
+
+    # Determine the winner by finding the candidate with the highest vote count; the register can hold
+    # more outcomes than there are candidates, and those padding states never win
+    candidate_counts = {outcome: count for outcome, count in vote_counts.items() if int(outcome, 2) < num_candidates}
+    winner = max(candidate_counts, key=candidate_counts.get)
     winner_candidate = int(winner, 2)  # Convert binary string to integer (candidate number)
 
-    # Plot the histogram of the vote counts and encode it as a base64 image
-    fig = plt.figure()
-    plot_histogram(vote_counts)  # Plot the voting results as a histogram
-    buf = io.BytesIO()  # Create an in-memory byte stream for the image
-    plt.savefig(buf, format='png')  # Save the plot as a PNG image to the byte stream
-    buf.seek(0)
-    img_base64 = base64.b64encode(buf.getvalue()).decode()  # Convert the image to base64 format
-
-    # Return the vote counts, winner information, and histogram image as a JSON response
-    return jsonify({
+    simulation_id = encode_simulation(vote_counts)
+    response = {
+        'id': simulation_id,
+        'seed': seed,
         'vote_counts': vote_counts,
         'winner': winner_candidate,
         'votes': vote_counts[winner],
-        'image': img_base64
-    })
+        'histogram_url': url_for('vote_histogram', simulation_id=simulation_id),
+    }
+
+    # Inline the histogram only for clients that explicitly ask for it
+    if request.args.get('image') == '1':
+        png, _ = HISTOGRAM_CACHE.get(vote_counts)
+        response['image'] = base64.b64encode(png).decode()  # Convert the image to base64 format
+
+    # Return the vote counts, winner information and histogram location as a JSON response
+    return jsonify(response)
+
+# Histogram route, rendered lazily and cached
+@app.route('/vote/<simulation_id>/histogram.png')
+def vote_histogram(simulation_id):
+    """
+    Route serving the vote distribution histogram of a simulation as a PNG.
+
+    The id holds the counts (see encode_simulation), so any worker can serve it. Supports
+    conditional requests: a matching If-None-Match header gets a 304 response.
+    """
+    vote_counts = decode_simulation(simulation_id)
+    if vote_counts is None:
+        abort(404)
+
+    png, etag = HISTOGRAM_CACHE.get(vote_counts)
+    response = make_response(png)
+    response.mimetype = 'image/png'
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = 3600  # A simulation's counts never change
+    return response.make_conditional(request)
 
 # Main function to start the Flask application
 if __name__ == '__main__':
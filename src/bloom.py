@@ -0,0 +1,95 @@
+"""Vectorized Bloom filter for fast negative membership answers.
+
+A Bloom filter never reports a present item as absent, and reports an absent one
+as (possibly) present with a configurable false positive rate. Items are hashed
+once with BLAKE2b, except for lowercase hex SHA-256 digests such as voter hash
+IDs, whose bits are used as they are. That choice is made per item, so an item
+gets the same positions in whatever batch it is added or tested. The k bit
+positions are derived from the two halves of the digest (double hashing), and
+whole batches are set or tested with NumPy.
+
+NumPy is imported on first use, see warmup.py.
+"""
+import hashlib
+import math
+import re
+
+# False positive rate used when none is given
+BLOOM_ERROR_RATE = 0.01
+# A lowercase hex SHA-256 digest, whose bits can be used without hashing again
+HEX_DIGEST = re.compile('[0-9a-f]{64}')
+
+
+class BloomFilter:
+    """
+    Bloom filter over strings sized for `capacity` items.
+
+    Args:
+        capacity (int): Number of items the filter is sized for; adding more raises the error rate.
+        error_rate (float): Target false positive rate at `capacity` items.
+    """
+
+    def __init__(self, capacity, error_rate=BLOOM_ERROR_RATE):
+        import numpy as np
+
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.num_bits = math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.count = 0
+        self._bits = np.zeros((self.num_bits + 7) // 8, dtype=np.uint8)
+
+    def _positions(self, items):
+        import numpy as np
+
+        # Decided per item: the positions of an item must not depend on the rest of its batch
+        hex_digest = [HEX_DIGEST.fullmatch(item) is not None for item in items]
+        halves = np.empty((len(items), 2), dtype=np.uint64)
+        mask = np.array(hex_digest, dtype=bool)
+        if mask.any():
+            # Hex SHA-256 digests (like voter hash IDs) are uniform already; use their first 16 bytes
+            digests = bytes.fromhex(''.join(item for item, is_hex in zip(items, hex_digest) if is_hex))
+            halves[mask] = np.frombuffer(digests, dtype='<u8').reshape(-1, 4)[:, :2]
+        if not mask.all():
+            digests = b''.join(hashlib.blake2b(item.encode(), digest_size=16).digest()
+                               for item, is_hex in zip(items, hex_digest) if not is_hex)
+            halves[~mask] = np.frombuffer(digests, dtype='<u8').reshape(-1, 2)
+        steps = np.arange(self.num_hashes, dtype=np.uint64)
+        # Unsigned arithmetic wraps around, which is fine for deriving positions
+        return (halves[:, :1] + steps * halves[:, 1:]) % np.uint64(self.num_bits)
+
+    def add_many(self, items):
+        """Adds a batch of strings to the filter."""
+        import numpy as np
+
+        items = list(items)
+        if not items:
+            return
+        positions = self._positions(items).ravel()
+        np.bitwise_or.at(self._bits, positions >> np.uint64(3),
+                         np.left_shift(1, positions & np.uint64(7)).astype(np.uint8))
+        self.count += len(items)
+
+    def contains_many(self, items):
+        """
+        Tests a batch of strings.
+
+        Args:
+            items (list): Strings to test.
+
+        Returns:
+            numpy.ndarray: Booleans, False where an item is certainly absent.
+        """
+        import numpy as np
+
+        items = list(items)
+        if not items:
+            return np.zeros(0, dtype=bool)
+        positions = self._positions(items)
+        bits = (self._bits[positions >> np.uint64(3)] >> (positions & np.uint64(7)).astype(np.uint8)) & 1
+        return bits.all(axis=1)
+
+    def stats(self):
+        """Returns the filter's size and fill as a dict for export."""
+        return {'capacity': self.capacity, 'count': self.count, 'num_bits': self.num_bits,
+                'num_hashes': self.num_hashes, 'error_rate': self.error_rate}
@@ -0,0 +1,82 @@
+"""In-process publish/subscribe for live election updates.
+
+Committed votes are published into one bounded event log per process. Publishing
+costs the same however many clients are watching: the event is written once
+into a ring buffer and a single condition is notified. Subscribers only keep a
+cursor (the sequence number of the next event they want) and read the events
+they have not seen yet straight from the shared buffer; one that falls further
+behind than the buffer holds is told so, and resynchronises from a snapshot.
+
+Events only reach subscribers in the process that published them, so run the
+streaming endpoint with threads (e.g. gunicorn -k gthread) rather than relying
+on several worker processes seeing each other's votes.
+"""
+import threading
+
+# Number of recent events kept for subscribers that are catching up
+EVENT_LOG_SIZE = 4096
+
+
+class EventLog:
+    """
+    Bounded log of events that many threads can wait on.
+
+    Args:
+        size (int): Number of recent events kept in the ring buffer.
+    """
+
+    def __init__(self, size=EVENT_LOG_SIZE):
+        self.size = size
+        self._ring = [None] * size
+        self._next_seq = 0  # Sequence number the next published event gets
+        self._cond = threading.Condition()
+        self.subscribers = 0
+
+    @property
+    def head(self):
+        """The cursor of a subscriber that only wants events published from now on."""
+        with self._cond:
+            return self._next_seq
+
+    def publish(self, event):
+        """Appends an event and wakes every waiting subscriber; returns its sequence number."""
+        with self._cond:
+            seq = self._next_seq
+            self._ring[seq % self.size] = event
+            self._next_seq = seq + 1
+            self._cond.notify_all()
+        return seq
+
+    def read(self, cursor, timeout=None):
+        """
+        Returns the events published at or after `cursor`, waiting up to `timeout` seconds for one.
+
+        Args:
+            cursor (int): Sequence number of the first event wanted.
+            timeout (float): Seconds to wait when there is nothing new (None waits forever).
+
+        Returns:
+            tuple: (events, next cursor, lost) where `lost` tells that events before the
+            oldest one still in the buffer were dropped and the caller has to resynchronise.
+        """
+        with self._cond:
+            if cursor >= self._next_seq:
+                self._cond.wait_for(lambda: self._next_seq > cursor, timeout)
+            oldest = max(self._next_seq - self.size, 0)
+            start = max(cursor, oldest)
+            events = [self._ring[seq % self.size] for seq in range(start, self._next_seq)]
+            return events, self._next_seq, cursor < oldest
+
+    def subscribed(self, delta):
+        """Tracks the number of connected subscribers (+1 on connect, -1 on disconnect)."""
+        with self._cond:
+            self.subscribers += delta
+
+    def stats(self):
+        """Returns the log counters as a dict for export."""
+        with self._cond:
+            return {'published': self._next_seq, 'subscribers': self.subscribers, 'size': self.size}
+
+
+# Process-wide log of committed votes, fed by the vote handler
+ELECTION_EVENTS = EventLog()
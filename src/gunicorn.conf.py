@@ -0,0 +1,8 @@
+# Gunicorn settings for the Q-Vote apps (run from src, or pass -c src/gunicorn.conf.py --chdir src)
+
+
+def on_starting(server):
+    """Load the quantum and plotting libraries in the master so forked workers share them."""
+    import warmup  # Resolved from src, which gunicorn has put on sys.path by now
+    warmup.preload()
+    server.log.info("Preloaded %s", ", ".join(warmup.HEAVY_MODULES))
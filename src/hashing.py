@@ -0,0 +1,174 @@
+"""Password hashing offloaded to a bounded process pool.
+
+PBKDF2 is deliberately CPU-bound, so hashing on the request thread lets a login
+storm starve the web workers. `HashingExecutor` runs the work in a process pool
+with a bounded number of in-flight jobs; when it is full, callers get
+`HasherBusy` straight away (served as a 503) instead of queueing behind it.
+A hash keeps its slot until its process has finished it, even if the caller gave
+up waiting, and a pool whose process died is replaced on the next call.
+
+Tuning is read from the environment:
+    QVOTE_HASH_ITERATIONS  PBKDF2 iterations for new hashes (default 600000)
+    QVOTE_HASH_WORKERS     hashing processes, 0 hashes inline (default: CPU count)
+    QVOTE_HASH_QUEUE_SIZE  maximum in-flight hashes per web worker (default: 4 x workers)
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+HASH_ITERATIONS = int(os.environ.get('QVOTE_HASH_ITERATIONS', 600000))
+HASH_SALT_LENGTH = 16
+HASH_WORKERS = int(os.environ.get('QVOTE_HASH_WORKERS', os.cpu_count() or 1))
+HASH_QUEUE_SIZE = int(os.environ.get('QVOTE_HASH_QUEUE_SIZE', 4 * max(HASH_WORKERS, 1)))
+HASH_TIMEOUT_SECONDS = 30  # Give up on a queued hash rather than holding the request forever
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing executor is saturated and cannot take more work."""
+
+
+def hash_password(password, iterations=HASH_ITERATIONS):
+    """
+    Hashes a password with PBKDF2-SHA256.
+
+    Args:
+        password (str): The plain-text password.
+        iterations (int): PBKDF2 iteration count; stored in the hash, so it can change over time.
+
+    Returns:
+        str: The werkzeug password hash.
+    """
+    return generate_password_hash(password, method=f'pbkdf2:sha256:{iterations}', salt_length=HASH_SALT_LENGTH)
+
+
+def verify_password(password_hash, password):
+    """Checks a password against a stored hash, using the iterations recorded in the hash."""
+    return check_password_hash(password_hash, password)
+
+
+class HashingExecutor:
+    """
+    Runs password hashing in a process pool with a bounded queue.
+
+    Args:
+        workers (int): Number of hashing processes; 0 hashes on the calling thread.
+        queue_size (int): Maximum number of hashes submitted but not yet finished.
+    """
+
+    def __init__(self, workers=HASH_WORKERS, queue_size=HASH_QUEUE_SIZE):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pool_pid = None
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def _get_pool(self):
+        # Created lazily, so every forked gunicorn worker gets its own pool; the hashing processes
+        # are spawned rather than forked from a web worker that may already be running threads
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _discard_pool(self, pool):
+        """Drops a broken pool, so the next call starts a fresh one."""
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False)
+
+    def _finish(self, start, succeeded):
+        """Releases a hash's slot once it is done and records how it went."""
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.in_flight -= 1
+            if succeeded:
+                self.completed += 1
+                self.latency_total += elapsed
+                self.latency_max = max(self.latency_max, elapsed)
+            else:
+                self.failed += 1
+        self._slots.release()
+
+    def run(self, fn, *args):
+        """Runs `fn(*args)` on the pool and waits for it, raising HasherBusy if saturated."""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HasherBusy("Password hashing queue is full")
+
+        start = time.perf_counter()
+        with self._lock:
+            self.in_flight += 1
+        if self.workers == 0:
+            succeeded = False
+            try:
+                result = fn(*args)
+                succeeded = True
+                return result
+            finally:
+                self._finish(start, succeeded)
+
+        pool = self._get_pool()
+        try:
+            future = pool.submit(fn, *args)
+        except BrokenProcessPool:
+            self._discard_pool(pool)
+            self._finish(start, False)
+            raise HasherBusy("Password hashing pool is restarting") from None
+        except BaseException:
+            self._finish(start, False)
+            raise
+        # The slot is only free again once a process has actually finished the hash
+        future.add_done_callback(lambda done: self._finish(
+            start, not done.cancelled() and done.exception() is None))
+        try:
+            return future.result(timeout=HASH_TIMEOUT_SECONDS)
+        except FutureTimeoutError:
+            raise HasherBusy("Password hashing timed out") from None
+        except BrokenProcessPool:
+            # A hashing process died; replace the pool rather than failing every later hash too
+            self._discard_pool(pool)
+            raise HasherBusy("Password hashing pool is restarting") from None
+
+    def hash(self, password):
+        """Hashes a password on the pool."""
+        return self.run(hash_password, password)
+
+    def verify(self, password_hash, password):
+        """Verifies a password on the pool."""
+        return self.run(verify_password, password_hash, password)
+
+    def stats(self):
+        """Returns queue depth and latency counters as a dict for export."""
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'queue_size': self.queue_size,
+                'queue_depth': self.in_flight,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'latency_avg_seconds': self.latency_total / self.completed if self.completed else 0.0,
+                'latency_max_seconds': self.latency_max,
+                'iterations': HASH_ITERATIONS,
+            }
+
+
+# Process-wide executor used by the request handlers
+HASHER = HashingExecutor()
@@ -0,0 +1,157 @@
+"""Background jobs keyed by election state, shared by every process on the database.
+
+A `StateKeyedJob` runs one function at a time on a worker thread. Each run is
+tagged with the election state it was started for (e.g. the number of votes
+cast), so callers can cheaply ask for a refresh whenever the state moves on and
+always read the last completed result without waiting.
+
+The job's state, progress and last result live in the `jobs` table rather than
+in memory. A run is claimed in a write transaction, so however many web
+workers ask for the same state, only one of them runs it and all of them report
+the same status. A run whose process died stops sending heartbeats and can be
+claimed again once it is `stale_after` seconds quiet.
+
+States and results are stored as JSON, so tuples read back as lists and
+mappings need string keys; jobs should return lists or JSON objects.
+
+A failed run's traceback is logged on the server; its status only names the
+exception type, since statuses are served to users.
+"""
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
+
+JOB_STALE_SECONDS = 600  # A running job without a heartbeat for this long is presumed dead
+JOB_HEARTBEAT_SECONDS = 1.0  # Progress is written at most this often
+
+
+def create_jobs_table(conn):
+    """Creates the table holding every job's state if it does not exist yet (caller commits)."""
+    conn.execute('''CREATE TABLE IF NOT EXISTS jobs (
+                    name TEXT PRIMARY KEY,
+                    running_state TEXT,
+                    started_at REAL,
+                    heartbeat_at REAL,
+                    done INTEGER NOT NULL DEFAULT 0,
+                    total INTEGER NOT NULL DEFAULT 0,
+                    last_state TEXT,
+                    last_result TEXT,
+                    last_finished_at REAL,
+                    last_error TEXT,
+                    failed_state TEXT)''')
+
+
+class StateKeyedJob:
+    """
+    Runs `fn(state, progress)` in the background whenever a new state is requested.
+
+    Args:
+        name (str): Name of the job's row in the `jobs` table, also used for the worker thread.
+        fn (callable): Job body. It receives the requested state and a `progress(done, total)`
+            callback, and returns the (JSON-serializable) job result.
+        connect (callable): Opens a new connection to the database holding the `jobs` table,
+            for the worker thread.
+        executor (Executor): Executor to run on, e.g. one shared by many jobs
+            (default: a dedicated single worker thread).
+        stale_after (float): Seconds without progress after which a running job may be restarted.
+    """
+
+    def __init__(self, name, fn, connect, executor=None, stale_after=JOB_STALE_SECONDS):
+        self.name = name
+        self.fn = fn
+        self.connect = connect
+        self.stale_after = stale_after
+        self._executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+
+    def refresh(self, conn, state):
+        """
+        Starts a run for `state` unless one is running or `state` was already completed (or failed).
+
+        Args:
+            conn (sqlite3.Connection): Connection used to claim the run; must not be in a transaction.
+            state: JSON-serializable state to run the job for.
+
+        Returns:
+            bool: True if this call claimed the run and submitted it to the executor.
+        """
+        encoded = json.dumps(state)
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')  # Claims are serialized by the database's write lock
+        try:
+            row = conn.execute('SELECT running_state, heartbeat_at, last_state, failed_state FROM jobs '
+                               'WHERE name = ?', (self.name,)).fetchone()
+            if row is not None:
+                running_state, heartbeat_at, last_state, failed_state = row
+                alive = running_state is not None and now - heartbeat_at < self.stale_after
+                if alive or encoded in (last_state, failed_state):
+                    conn.rollback()
+                    return False
+            conn.execute('''INSERT INTO jobs (name, running_state, started_at, heartbeat_at) VALUES (?, ?, ?, ?)
+                            ON CONFLICT (name) DO UPDATE SET running_state = excluded.running_state,
+                                started_at = excluded.started_at, heartbeat_at = excluded.heartbeat_at,
+                                done = 0, total = 0''', (self.name, encoded, now, now))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        self._executor.submit(self._run, state, encoded)
+        return True
+
+    def _run(self, state, encoded):
+        conn = self.connect()
+        last_heartbeat = 0.0
+
+        def report(done, total):
+            nonlocal last_heartbeat
+            now = time.time()
+            if now - last_heartbeat >= JOB_HEARTBEAT_SECONDS or done == total:
+                conn.execute('UPDATE jobs SET done = ?, total = ?, heartbeat_at = ? '
+                             'WHERE name = ? AND running_state = ?', (done, total, now, self.name, encoded))
+                conn.commit()
+                last_heartbeat = now
+
+        try:
+            try:
+                result, error = self.fn(state, report), None
+            except Exception as err:
+                log.exception("Job %s failed for state %r", self.name, state)
+                result, error = None, type(err).__name__
+            # A run that went stale and was claimed again leaves the row to its successor
+            if error is None:
+                conn.execute('''UPDATE jobs SET last_state = running_state, last_result = ?, failed_state = NULL,
+                                    last_error = NULL, last_finished_at = ?, running_state = NULL
+                                WHERE name = ? AND running_state = ?''',
+                             (json.dumps(result), time.time(), self.name, encoded))
+            else:
+                conn.execute('''UPDATE jobs SET failed_state = running_state, last_error = ?,
+                                    last_finished_at = ?, running_state = NULL
+                                WHERE name = ? AND running_state = ?''',
+                             (error, time.time(), self.name, encoded))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def status(self, conn):
+        """Returns the job status, progress and last completed result as a JSON-friendly dict."""
+        row = conn.execute('''SELECT running_state, started_at, done, total, last_state, last_result,
+                                     last_finished_at, last_error
+                              FROM jobs WHERE name = ?''', (self.name,)).fetchone()
+        if row is None:
+            row = (None, None, 0, 0, None, None, None, None)
+        running_state, started_at, done, total, last_state, last_result, last_finished_at, last_error = row
+        running = running_state is not None
+        return {
+            'job': self.name,
+            'status': 'running' if running else ('failed' if last_error else 'idle'),
+            'running_state': json.loads(running_state) if running else None,
+            'progress': {'done': done, 'total': total,
+                         'fraction': done / total if total else (0.0 if running else 1.0)},
+            'started_at': started_at if running else None,
+            'last_state': json.loads(last_state) if last_state is not None else None,
+            'last_result': json.loads(last_result) if last_result is not None else None,
+            'last_finished_at': last_finished_at,
+            'last_error': last_error,
+        }
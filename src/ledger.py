@@ -0,0 +1,382 @@
+"""Append-only, hash-chained ballot ledger.
+
+Every cast ballot is recorded as a ledger entry holding the voter's anonymous
+hash ID and a digest of the signed vote circuit. Entries are grouped into
+blocks of LEDGER_BLOCK_SIZE; each block stores the Merkle root of its entries
+and the hash of the previous block, so changing any recorded ballot breaks the
+chain.
+
+Appending an entry is a single insert. A block is sealed in the same
+transaction as the append that fills it, so sealing costs O(1) per entry and
+the ledger is written (and fsynced) once per block rather than once per node.
+All Merkle tree nodes are kept, so an inclusion proof for one ballot takes
+O(log n) lookups and can be checked without scanning the chain. Batches of hash
+IDs are verified against the unique (election, hash ID) index by `BallotIndex`,
+with an optional Bloom filter in front for fast negative answers. Hash IDs are
+only unique within an election: a voter's ID is re-derived from each election's
+seed, so the same user can get the same ID in two elections.
+
+The tables live in the election database; callers own the transactions.
+"""
+import hashlib
+import threading
+
+from bloom import BLOOM_ERROR_RATE, BloomFilter
+
+# Entries per block
+LEDGER_BLOCK_SIZE = 1024
+
+# Hash IDs looked up per query when verifying a batch (below SQLite's variable limit)
+VERIFY_LOOKUP_CHUNK = 500
+# Smallest Bloom filter built in front of the ballot index
+BLOOM_MIN_CAPACITY = 100000
+# Missing hash IDs listed in a verification report
+REPORT_MISSING_SAMPLE = 20
+
+# Previous-block hash of the first block
+GENESIS_HASH = bytes(32)
+
+
+def circuit_digest(circuit):
+    """
+    Returns the SHA-256 digest of a signed vote circuit's instructions.
+
+    Cached vote circuits are shared by every voter with the same vote, so the digest
+    is memoized in the circuit's metadata.
+
+    Args:
+        circuit (QuantumCircuit): The signed vote circuit.
+
+    Returns:
+        bytes: The 32-byte digest.
+    """
+    if circuit.metadata and 'digest' in circuit.metadata:
+        return circuit.metadata['digest']
+
+    digest = hashlib.sha256()
+    for instruction in circuit.data:
+        digest.update(repr((instruction.operation.name,
+                            [complex(param) for param in instruction.operation.params],
+                            [circuit.find_bit(qubit).index for qubit in instruction.qubits],
+                            [circuit.find_bit(clbit).index for clbit in instruction.clbits])).encode())
+    circuit.metadata = {**(circuit.metadata or {}), 'digest': digest.digest()}
+    return circuit.metadata['digest']
+
+
+def leaf_hash(hash_id, digest):
+    """Hashes one ledger entry into a Merkle leaf (domain-separated from inner nodes)."""
+    return hashlib.sha256(b'\x00' + hash_id.encode() + b'\x00' + digest).digest()
+
+
+def node_hash(left, right):
+    """Hashes two Merkle children into their parent."""
+    return hashlib.sha256(b'\x01' + left + right).digest()
+
+
+def merkle_levels(leaves):
+    """
+    Builds every level of a Merkle tree, from the leaves up to the root.
+
+    An odd node at the end of a level is promoted unchanged to the next level.
+
+    Args:
+        leaves (list): Leaf hashes.
+
+    Returns:
+        list: The levels as lists of hashes; the last level holds only the root.
+    """
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        levels.append([node_hash(level[i], level[i + 1]) if i + 1 < len(level) else level[i]
+                       for i in range(0, len(level), 2)])
+    return levels
+
+
+def block_hash(height, prev_hash, merkle_root, first_seq, last_seq):
+    """Hashes a block header, linking it to the previous block."""
+    header = height.to_bytes(8, 'big') + first_seq.to_bytes(8, 'big') + last_seq.to_bytes(8, 'big')
+    return hashlib.sha256(prev_hash + merkle_root + header).digest()
+
+
+def create_ledger_tables(conn):
+    """Creates the ledger tables if they do not exist yet (caller commits)."""
+    # Hash IDs are only unique within their election, see ballot_hash_id in app.py
+    conn.execute('''CREATE TABLE IF NOT EXISTS ledger_entries (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    election_id INTEGER NOT NULL,
+                    hash_id TEXT NOT NULL,
+                    digest BLOB NOT NULL,
+                    UNIQUE (election_id, hash_id))''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS ledger_blocks (
+                    height INTEGER PRIMARY KEY,
+                    prev_hash BLOB NOT NULL,
+                    merkle_root BLOB NOT NULL,
+                    first_seq INTEGER NOT NULL,
+                    last_seq INTEGER NOT NULL UNIQUE,
+                    block_hash BLOB NOT NULL)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS ledger_nodes (
+                    height INTEGER NOT NULL,
+                    level INTEGER NOT NULL,
+                    position INTEGER NOT NULL,
+                    hash BLOB NOT NULL,
+                    PRIMARY KEY (height, level, position)) WITHOUT ROWID''')
+
+
+def append_entries(conn, election_id, entries, block_size=LEDGER_BLOCK_SIZE):
+    """
+    Appends ballots to the ledger and seals every block they fill (caller commits).
+
+    Args:
+        conn (sqlite3.Connection): Connection inside the transaction recording the ballots.
+        election_id (int): Election the ballots were cast in.
+        entries (list): (hash_id, digest) pairs in the order the ballots were cast.
+        block_size (int): Entries per block.
+
+    Returns:
+        list: Heights of the blocks sealed.
+    """
+    conn.executemany('INSERT INTO ledger_entries (election_id, hash_id, digest) VALUES (?, ?, ?)',
+                     [(election_id, hash_id, digest) for hash_id, digest in entries])
+    return seal_blocks(conn, block_size)
+
+
+def head_block(conn):
+    """Returns the newest block row, or None while the ledger has no blocks."""
+    return conn.execute('SELECT * FROM ledger_blocks ORDER BY height DESC LIMIT 1').fetchone()
+
+
+def seal_blocks(conn, block_size=LEDGER_BLOCK_SIZE, force=False):
+    """
+    Seals pending entries into blocks of `block_size` (caller commits).
+
+    Args:
+        conn (sqlite3.Connection): Connection inside a write transaction.
+        block_size (int): Entries per block.
+        force (bool): Also seal a final, partially filled block (e.g. when an election closes).
+
+    Returns:
+        list: Heights of the blocks sealed.
+    """
+    sealed = []
+    head = head_block(conn)
+    while True:
+        last_seq = head['last_seq'] if head else 0
+        # Runs on every vote: the newest sequence number bounds the pending count with one index
+        # lookup, so the entries are only read once a block can be full
+        newest_seq = conn.execute('SELECT MAX(seq) FROM ledger_entries').fetchone()[0] or 0
+        if newest_seq - last_seq < (1 if force else block_size):
+            return sealed
+        pending = conn.execute('SELECT seq, hash_id, digest FROM ledger_entries WHERE seq > ? ORDER BY seq LIMIT ?',
+                               (last_seq, block_size)).fetchall()
+        if not pending or (len(pending) < block_size and not force):
+            return sealed
+
+        levels = merkle_levels([leaf_hash(row['hash_id'], row['digest']) for row in pending])
+        height = head['height'] + 1 if head else 0
+        prev_hash = head['block_hash'] if head else GENESIS_HASH
+        first_seq, last_seq = pending[0]['seq'], pending[-1]['seq']
+        conn.execute('''INSERT INTO ledger_blocks (height, prev_hash, merkle_root, first_seq, last_seq, block_hash)
+                        VALUES (?, ?, ?, ?, ?, ?)''',
+                     (height, prev_hash, levels[-1][0], first_seq, last_seq,
+                      block_hash(height, prev_hash, levels[-1][0], first_seq, last_seq)))
+        conn.executemany('INSERT INTO ledger_nodes (height, level, position, hash) VALUES (?, ?, ?, ?)',
+                         [(height, level, position, node)
+                          for level, nodes in enumerate(levels) for position, node in enumerate(nodes)])
+        sealed.append(height)
+        head = head_block(conn)
+
+
+def inclusion_proof(conn, election_id, hash_id):
+    """
+    Builds the proof that a ballot is recorded in the ledger.
+
+    Args:
+        conn (sqlite3.Connection): Database connection.
+        election_id (int): Election the ballot was cast in.
+        hash_id (str): The voter's hash ID in that election.
+
+    Returns:
+        dict | None: None if there is no such ballot. Otherwise the entry, its `status`
+        ('pending' until its block is sealed) and, once sealed, the block header and the
+        Merkle path from the entry to the block's root (hashes in hex).
+    """
+    entry = conn.execute('SELECT seq, election_id, digest FROM ledger_entries WHERE election_id = ? AND hash_id = ?',
+                         (election_id, hash_id)).fetchone()
+    if entry is None:
+        return None
+    proof = {'hash_id': hash_id, 'election': entry['election_id'], 'seq': entry['seq'],
+             'digest': entry['digest'].hex(), 'status': 'pending'}
+
+    block = conn.execute('SELECT * FROM ledger_blocks WHERE last_seq >= ? ORDER BY last_seq LIMIT 1',
+                         (entry['seq'],)).fetchone()
+    if block is None:
+        return proof
+
+    # Walk up the tree, collecting the sibling of the node on the path at every level
+    index = entry['seq'] - block['first_seq']
+    width = block['last_seq'] - block['first_seq'] + 1
+    path, level = [], 0
+    while width > 1:
+        sibling = index ^ 1
+        if sibling < width:
+            node = conn.execute('SELECT hash FROM ledger_nodes WHERE height = ? AND level = ? AND position = ?',
+                                (block['height'], level, sibling)).fetchone()
+            path.append({'hash': node['hash'].hex(), 'side': 'left' if sibling < index else 'right'})
+        index, width, level = index // 2, (width + 1) // 2, level + 1
+
+    proof.update(status='sealed', leaf_index=entry['seq'] - block['first_seq'], path=path, block={
+        'height': block['height'], 'prev_hash': block['prev_hash'].hex(),
+        'merkle_root': block['merkle_root'].hex(), 'first_seq': block['first_seq'],
+        'last_seq': block['last_seq'], 'block_hash': block['block_hash'].hex()})
+    return proof
+
+
+def verify_proof(proof, trusted_block_hash=None):
+    """
+    Checks an inclusion proof: the Merkle path must lead to the block's root and the block
+    header must hash to its block hash (and to `trusted_block_hash`, when given).
+
+    Args:
+        proof (dict): A sealed proof as returned by `inclusion_proof`.
+        trusted_block_hash (str): Block hash obtained independently of the proof, in hex.
+
+    Returns:
+        bool: True if the ballot is provably recorded.
+    """
+    if not proof or proof.get('status') != 'sealed':
+        return False
+    node = leaf_hash(proof['hash_id'], bytes.fromhex(proof['digest']))
+    for step in proof['path']:
+        sibling = bytes.fromhex(step['hash'])
+        node = node_hash(sibling, node) if step['side'] == 'left' else node_hash(node, sibling)
+
+    block = proof['block']
+    expected = block_hash(block['height'], bytes.fromhex(block['prev_hash']), node,
+                          block['first_seq'], block['last_seq'])
+    return (node.hex() == block['merkle_root'] and expected.hex() == block['block_hash']
+            and trusted_block_hash in (None, block['block_hash']))
+
+
+def verify_chain(conn):
+    """
+    Audits the whole ledger: recomputes every block's Merkle root from its entries and checks
+    the hash links between blocks.
+
+    Returns:
+        list: Descriptions of the problems found; empty if the ledger is intact.
+    """
+    problems = []
+    prev_hash, next_seq = GENESIS_HASH, None
+    for block in conn.execute('SELECT * FROM ledger_blocks ORDER BY height'):
+        height = block['height']
+        if block['prev_hash'] != prev_hash:
+            problems.append(f"block {height}: does not link to the previous block")
+        if next_seq is not None and block['first_seq'] != next_seq:
+            problems.append(f"block {height}: entries do not follow on from the previous block")
+
+        entries = conn.execute('SELECT hash_id, digest FROM ledger_entries WHERE seq BETWEEN ? AND ? ORDER BY seq',
+                               (block['first_seq'], block['last_seq'])).fetchall()
+        root = merkle_levels([leaf_hash(row['hash_id'], row['digest']) for row in entries])[-1][0] if entries else None
+        if len(entries) != block['last_seq'] - block['first_seq'] + 1:
+            problems.append(f"block {height}: entries are missing")
+        if root != block['merkle_root']:
+            problems.append(f"block {height}: entries do not match the Merkle root")
+        if block_hash(height, block['prev_hash'], block['merkle_root'], block['first_seq'],
+                      block['last_seq']) != block['block_hash']:
+            problems.append(f"block {height}: header does not match the block hash")
+        prev_hash, next_seq = block['block_hash'], block['last_seq'] + 1
+    return problems
+
+
+def verification_report(hash_ids, missing, seconds, **stats):
+    """
+    Summarizes a batch verification.
+
+    Args:
+        hash_ids (list): The hash IDs checked.
+        missing (list): The ones not found.
+        seconds (float): Time the verification took.
+        **stats: Extra counters to include.
+
+    Returns:
+        dict: Counts, a bounded sample of the missing IDs and the counters.
+    """
+    return {'checked': len(hash_ids), 'verified': len(hash_ids) - len(missing), 'missing': len(missing),
+            'missing_sample': missing[:REPORT_MISSING_SAMPLE], 'seconds': seconds, **stats}
+
+
+class BallotIndex:
+    """
+    Batch membership checks of an election's hash IDs against the ledger's persistent index.
+
+    The optional Bloom filter answers most negatives in memory. It holds the hash IDs of
+    every election, so it can only let a few more candidates through to the index, which
+    answers for the election asked about. It is brought up to date
+    with the entries appended since it was last used (by any process) before every batch,
+    so it never hides a recorded ballot, and is rebuilt larger when it fills up.
+
+    Args:
+        bloom (bool): Put a Bloom filter in front of the index.
+        error_rate (float): False positive rate of the Bloom filter.
+    """
+
+    def __init__(self, bloom=True, error_rate=BLOOM_ERROR_RATE):
+        self.bloom = bloom
+        self.error_rate = error_rate
+        self._filter = None
+        self._filter_seq = 0  # Last ledger entry added to the filter
+        self._lock = threading.Lock()
+
+    def _refresh_filter(self, conn):
+        last_seq = conn.execute('SELECT MAX(seq) FROM ledger_entries').fetchone()[0] or 0
+        with self._lock:
+            if self._filter is None or last_seq > self._filter.capacity:
+                self._filter = BloomFilter(max(2 * last_seq, BLOOM_MIN_CAPACITY), self.error_rate)
+                self._filter_seq = 0
+            if last_seq > self._filter_seq:
+                cursor = conn.execute('SELECT hash_id FROM ledger_entries WHERE seq > ? AND seq <= ?',
+                                      (self._filter_seq, last_seq))
+                while True:
+                    rows = cursor.fetchmany(VERIFY_LOOKUP_CHUNK * 20)
+                    if not rows:
+                        break
+                    self._filter.add_many(row[0] for row in rows)
+                self._filter_seq = last_seq
+            return self._filter
+
+    def find_missing(self, conn, election_id, hash_ids):
+        """
+        Finds the hash IDs that are not recorded in the ledger for an election.
+
+        Args:
+            conn (sqlite3.Connection): Database connection.
+            election_id (int): Election the ballots were cast in.
+            hash_ids (list): Hash IDs to check.
+
+        Returns:
+            tuple: (missing hash IDs in input order, counters for the report).
+        """
+        candidates = hash_ids
+        stats = {'bloom_rejected': 0}
+        if self.bloom:
+            maybe_present = self._refresh_filter(conn).contains_many(hash_ids)
+            candidates = [hash_id for hash_id, maybe in zip(hash_ids, maybe_present) if maybe]
+            stats['bloom_rejected'] = len(hash_ids) - len(candidates)
+
+        # The unique (election_id, hash_id) index answers each chunk with one query
+        found = set()
+        for start in range(0, len(candidates), VERIFY_LOOKUP_CHUNK):
+            chunk = candidates[start:start + VERIFY_LOOKUP_CHUNK]
+            placeholders = ', '.join('?' * len(chunk))
+            found.update(row[0] for row in conn.execute(
+                f"SELECT hash_id FROM ledger_entries WHERE election_id = ? AND hash_id IN ({placeholders})",
+                [election_id, *chunk]))
+        stats['index_lookups'] = len(candidates)
+        if self.bloom:
+            stats['bloom_false_positives'] = len(set(candidates) - found)
+        return [hash_id for hash_id in hash_ids if hash_id not in found], stats
+
+
+# Process-wide index used by the Scrutineer
+BALLOT_INDEX = BallotIndex()
@@ -0,0 +1,291 @@
+"""Lightweight timing and counter metrics in the Prometheus text exposition format.
+
+Hot paths record into a few process-wide histograms (database queries, circuit
+builds, transpilation, simulation, rendering, requests and tallies). Recording an
+observation is a bisect and a few additions under a lock, so instrumentation
+stays cheap enough for per-query use. Values reported by other components (cache
+hit counters, queue depths) are exported through callbacks evaluated at scrape
+time. `/metrics` serves `METRICS.exposition()`.
+
+Metrics are kept per process; with several gunicorn workers each one reports
+its own, as the usual Prometheus multi-target setup expects.
+"""
+import bisect
+import math
+import threading
+import time
+
+# Content type of the text exposition format
+EXPOSITION_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Histogram bucket bounds in seconds, fine enough for sub-millisecond queries
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                   5.0, 10.0)
+
+
+def format_labels(names, values, extra=()):
+    """Renders a label set as `{name="value",...}` (empty if there are no labels)."""
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def format_value(value):
+    """Renders a sample value the way the exposition format spells it."""
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Timer:
+    """Context manager observing the seconds spent in its block into a histogram series."""
+
+    __slots__ = ('series', 'start')
+
+    def __init__(self, series):
+        self.series = series
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.series.observe(time.perf_counter() - self.start)
+
+
+class HistogramSeries:
+    """The buckets, sum and count of one label set of a histogram."""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count', '_lock')
+
+    def __init__(self, buckets, lock):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last bucket is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = lock
+
+    def observe(self, value):
+        """Records one observation."""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        """Returns a context manager timing its block into this series."""
+        return Timer(self)
+
+
+class Histogram:
+    """
+    Distribution of observed values (usually seconds) in cumulative buckets.
+
+    Args:
+        name (str): Metric name.
+        help (str): One-line description.
+        labelnames (tuple): Names of the labels every observation carries.
+        buckets (tuple): Increasing upper bounds of the buckets (+Inf is added).
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> HistogramSeries
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self.labels()  # Report zeros before the first observation
+
+    def labels(self, **labels):
+        """Returns the series of a label set; hot paths can keep it to skip the lookup."""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        series = self._series.get(key)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(key, HistogramSeries(self.buckets, self._lock))
+        return series
+
+    def observe(self, value, **labels):
+        """Records one observation."""
+        self.labels(**labels).observe(value)
+
+    def time(self, **labels):
+        """Returns a context manager timing its block into this histogram."""
+        return Timer(self.labels(**labels))
+
+    def samples(self):
+        """Yields (suffix, label values, extra labels, value) for the exposition."""
+        with self._lock:
+            series = {key: (list(s.counts), s.sum, s.count) for key, s in self._series.items()}
+        for key, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                yield '_bucket', key, (('le', format_value(bound)),), cumulative
+            yield '_sum', key, (), total
+            yield '_count', key, (), count
+
+
+class Counter:
+    """
+    Monotonically increasing count.
+
+    Args:
+        name (str): Metric name (conventionally ending in _total).
+        help (str): One-line description.
+        labelnames (tuple): Names of the labels every increment carries.
+    """
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {} if self.labelnames else {(): 0}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        """Adds `amount` to the count."""
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield '', key, (), value
+
+
+class Callback:
+    """
+    Metric whose value is read from a callback at scrape time.
+
+    Args:
+        name (str): Metric name.
+        help (str): One-line description.
+        read (callable): Returns the current value.
+        kind (str): 'gauge', or 'counter' for values that only grow.
+    """
+
+    labelnames = ()
+
+    def __init__(self, name, help, read, kind='gauge'):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.kind = kind
+
+    def samples(self):
+        yield '', (), (), self.read()
+
+
+class MetricsRegistry:
+    """The metrics of one process, rendered together by `exposition()`."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """Creates and registers a histogram."""
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def counter(self, name, help, labelnames=()):
+        """Creates and registers a counter."""
+        return self._register(Counter(name, help, labelnames))
+
+    def callback(self, name, help, read, kind='gauge'):
+        """Registers a value read from `read()` at scrape time (replacing one of the same name)."""
+        metric = Callback(name, help, read, kind)
+        with self._lock:
+            self._metrics[name] = metric
+        return metric
+
+    def exposition(self):
+        """Returns every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, key, extra, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{format_labels(metric.labelnames, key, extra)} "
+                             f"{format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+# Process-wide registry served by /metrics
+METRICS = MetricsRegistry()
+
+# Hot path timings, recorded by the modules that do the work
+DB_QUERY_SECONDS = METRICS.histogram(
+    'qvote_db_query_seconds', 'Time until an SQLite statement has run (or its first row is ready).', ('statement',))
+CIRCUIT_BUILD_SECONDS = METRICS.histogram(
+    'qvote_circuit_build_seconds', 'Time spent encoding and signing a vote circuit (circuit cache misses).')
+TRANSPILE_SECONDS = METRICS.histogram(
+    'qvote_transpile_seconds', 'Time spent transpiling circuits for a simulator.', ('target',))
+SIMULATE_SECONDS = METRICS.histogram(
+    'qvote_simulate_seconds', 'Time spent running a job of circuits on a simulator backend.', ('backend',))
+RENDER_SECONDS = METRICS.histogram(
+    'qvote_render_seconds', 'Time spent rendering a page template or histogram image.', ('what',))
+TALLY_SECONDS = METRICS.histogram(
+    'qvote_tally_seconds', 'Time spent in Tallyman.tally_votes.', ('mode',))
+VOTES_CAST_TOTAL = METRICS.counter('qvote_votes_cast_total', 'Votes committed by this process.')
+REQUEST_SECONDS = METRICS.histogram(
+    'qvote_request_seconds', 'Time until a response is ready to be sent (streams: until they start).',
+    ('endpoint', 'method'))
+
+
+def instrument_app(app):
+    """
+    Times a Flask app's requests and template renders, and serves the metrics at /metrics.
+
+    Args:
+        app (Flask): The app to instrument.
+    """
+    from flask import Response, before_render_template, g, request, template_rendered
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def observe_request(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=request.endpoint or 'unmatched',
+                                    method=request.method)
+        return response
+
+    def start_render_timer(sender, template, context, **extra):
+        g.render_started = time.perf_counter()
+
+    def observe_render(sender, template, context, **extra):
+        started = g.pop('render_started', None)
+        if started is not None:
+            RENDER_SECONDS.observe(time.perf_counter() - started, what=template.name or 'template')
+
+    before_render_template.connect(start_render_timer, app, weak=False)
+    template_rendered.connect(observe_render, app, weak=False)
+
+    @app.route('/metrics')
+    def metrics():
+        """Report this process's metrics in the Prometheus text exposition format."""
+        return Response(METRICS.exposition(), content_type=EXPOSITION_CONTENT_TYPE)
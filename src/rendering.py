@@ -0,0 +1,102 @@
+"""Histogram rendering for vote counts.
+
+Figures are drawn with matplotlib's object-oriented API on an Agg canvas, so no
+pyplot global state (and no leaked figures) is involved. Rendered PNGs are kept
+in a bounded LRU cache keyed by the counts, together with an ETag for
+conditional requests. matplotlib is only imported when the first histogram is
+rendered.
+"""
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+from metrics import RENDER_SECONDS
+
+# Maximum number of rendered histograms kept in memory
+HISTOGRAM_CACHE_SIZE = 128
+
+
+def counts_key(vote_counts):
+    """Returns a hashable, order-independent key for a counts dictionary."""
+    return tuple(sorted(vote_counts.items()))
+
+
+def render_histogram(vote_counts):
+    """
+    Renders vote counts as a bar chart PNG.
+
+    Args:
+        vote_counts (dict): Counts keyed by measured bitstring.
+
+    Returns:
+        bytes: The PNG image.
+    """
+    with RENDER_SECONDS.time(what='histogram'):
+        return draw_histogram(vote_counts)
+
+
+def draw_histogram(vote_counts):
+    """Draws the bar chart of `render_histogram` and returns it as PNG bytes."""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    outcomes = sorted(vote_counts)
+    values = [vote_counts[outcome] for outcome in outcomes]
+
+    fig = Figure(figsize=(7, 5))
+    FigureCanvasAgg(fig)
+    try:
+        ax = fig.add_subplot()
+        bars = ax.bar(range(len(outcomes)), values, color='#648fff', zorder=2)
+        ax.bar_label(bars, labels=[str(value) for value in values])
+        ax.set_xticks(range(len(outcomes)), outcomes, rotation=70)
+        ax.set_ylabel('Count', fontsize=14)
+        ax.grid(which='major', axis='y', zorder=0, linestyle='--')
+        fig.tight_layout()
+
+        buf = io.BytesIO()  # Create an in-memory byte stream for the image
+        fig.savefig(buf, format='png')
+        return buf.getvalue()
+    finally:
+        fig.clear()  # Release the artists right away instead of waiting for the garbage collector
+
+
+class HistogramCache:
+    """Bounded LRU cache of rendered histograms and their ETags."""
+
+    def __init__(self, maxsize=HISTOGRAM_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, vote_counts):
+        """Returns (png, etag) for the counts, rendering them on a miss."""
+        key = counts_key(vote_counts)
+        with self._lock:
+            entry = self._images.get(key)
+            if entry is not None:
+                self._images.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        png = render_histogram(vote_counts)
+        entry = (png, hashlib.sha256(png).hexdigest())
+        with self._lock:
+            self._images[key] = entry
+            while len(self._images) > self.maxsize:
+                self._images.popitem(last=False)
+        return entry
+
+    def stats(self):
+        """Returns the cache counters as a dict for export."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'size': len(self._images), 'maxsize': self.maxsize}
+
+
+# Process-wide cache shared by every request
+HISTOGRAM_CACHE = HistogramCache()
@@ -0,0 +1,136 @@
+"""Cache of rendered results pages, keyed by what the page shows.
+
+A results page only changes when its election's version (bumped by every vote
+commit, import and tally rebuild) or the status of its background recount
+changes, so every viewer in between can be served the same bytes. Snapshots are
+kept in a bounded in-process LRU cache, each with an ETag for conditional
+requests.
+
+Environment variables:
+    QVOTE_RESULTS_CACHE  path of an SQLite file through which the gunicorn workers
+                         share their snapshots, so a page rendered by one worker
+                         serves all of them (default: unset, per-process only);
+                         delete it when deploying changed templates
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Maximum number of rendered pages kept in memory (and in the shared file)
+SNAPSHOT_CACHE_SIZE = 64
+SNAPSHOT_CACHE_PATH = os.environ.get('QVOTE_RESULTS_CACHE') or None
+# How long a worker waits for another one writing to the shared file before giving up on it
+SNAPSHOT_BUSY_TIMEOUT_SECONDS = 1.0
+
+
+class SnapshotCache:
+    """
+    Bounded LRU cache of rendered pages and their ETags, optionally shared through an SQLite file.
+
+    Args:
+        maxsize (int): Number of snapshots kept.
+        path (str): SQLite file shared with other processes (default: none).
+    """
+
+    def __init__(self, maxsize=SNAPSHOT_CACHE_SIZE, path=SNAPSHOT_CACHE_PATH):
+        self.maxsize = maxsize
+        self.path = path
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self._pages = OrderedDict()  # key -> (body, etag)
+        self._lock = threading.Lock()
+        self._local = threading.local()  # Connection to the shared file, one per thread
+
+    def get(self, key, render):
+        """
+        Returns the snapshot of a page, rendering it on a miss.
+
+        Args:
+            key (tuple): Everything the page depends on; its repr identifies it in the shared file.
+            render (callable): Renders the page as a str or bytes.
+
+        Returns:
+            tuple: (body bytes, ETag)
+        """
+        with self._lock:
+            entry = self._pages.get(key)
+            if entry is not None:
+                self._pages.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        entry = self._load(key)
+        if entry is not None:
+            with self._lock:
+                self.shared_hits += 1
+        else:
+            body = render()
+            body = body.encode('utf-8') if isinstance(body, str) else body
+            entry = (body, hashlib.sha256(body).hexdigest())
+            with self._lock:
+                self.misses += 1
+            self._store(key, entry)
+
+        with self._lock:
+            self._pages[key] = entry
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.maxsize:
+                self._pages.popitem(last=False)
+        return entry
+
+    def clear(self):
+        """Drops the snapshots kept in memory (the shared file is left to other processes)."""
+        with self._lock:
+            self._pages.clear()
+
+    def stats(self):
+        """Returns the cache counters as a dict for export."""
+        with self._lock:
+            return {'hits': self.hits, 'shared_hits': self.shared_hits, 'misses': self.misses,
+                    'size': len(self._pages), 'maxsize': self.maxsize, 'shared': self.path is not None}
+
+    def _connection(self):
+        """This thread's connection to the shared file, created with its table on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=SNAPSHOT_BUSY_TIMEOUT_SECONDS, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''CREATE TABLE IF NOT EXISTS snapshots (
+                            key TEXT PRIMARY KEY,
+                            body BLOB NOT NULL,
+                            etag TEXT NOT NULL,
+                            stored_at REAL NOT NULL)''')
+            self._local.conn = conn
+        return conn
+
+    def _load(self, key):
+        """Reads a snapshot another process stored, or None (a busy or broken file counts as a miss)."""
+        if self.path is None:
+            return None
+        try:
+            row = self._connection().execute('SELECT body, etag FROM snapshots WHERE key = ?',
+                                             (repr(key),)).fetchone()
+        except sqlite3.Error:
+            return None
+        return None if row is None else (bytes(row[0]), row[1])
+
+    def _store(self, key, entry):
+        """Shares a rendered snapshot, dropping the oldest ones beyond `maxsize`; best effort."""
+        if self.path is None:
+            return
+        try:
+            conn = self._connection()
+            conn.execute('INSERT OR REPLACE INTO snapshots (key, body, etag, stored_at) VALUES (?, ?, ?, ?)',
+                         (repr(key), entry[0], entry[1], time.time()))
+            conn.execute('''DELETE FROM snapshots WHERE key NOT IN (
+                                SELECT key FROM snapshots ORDER BY stored_at DESC LIMIT ?)''', (self.maxsize,))
+        except sqlite3.Error:
+            pass  # Another worker holds the write lock; it is only a cache
+
+
+# Process-wide cache of rendered results pages
+RESULTS_CACHE = SnapshotCache()
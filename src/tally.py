@@ -0,0 +1,436 @@
+"""Tally engine helpers for vote circuits.
+
+Vote circuits built by `Voter.encode_vote` and `Voter.sign_vote` only prepare a
+state with `initialize`, apply basis-permuting gates (X, Y, Z, ...) and measure
+in the computational basis. Their measurement distribution can therefore be
+computed exactly with NumPy, and a whole electorate can be sampled in a single
+vectorized multinomial draw instead of one simulator job per voter.
+
+Since there are only a handful of distinct vote patterns, built and transpiled
+circuits are kept in a process-wide LRU cache keyed by the normalized vote
+vector and the backend target.
+
+With an election seed every ballot is measured with its own random number
+derived from the seed and the ballot's id, so the same ballots always produce
+the same tally, whether they are tallied one by one as they are cast or all at
+once in a recount.
+
+NumPy and Qiskit are imported on first use so that importing this module (and
+the web app) stays cheap; see warmup.py.
+"""
+import hashlib
+import math
+import secrets
+import threading
+from collections import OrderedDict
+from statistics import NormalDist
+
+from metrics import TRANSPILE_SECONDS
+
+# Maximum number of circuits kept by the process-wide circuit cache
+CIRCUIT_CACHE_SIZE = 4096
+
+# Ballots per shard of a parallel tally; fixed so the result does not depend on the worker count
+TALLY_SHARD_SIZE = 10000
+
+# Shots per distinct ballot and confidence level of an estimated tally, see estimate_counts
+DEFAULT_ESTIMATE_SHOTS = 1024
+DEFAULT_CONFIDENCE = 0.95
+# Most shots per distinct ballot an estimate may run; narrower margins are refused
+MAX_ESTIMATE_SHOTS = 1_000_000
+
+# Gates that flip a qubit in the computational basis (up to a phase)
+BIT_FLIP_GATES = {'x', 'y'}
+# Gates that only add a phase and leave measurement probabilities untouched
+PHASE_GATES = {'id', 'z', 's', 'sdg', 't', 'tdg', 'barrier'}
+# Instructions that prepare an arbitrary state on the (still |0...0>) register
+STATE_PREP_INSTRUCTIONS = {'initialize', 'state_preparation'}
+
+
+def outcome_distribution(circuit):
+    """
+    Computes the exact measurement distribution of a vote circuit.
+
+    Args:
+        circuit (QuantumCircuit): A vote circuit.
+
+    Returns:
+        numpy.ndarray | None: Probabilities indexed by the integer value of the classical
+        register, or None if the circuit contains instructions that cannot be handled
+        analytically and has to be simulated instead.
+    """
+    import numpy as np
+
+    num_qubits = circuit.num_qubits
+    basis = np.arange(2 ** num_qubits)
+    probabilities = np.zeros(2 ** num_qubits)
+    probabilities[0] = 1.0
+    prepared = False
+    measured = {}  # qubit index -> clbit index
+
+    for instruction in circuit.data:
+        name = instruction.operation.name
+        qubits = [circuit.find_bit(q).index for q in instruction.qubits]
+
+        if name in STATE_PREP_INSTRUCTIONS:
+            # Only a preparation of the fresh register is a plain amplitude load
+            if prepared or measured:
+                return None
+            amplitudes = np.asarray(instruction.operation.params, dtype=complex)
+            if amplitudes.shape != (2 ** len(qubits),):
+                return None
+            weights = np.abs(amplitudes) ** 2
+            # Scatter the local amplitude indices onto the full register
+            index = np.zeros(len(weights), dtype=np.int64)
+            for position, qubit in enumerate(qubits):
+                index |= ((np.arange(len(weights)) >> position) & 1) << qubit
+            probabilities = np.zeros(2 ** num_qubits)
+            probabilities[index] = weights / weights.sum()
+            prepared = True
+        elif name in BIT_FLIP_GATES:
+            # A flip after the qubit was measured no longer changes the recorded bit
+            if qubits[0] not in measured:
+                probabilities = probabilities[basis ^ (1 << qubits[0])]
+        elif name in PHASE_GATES:
+            continue
+        elif name == 'measure':
+            if qubits[0] in measured:
+                return None
+            measured[qubits[0]] = circuit.find_bit(instruction.clbits[0]).index
+        else:
+            return None
+
+    # Map every basis state onto the classical register value it is measured as
+    outcomes = np.zeros(len(basis), dtype=np.int64)
+    for qubit, clbit in measured.items():
+        outcomes |= ((basis >> qubit) & 1) << clbit
+    distribution = np.zeros(2 ** circuit.num_clbits)
+    np.add.at(distribution, outcomes, probabilities)
+    return distribution
+
+
+def sample_outcomes(distributions, voters=None, rng=None):
+    """
+    Draws one measurement outcome per voter and counts them.
+
+    Identical distributions are grouped so the whole electorate is sampled with a
+    single `Generator.multinomial` call.
+
+    Args:
+        distributions (list): Outcome distributions as returned by `outcome_distribution`.
+        voters (list): Number of voters sharing each distribution (default one each).
+        rng (numpy.random.Generator): Random generator to sample from.
+
+    Returns:
+        numpy.ndarray: Number of voters measured in each outcome.
+    """
+    import numpy as np
+
+    if not distributions:
+        return np.zeros(0, dtype=np.int64)
+    rng = rng if rng is not None else np.random.default_rng()
+    voters = np.ones(len(distributions), dtype=np.int64) if voters is None else np.asarray(voters)
+
+    width = max(len(d) for d in distributions)
+    matrix = np.zeros((len(distributions), width))
+    for row, distribution in enumerate(distributions):
+        matrix[row, :len(distribution)] = distribution
+
+    patterns, pattern_index = np.unique(matrix, axis=0, return_inverse=True)
+    voters_per_pattern = np.bincount(pattern_index.ravel(), weights=voters, minlength=len(patterns))
+    return rng.multinomial(voters_per_pattern.astype(np.int64), patterns).sum(axis=0)
+
+
+def tally_shard(circuits, voters, num_outcomes, seed, simulate=False, backend=None):
+    """
+    Tallies one shard of ballots, the unit of work of a parallel tally.
+
+    Everything random in the shard is derived from `seed`, so the counts only depend
+    on the shard's contents and not on the process or worker that tallies it.
+
+    Args:
+        circuits (list): Distinct vote circuits cast in the shard.
+        voters (list): Number of ballots cast with each circuit.
+        num_outcomes (int): Number of outcomes to count (the size of the returned array).
+        seed (numpy.random.SeedSequence): Seed of this shard.
+        simulate (bool): Run every circuit on a simulator backend instead of sampling it analytically.
+        backend (str): Name of the backend simulating circuits (default: selected per circuit).
+
+    Returns:
+        numpy.ndarray: Number of ballots measured in each outcome.
+    """
+    import numpy as np
+
+    counts = np.zeros(num_outcomes, dtype=np.int64)
+    sample_seed, simulator_seed = seed.spawn(2)
+
+    distributions, distribution_voters, simulated = [], [], []
+    for circuit, shots in zip(circuits, voters):
+        distribution = None if simulate else outcome_distribution(circuit)
+        if distribution is None:
+            simulated.append((circuit, shots))
+        else:
+            distributions.append(distribution)
+            distribution_voters.append(shots)
+
+    sampled = sample_outcomes(distributions, distribution_voters, np.random.default_rng(sample_seed))
+    counts[:min(len(sampled), num_outcomes)] += sampled[:num_outcomes]
+
+    if simulated:
+        from backends import BACKENDS  # backends.py builds on this module
+
+        simulator_seed = int(simulator_seed.generate_state(1)[0])
+        for circuit, shots in simulated:
+            # One shot per ballot sharing the circuit, instead of one single-shot experiment each;
+            # one Aer thread per shard, the parallelism comes from running shards side by side
+            circuit_counts = BACKENDS.run([circuit], shots=shots, seed=simulator_seed, backend=backend,
+                                          max_parallel_threads=1)[0]
+            for outcome, count in circuit_counts.items():
+                if int(outcome, 2) < num_outcomes:
+                    counts[int(outcome, 2)] += count
+    return counts
+
+
+def estimate_counts(outcome_counts, voters, shots, confidence=DEFAULT_CONFIDENCE):
+    """
+    Estimates the expected tally and its confidence intervals from multi-shot runs of each ballot pattern.
+
+    Every pattern's outcome frequencies estimate its measurement probabilities; the
+    expected count of an outcome is their sum weighted by the ballots cast with each
+    pattern. The intervals are Agresti-Coull intervals of each pattern's probabilities,
+    combined over the patterns: unlike the plain normal approximation, they keep their
+    width when a pattern never (or always) produced an outcome, and hold their coverage
+    at small shot counts.
+
+    Args:
+        outcome_counts (numpy.ndarray): Shots measured in each outcome, one row per distinct pattern.
+        voters (numpy.ndarray): Number of ballots cast with each pattern.
+        shots (int): Shots each pattern was run with.
+        confidence (float): Confidence level of the intervals, between 0 and 1.
+
+    Returns:
+        tuple: (expected, low, high) arrays of counts per outcome.
+    """
+    import numpy as np
+
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    voters = np.asarray(voters, dtype=np.float64)
+    outcome_counts = np.asarray(outcome_counts, dtype=np.float64)
+    expected = voters @ (outcome_counts / shots)
+
+    # Agresti-Coull: add z^2 / 2 successes and failures to every pattern before the normal approximation
+    adjusted_shots = shots + z ** 2
+    adjusted = (outcome_counts + z ** 2 / 2) / adjusted_shots
+    center = voters @ adjusted
+    margin = z * np.sqrt((voters ** 2) @ (adjusted * (1 - adjusted)) / adjusted_shots)
+    low = np.clip(center - margin, 0, np.minimum(expected, voters.sum()))
+    high = np.clip(center + margin, expected, voters.sum())
+    return expected, low, high
+
+
+def shots_for_margin(voters, margin, confidence=DEFAULT_CONFIDENCE):
+    """
+    Returns the fewest shots per pattern for which `estimate_counts` intervals are at most `margin` wide.
+
+    Assumes the worst case of every probability being 1/2, so the margin holds
+    whatever the ballots are.
+
+    Args:
+        voters (list): Number of ballots cast with each distinct pattern.
+        margin (float): Largest half-width of an interval, in votes.
+        confidence (float): Confidence level of the intervals, between 0 and 1.
+
+    Returns:
+        int: Shots per pattern.
+
+    Raises:
+        ValueError: If the margin needs more than MAX_ESTIMATE_SHOTS shots.
+    """
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    # Agresti-Coull adds z^2 pseudo-shots, so that many fewer real ones are needed
+    shots = max(1, math.ceil(z ** 2 * sum(n * n for n in voters) / (4 * margin ** 2) - z ** 2))
+    if shots > MAX_ESTIMATE_SHOTS:
+        raise ValueError(f"A margin of {margin:g} vote(s) needs {shots} shots per distinct ballot, more than "
+                         f"the {MAX_ESTIMATE_SHOTS} allowed; ask for a wider margin")
+    return shots
+
+
+def new_seed():
+    """Returns a fresh random election seed (63 bits, so it fits an SQLite INTEGER)."""
+    return secrets.randbits(63)
+
+
+def derive_seed(seed, *keys):
+    """
+    Derives an independent 32-bit seed, e.g. for Aer's `seed_simulator`, from a seed and keys.
+
+    Args:
+        seed (int): The election seed.
+        *keys: Values identifying the use of the derived seed (e.g. a chunk offset).
+
+    Returns:
+        int: The derived seed.
+    """
+    digest = hashlib.blake2b(repr(keys).encode(), key=seed.to_bytes(8, 'big'), digest_size=4).digest()
+    return int.from_bytes(digest, 'big')
+
+
+def ballot_uniforms(seed, ballot_ids):
+    """
+    Derives one uniform random number in [0, 1) per ballot from the election seed.
+
+    Each number only depends on the seed and the ballot id, so a ballot is measured the
+    same way however the ballots are chunked, ordered or distributed over workers.
+
+    Args:
+        seed (int): The election seed.
+        ballot_ids (list): Stable ballot ids (the voters' hash ids).
+
+    Returns:
+        numpy.ndarray: The uniform numbers, in the order of `ballot_ids`.
+    """
+    import numpy as np
+
+    key = seed.to_bytes(8, 'big')
+    # The top 53 bits of a keyed hash convert to a float exactly
+    values = [int.from_bytes(hashlib.blake2b(str(ballot_id).encode(), key=key, digest_size=8).digest(), 'big') >> 11
+              for ballot_id in ballot_ids]
+    return np.array(values, dtype=np.float64) / 2.0 ** 53
+
+
+def sample_ballots(distribution, uniforms):
+    """
+    Measures ballots sharing an outcome distribution by inverse-CDF lookup of their uniforms.
+
+    Args:
+        distribution (numpy.ndarray): Outcome distribution as returned by `outcome_distribution`.
+        uniforms (numpy.ndarray): One uniform number per ballot, see `ballot_uniforms`.
+
+    Returns:
+        numpy.ndarray: Number of ballots measured in each outcome.
+    """
+    import numpy as np
+
+    outcomes = np.searchsorted(np.cumsum(distribution), uniforms, side='right')
+    # Rounding can leave the cumulative sum just below 1; never land on an impossible outcome
+    outcomes = np.minimum(outcomes, np.flatnonzero(distribution)[-1])
+    return np.bincount(outcomes, minlength=len(distribution))
+
+
+def register_width(num_candidates):
+    """Returns the number of qubits needed to hold a vote for `num_candidates` candidates."""
+    return max(1, math.ceil(math.log2(num_candidates)))
+
+
+def vote_pattern(vote):
+    """
+    Normalizes an approval vote vector the same way `Voter.encode_vote` does.
+
+    Args:
+        vote (list): Approval vector (1 for approval, 0 for disapproval).
+
+    Returns:
+        tuple: The normalized amplitudes, usable as a cache key.
+    """
+    total_approvals = sum(vote)
+    if total_approvals == 0:
+        # Voter.encode_vote assigns a default vote for the first candidate
+        vote = [1] + list(vote[1:])
+        total_approvals = 1
+    n = 1 / math.sqrt(total_approvals)
+    return tuple(i * n for i in vote)
+
+
+def backend_target(backend):
+    """Returns the part of the cache key identifying the backend a circuit is compiled for."""
+    return getattr(backend, 'name', type(backend).__name__)
+
+
+class CircuitCache:
+    """
+    Bounded LRU cache of built and transpiled vote circuits.
+
+    Keys are `(vote_pattern, backend_target)` tuples, with a target of None for circuits
+    that have not been transpiled. Cached circuits are shared and must not be mutated.
+    """
+
+    def __init__(self, maxsize=CIRCUIT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._circuits = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, build):
+        """Returns the circuit cached under `key`, calling `build()` to create it on a miss."""
+        with self._lock:
+            circuit = self._circuits.get(key)
+            if circuit is not None:
+                self._circuits.move_to_end(key)
+                self.hits += 1
+                return circuit
+            self.misses += 1
+
+        circuit = build()
+        with self._lock:
+            self._circuits[key] = circuit
+            self._circuits.move_to_end(key)
+            while len(self._circuits) > self.maxsize:
+                self._circuits.popitem(last=False)
+        return circuit
+
+    def clear(self):
+        """Drops every cached circuit and resets the counters."""
+        with self._lock:
+            self._circuits.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Returns the cache counters as a dict for export."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'size': len(self._circuits), 'maxsize': self.maxsize}
+
+
+# Process-wide cache shared by every Voter and Tallyman
+CIRCUIT_CACHE = CircuitCache()
+
+
+def compile_circuits(circuits, backend, cache=CIRCUIT_CACHE):
+    """
+    Transpiles vote circuits for a backend, reusing cached compilations.
+
+    Circuits carrying a `vote` pattern in their metadata are looked up in the cache;
+    the others are transpiled together in one call.
+
+    Args:
+        circuits (list): Vote circuits to compile.
+        backend: The backend to compile for.
+        cache (CircuitCache): Cache holding compiled circuits.
+
+    Returns:
+        list: The compiled circuits, in the same order.
+    """
+    target = backend_target(backend)
+    compiled = [None] * len(circuits)
+    uncached = []
+    for i, circuit in enumerate(circuits):
+        pattern = (circuit.metadata or {}).get('vote')
+        if pattern is None:
+            uncached.append(i)
+        else:
+            compiled[i] = cache.get((pattern, target), lambda c=circuit: timed_transpile(c, backend))
+
+    if uncached:
+        for i, circuit in zip(uncached, timed_transpile([circuits[i] for i in uncached], backend)):
+            compiled[i] = circuit
+    return compiled
+
+
+def timed_transpile(circuits, backend):
+    """Transpiles a circuit or a list of circuits for a backend, recording the time it takes."""
+    from qiskit.compiler import transpile
+
+    with TRANSPILE_SECONDS.time(target=backend_target(backend)):
+        return transpile(circuits, backend)
@@ -0,0 +1,24 @@
+"""Preloading of the heavy quantum and plotting dependencies.
+
+The web apps import qiskit, qiskit_aer, numpy and matplotlib lazily, on the
+first tally, simulation or histogram. Calling `preload()` in the gunicorn
+master (see gunicorn.conf.py) imports them once before the workers are forked,
+so workers share the loaded modules and the first request does not pay for them.
+"""
+import importlib
+
+# Modules imported lazily by app.py, tally.py, blockchain.py and rendering.py
+HEAVY_MODULES = (
+    'numpy',
+    'qiskit',
+    'qiskit.compiler',
+    'qiskit_aer',
+    'matplotlib.figure',
+    'matplotlib.backends.backend_agg',
+)
+
+
+def preload():
+    """Imports every heavy module up front."""
+    for name in HEAVY_MODULES:
+        importlib.import_module(name)
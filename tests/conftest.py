@@ -0,0 +1,53 @@
+"""Test fixtures: every test runs against its own throwaway database.
+
+The app reads its settings when it is imported, so the environment is set up
+before anything from src is imported.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+sys.path.insert(0, SRC_DIR)
+
+os.environ['QVOTE_DATABASE'] = os.path.join(tempfile.mkdtemp(prefix='qvote-tests-'), 'votes.db')
+os.environ['QVOTE_HASH_WORKERS'] = '0'  # Hash inline, tests do not need the process pool
+os.environ['QVOTE_HASH_ITERATIONS'] = '1000'
+os.environ.pop('QVOTE_RESULTS_CACHE', None)
+
+import app as qvote  # noqa: E402
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Points the app at a fresh database with the current schema; yields a connection to it."""
+    monkeypatch.setattr(qvote, 'DATABASE_PATH', str(tmp_path / 'votes.db'))
+    qvote.create_tables()
+    conn = qvote.open_db_connection()
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def client(database):
+    """A test client of the election app, on the fresh database."""
+    qvote.app.config['TESTING'] = True
+    return qvote.app.test_client()
+
+
+@pytest.fixture
+def login(client):
+    """Registers and logs in a user with the test client: login(username)."""
+    def login(username, password='secret'):
+        client.post('/register', data={'username': username, 'password': password})
+        response = client.post('/login', data={'username': username, 'password': password})
+        assert response.status_code == 302, response.data
+        return client
+    return login
+
+
+def wait_for_recounts():
+    """Blocks until the background recounts submitted so far have finished."""
+    qvote.RECOUNT_EXECUTOR.submit(lambda: None).result()
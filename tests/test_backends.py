@@ -0,0 +1,66 @@
+import pytest
+from qiskit import QuantumCircuit
+
+from backends import (BACKENDS, NUMPY_MANY_SHOTS_MAX_QUBITS, NUMPY_MAX_QUBITS, NUMPY_MIN_SHOTS, select_backend,
+                      statevector_distribution)
+
+
+def measured(circuit):
+    circuit.measure_all()
+    return circuit
+
+
+def basis_state(num_qubits):
+    circuit = QuantumCircuit(num_qubits)
+    circuit.x(0)
+    return measured(circuit)
+
+
+def superposition(num_qubits):
+    circuit = QuantumCircuit(num_qubits)
+    circuit.h(0)
+    circuit.t(0)  # Not Clifford, so no backend can shortcut it
+    for qubit in range(1, num_qubits):
+        circuit.cx(0, qubit)
+    return measured(circuit)
+
+
+@pytest.mark.parametrize('circuit, shots, backend', [
+    (basis_state(2), 1, 'classical'),
+    (superposition(2), 1, 'numpy'),
+    (superposition(NUMPY_MAX_QUBITS), 1, 'numpy'),
+    (superposition(NUMPY_MANY_SHOTS_MAX_QUBITS), 1, 'aer_qasm'),
+    (superposition(NUMPY_MANY_SHOTS_MAX_QUBITS), NUMPY_MIN_SHOTS, 'numpy'),
+    (superposition(NUMPY_MANY_SHOTS_MAX_QUBITS + 1), NUMPY_MIN_SHOTS, 'aer_qasm'),
+])
+def test_select_backend(circuit, shots, backend):
+    assert select_backend(BACKENDS, circuit, shots) == backend
+
+
+def test_statevector_distribution_of_a_bell_state():
+    assert statevector_distribution(superposition(2)) == pytest.approx([0.5, 0, 0, 0.5])
+
+
+def test_statevector_distribution_of_a_prepared_state():
+    circuit = QuantumCircuit(2, 2)
+    circuit.initialize([0, 0.6, 0, 0.8], [0, 1])
+    circuit.measure([0, 1], [1, 0])  # Swapped bits
+    assert statevector_distribution(circuit) == pytest.approx([0, 0, 0.36, 0.64])
+
+
+def test_statevector_distribution_gives_up_on_unsupported_circuits():
+    circuit = QuantumCircuit(2, 2)
+    circuit.h(0)
+    circuit.measure(0, 0)
+    circuit.cx(0, 1)  # Entangles the measured qubit
+    assert statevector_distribution(circuit) is None
+
+
+@pytest.mark.parametrize('backend', ['classical', 'numpy', 'aer_qasm'])
+def test_backends_agree_on_certain_outcomes(backend):
+    assert BACKENDS.run([basis_state(3)], shots=100, seed=1, backend=backend) == [{'001': 100}]
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        BACKENDS.get('quantum-annealer')
@@ -0,0 +1,57 @@
+import hashlib
+
+import pytest
+from qiskit import QuantumCircuit
+
+from ballots import BallotStore
+
+
+def hash_id(name):
+    return hashlib.sha256(name.encode()).hexdigest()
+
+
+def vote_circuit(vote):
+    circuit = QuantumCircuit(2)
+    circuit.metadata = {'vote': vote}
+    return circuit
+
+
+def test_store_behaves_like_a_dict():
+    store, expected = BallotStore(capacity=2), {}
+    for i in range(10):
+        circuit = vote_circuit((i % 3,))
+        store[hash_id(f"voter{i}")] = circuit
+        expected[hash_id(f"voter{i}")] = circuit
+    store.add(hash_id('voter4'), vote_circuit((2,)))  # Voting again replaces the vote in place
+    expected[hash_id('voter4')] = store.circuits[2]
+
+    assert len(store) == len(expected) == 10
+    assert list(store) == store.keys() == list(expected)
+    assert list(store.items()) == list(expected.items())
+    assert list(store.values()) == list(expected.values())
+    assert store[hash_id('voter4')] is store.circuits[2]
+    assert len(store.circuits) == 3  # One circuit per distinct vote pattern
+
+
+def test_lookups_of_absent_and_malformed_hash_ids():
+    store = BallotStore()
+    assert store.get(hash_id('voter0')) is None
+    store.add(hash_id('voter0'), vote_circuit((1,)))
+    for missing in [hash_id('voter1'), 'not-a-hash-id', hash_id('voter0')[:32]]:
+        assert missing not in store
+        assert store.get(missing, 'absent') == 'absent'
+        with pytest.raises(KeyError):
+            store[missing]
+    with pytest.raises(ValueError):
+        store.add('abcd', vote_circuit((1,)))
+
+
+def test_find_missing_in_one_lookup():
+    store = BallotStore()
+    for i in range(100):
+        store.add(hash_id(f"voter{i}"), vote_circuit((i % 2,)))
+    wanted = [hash_id('voter5'), hash_id('stranger'), 'nonsense', hash_id('voter99')]
+    missing, counters = store.find_missing(wanted)
+    assert missing == [hash_id('stranger'), 'nonsense']
+    assert counters == {'index_lookups': 4}
+    assert store.stats()['ballots'] == 100
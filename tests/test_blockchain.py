@@ -0,0 +1,43 @@
+import pytest
+
+import blockchain
+
+
+@pytest.fixture
+def client():
+    return blockchain.app.test_client()
+
+
+def test_seeded_simulation_is_reproducible(client):
+    first = client.get('/vote?voters=50&candidates=4&seed=7').get_json()
+    assert client.get('/vote?voters=50&candidates=4&seed=7').get_json()['vote_counts'] == first['vote_counts']
+    assert sum(first['vote_counts'].values()) == 50
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_winner_is_a_candidate(client, seed):
+    response = client.get(f'/vote?voters=3&candidates=3&seed={seed}').get_json()
+    assert response['winner'] < 3
+    assert response['votes'] == max(list(response['vote_counts'].values())[:3])
+
+
+def test_simulation_counts_every_voter_without_drawing_each_vote():
+    counts = blockchain.simulate_votes(10_000_000, 3, seed=1)
+    assert sum(counts.values()) == 10_000_000
+    assert len(counts) == 4  # Every outcome of two qubits
+
+
+def test_histogram_id_holds_the_counts(client):
+    response = client.get('/vote?voters=20&candidates=5&seed=1').get_json()
+    assert blockchain.decode_simulation(response['id']) == response['vote_counts']
+
+    # Any worker can serve it, including one that never ran the simulation
+    histogram = blockchain.app.test_client().get(response['histogram_url'])
+    assert histogram.status_code == 200
+    assert histogram.mimetype == 'image/png'
+
+
+@pytest.mark.parametrize('simulation_id', ['nonsense', 'x' * 20000,
+                                           blockchain.encode_simulation({'0': 1, '1': 2, '10': 3})])
+def test_invalid_histogram_ids(client, simulation_id):
+    assert client.get(f'/vote/{simulation_id}/histogram.png').status_code == 404
@@ -0,0 +1,37 @@
+import hashlib
+
+from bloom import BloomFilter
+
+HEX_IDS = [hashlib.sha256(str(i).encode()).hexdigest() for i in range(500)]
+NAMES = [f"voter-{i}" for i in range(500)]
+
+
+def test_no_false_negatives():
+    bloom = BloomFilter(1000)
+    bloom.add_many(HEX_IDS + NAMES)
+    assert bloom.contains_many(HEX_IDS + NAMES).all()
+
+
+def test_membership_does_not_depend_on_the_rest_of_the_batch():
+    # Items added in a homogeneous batch must be found in a mixed one, and the other way around
+    bloom = BloomFilter(1000)
+    bloom.add_many(HEX_IDS[:250])
+    bloom.add_many(NAMES[:250] + HEX_IDS[250:])
+    assert bloom.contains_many(NAMES[:250] + HEX_IDS).all()
+    assert bloom.contains_many(HEX_IDS[:10]).all()
+    bloom.add_many([HEX_IDS[0].upper()])  # Not lowercase hex, so hashed like any other string
+    assert bloom.contains_many([HEX_IDS[0].upper(), NAMES[0]]).all()
+
+
+def test_false_positive_rate():
+    bloom = BloomFilter(1000, error_rate=0.01)
+    bloom.add_many(HEX_IDS + NAMES)
+    absent = [hashlib.sha256(f"absent{i}".encode()).hexdigest() for i in range(5000)]
+    assert bloom.contains_many(absent).mean() < 0.03
+
+
+def test_empty_batches():
+    bloom = BloomFilter(10)
+    bloom.add_many([])
+    assert len(bloom.contains_many([])) == 0
+    assert bloom.stats()['count'] == 0
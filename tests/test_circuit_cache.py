@@ -0,0 +1,30 @@
+import app as qvote
+from tally import CircuitCache, compile_circuits, vote_pattern
+
+
+def test_voters_with_the_same_vote_share_one_circuit():
+    first = qvote.Voter('alice', '0101', '1010').signed_vote_circuit([0, 1, 0, 0])
+    second = qvote.Voter('bob', '0011', '1100').signed_vote_circuit([0, 1, 0, 0])
+    assert first is second
+    assert first.metadata['vote'] == vote_pattern([0, 1, 0, 0])
+
+
+def test_cache_is_bounded():
+    cache = CircuitCache(maxsize=2)
+    for key in 'abc':
+        cache.get(key, lambda key=key: key)
+    assert cache.get('a', lambda: 'rebuilt') == 'rebuilt'
+    assert cache.get('c', lambda: 'rebuilt') == 'c'
+    assert cache.stats()['size'] == 2
+
+
+def test_compiled_circuits_are_reused():
+    from qiskit_aer import AerSimulator
+
+    cache = CircuitCache()
+    circuit = qvote.Voter('alice', '0101', '1010').signed_vote_circuit([1, 0, 1, 0])
+    backend = AerSimulator()
+    compiled = compile_circuits([circuit, circuit], backend, cache)
+    assert compiled[0] is compiled[1]
+    assert compile_circuits([circuit], backend, cache)[0] is compiled[0]
+    assert cache.stats() == {'hits': 2, 'misses': 1, 'size': 1, 'maxsize': cache.maxsize}
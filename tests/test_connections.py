@@ -0,0 +1,36 @@
+import threading
+
+import app as qvote
+
+
+def pooled_connection():
+    with qvote.app.app_context():
+        return qvote.get_db_connection()
+
+
+def test_a_thread_reuses_its_connection(database):
+    assert pooled_connection() is pooled_connection()
+
+
+def test_threads_get_their_own_connections(database):
+    connections = []
+    thread = threading.Thread(target=lambda: connections.append(pooled_connection()))
+    thread.start()
+    thread.join()
+    assert connections[0] is not pooled_connection()
+
+
+def test_connections_use_wal(database):
+    assert pooled_connection().execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+
+
+def test_uncommitted_work_is_discarded_at_teardown(database):
+    with qvote.app.app_context():
+        qvote.get_db_connection().execute("INSERT INTO users (username, password) VALUES ('ghost', 'x')")
+    assert database.execute("SELECT COUNT(*) FROM users WHERE username = 'ghost'").fetchone()[0] == 0
+
+
+def test_changing_the_database_opens_a_new_connection(database, tmp_path, monkeypatch):
+    first = pooled_connection()
+    monkeypatch.setattr(qvote, 'DATABASE_PATH', str(tmp_path / 'other.db'))
+    assert pooled_connection() is not first
@@ -0,0 +1,30 @@
+import pytest
+
+import app as qvote
+
+
+def test_vote_in_an_election_with_five_candidates(database, login):
+    election_id = qvote.create_election(database, 'Board', [f"Seat {i}" for i in range(5)])
+    database.commit()
+
+    client = login('alice')
+    assert client.post('/vote', data={'candidate': 5, 'election': election_id}).status_code == 302
+    assert qvote.read_tally(database, election_id, 5) == {0: 0, 1: 0, 2: 0, 3: 0, 4: 1}
+
+
+def test_vote_rejects_unknown_candidates(login):
+    assert login('alice').post('/vote', data={'candidate': 5}).status_code == 400
+
+
+@pytest.mark.parametrize('election, status', [('2abc', 400), ('', 400), ('99', 404)])
+def test_malformed_and_unknown_elections(database, login, election, status):
+    client = login('alice')
+    assert client.get(f'/results?election={election}').status_code == status
+    assert client.post('/vote', data={'candidate': 1, 'election': election}).status_code == status
+    assert qvote.read_turnout(database, qvote.DEFAULT_ELECTION_ID) == 0
+
+
+def test_schema_has_no_index_on_the_global_voted_flag(database):
+    indexes = {row['name'] for row in database.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert 'idx_votes_election_user' in indexes
+    assert 'idx_users_has_voted' not in indexes
@@ -0,0 +1,63 @@
+import json
+import threading
+
+import app as qvote
+from events import EventLog
+
+
+def test_subscribers_replay_from_their_cursor():
+    log = EventLog(size=4)
+    cursor = log.head
+    for turnout in range(1, 4):
+        log.publish({'turnout': turnout})
+
+    events, cursor, lost = log.read(cursor)
+    assert [event['turnout'] for event in events] == [1, 2, 3]
+    assert (cursor, lost) == (3, False)
+    assert log.read(cursor, timeout=0.01) == ([], 3, False)
+
+
+def test_subscribers_that_fall_behind_are_told_to_resynchronise():
+    log = EventLog(size=4)
+    for turnout in range(6):
+        log.publish({'turnout': turnout})
+
+    events, cursor, lost = log.read(0)
+    assert [event['turnout'] for event in events] == [2, 3, 4, 5]  # Only what the ring still holds
+    assert (cursor, lost) == (6, True)
+
+
+def test_readers_wake_up_on_publish():
+    log = EventLog()
+    timer = threading.Timer(0.05, log.publish, [{'turnout': 1}])
+    timer.start()
+    events, _, _ = log.read(log.head, timeout=5)
+    timer.join()
+    assert events == [{'turnout': 1}]
+
+
+def read_event(chunks):
+    """Reads the next server-sent event from a streamed response, skipping retry and keep-alive lines."""
+    for chunk in chunks:
+        message = chunk.decode()
+        if message.startswith('event: '):
+            name, data = message.split('\n')[:2]
+            return name[len('event: '):], json.loads(data[len('data: '):])
+    raise AssertionError("Stream ended without an event")
+
+
+def test_results_stream_sends_a_snapshot_then_votes(database, login, monkeypatch):
+    monkeypatch.setattr(qvote, 'STREAM_KEEPALIVE_SECONDS', 0.05)
+    monkeypatch.setattr(qvote, 'STREAM_MAX_SECONDS', 5)
+    election = qvote.load_election(database, qvote.DEFAULT_ELECTION_ID)
+    user_id = database.execute("INSERT INTO users (username, password) VALUES ('bob', 'x')").lastrowid
+    database.commit()
+
+    response = login('alice').get('/results/stream', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    chunks = iter(response.response)
+    assert read_event(chunks) == ('snapshot', {'election': election['id'], 'turnout': 0, 'counts': [0, 0, 0, 0]})
+
+    qvote.cast_vote(database, election, user_id, 'bob', 2)
+    assert read_event(chunks) == ('vote', {'election': election['id'], 'turnout': 1, 'delta': {'2': 1}})
+    response.close()
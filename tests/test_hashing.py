@@ -0,0 +1,47 @@
+import threading
+
+import pytest
+
+import app as qvote
+from hashing import HasherBusy, HashingExecutor, verify_password
+
+
+def test_hashes_verify():
+    hasher = HashingExecutor(workers=0, queue_size=1)
+    password_hash = hasher.hash('secret')
+    assert hasher.verify(password_hash, 'secret')
+    assert not verify_password(password_hash, 'wrong')
+    assert hasher.stats()['completed'] == 2
+
+
+def test_saturated_executor_rejects_work():
+    hasher = HashingExecutor(workers=0, queue_size=1)
+    started, release = threading.Event(), threading.Event()
+
+    def slow_hash():
+        started.set()
+        release.wait(5)
+        return 'done'
+
+    worker = threading.Thread(target=hasher.run, args=(slow_hash,))
+    worker.start()
+    started.wait(5)
+    try:
+        with pytest.raises(HasherBusy):
+            hasher.hash('secret')
+    finally:
+        release.set()
+        worker.join()
+    stats = hasher.stats()
+    assert (stats['rejected'], stats['completed'], stats['queue_depth']) == (1, 1, 0)
+    assert hasher.hash('secret')  # The slot is free again
+
+
+def test_saturated_hasher_is_served_as_503(client, monkeypatch):
+    hasher = HashingExecutor(workers=0, queue_size=1)
+    hasher._slots.acquire()  # Another request holds the only slot
+    monkeypatch.setattr(qvote, 'HASHER', hasher)
+
+    response = client.post('/register', data={'username': 'alice', 'password': 'secret'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
@@ -0,0 +1,43 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import app as qvote
+
+
+def rows(*entries):
+    return [dict(zip(('username', 'password', 'candidate'), entry)) for entry in entries]
+
+
+def test_import_batch_counts_users_votes_and_skipped_rows(database):
+    database.execute("INSERT INTO users (username, password) VALUES ('alice', 'x')")
+    database.commit()
+    election = qvote.load_election(database, qvote.DEFAULT_ELECTION_ID)
+
+    batch = rows(('alice', 'pw', '2'),  # Existing user, ballot recorded
+                 ('bob', 'pw', '1'),
+                 ('bob', 'other', '3'),  # Repeated username
+                 ('carol', 'pw', ''),  # New user without a ballot
+                 ('dave', '', '1'),  # No password
+                 ('erin', 'pw', '9'))  # Unknown candidate
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        assert qvote.import_batch(database, election, batch, pool) == (2, 2, 3)
+        # Importing the same rows again adds nothing
+        assert qvote.import_batch(database, election, batch, pool) == (0, 0, 6)
+
+    assert qvote.read_turnout(database, election['id']) == 2
+    assert sum(qvote.read_tally(database, election['id'], 4).values()) == 2
+    password = database.execute("SELECT password FROM users WHERE username = 'alice'").fetchone()[0]
+    assert password == 'x'  # Existing users keep their password
+
+
+def test_import_voters_command(database, tmp_path):
+    path = tmp_path / 'voters.jsonl'
+    path.write_text('\n'.join(json.dumps({'username': f"voter{i}", 'password': 'pw', 'candidate': i % 4 + 1})
+                              for i in range(20)))
+
+    result = qvote.app.test_cli_runner().invoke(args=['import-voters', str(path), '--batch-size', '7',
+                                                      '--workers', '1'])
+    assert result.exit_code == 0, result.output
+    assert 'Done: 20 users and 20 votes added, 0 rows skipped' in result.output
+    assert qvote.read_tally(database, qvote.DEFAULT_ELECTION_ID, 4) == {0: 5, 1: 5, 2: 5, 3: 5}
+    assert database.execute('SELECT COUNT(*) FROM ledger_entries').fetchone()[0] == 20
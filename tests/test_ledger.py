@@ -0,0 +1,90 @@
+import hashlib
+
+import pytest
+
+import app as qvote
+from ledger import BallotIndex, append_entries, head_block, inclusion_proof, seal_blocks, verify_chain, verify_proof
+
+
+def hash_id(name):
+    return hashlib.sha256(name.encode()).hexdigest()
+
+
+def entries(names):
+    return [(hash_id(name), hashlib.sha256(b'vote:' + name.encode()).digest()) for name in names]
+
+
+@pytest.fixture
+def two_elections(database):
+    second = qvote.create_election(database, 'Second', ['A', 'B'])
+    append_entries(database, qvote.DEFAULT_ELECTION_ID, entries(f"voter{i}" for i in range(10)), block_size=4)
+    append_entries(database, second, entries(['voter0', 'other']), block_size=4)
+    seal_blocks(database, block_size=4, force=True)
+    database.commit()
+    return qvote.DEFAULT_ELECTION_ID, second
+
+
+def test_proofs_verify_against_the_chain(database, two_elections):
+    first, _ = two_elections
+    assert verify_chain(database) == []
+    for i in range(10):
+        proof = inclusion_proof(database, first, hash_id(f"voter{i}"))
+        assert verify_proof(proof)
+
+
+def test_tampering_is_detected(database, two_elections):
+    database.execute('UPDATE ledger_entries SET digest = ? WHERE seq = 2', (b'\0' * 32,))
+    assert verify_chain(database)
+
+
+def test_hash_ids_are_scoped_to_their_election(database, two_elections):
+    first, second = two_elections
+    assert inclusion_proof(database, first, hash_id('voter0'))['election'] == first
+    assert inclusion_proof(database, second, hash_id('voter0'))['election'] == second
+    assert inclusion_proof(database, second, hash_id('voter1')) is None
+
+
+def test_blocks_are_sealed_once_full(database):
+    election_id = qvote.DEFAULT_ELECTION_ID
+    append_entries(database, election_id, entries(['a', 'b', 'c']), block_size=4)
+    assert head_block(database) is None
+    assert seal_blocks(database, block_size=4) == []  # Still short of a block
+
+    append_entries(database, election_id, entries(['d', 'e']), block_size=4)
+    assert (head_block(database)['first_seq'], head_block(database)['last_seq']) == (1, 4)
+    assert inclusion_proof(database, election_id, hash_id('e'))['status'] == 'pending'
+    assert seal_blocks(database, block_size=4, force=True) == [1]
+    assert seal_blocks(database, block_size=4, force=True) == []  # Nothing pending
+    assert verify_chain(database) == []
+
+
+def test_ledger_proof_of_own_ballot(login):
+    client = login('alice')
+    client.post('/vote', data={'candidate': 2})
+    conn = qvote.open_db_connection()
+    seal_blocks(conn, force=True)
+    conn.commit()
+
+    proof = client.get('/ledger/proof').get_json()
+    assert proof['status'] == 'sealed'
+    assert verify_proof(proof, head_block(conn)['block_hash'].hex())
+    assert verify_chain(conn) == []
+    conn.close()
+
+
+@pytest.mark.parametrize('bloom', [True, False])
+def test_ballot_index_finds_missing_ballots_per_election(database, two_elections, bloom):
+    first, second = two_elections
+    index = BallotIndex(bloom=bloom)
+    wanted = [hash_id('voter0'), hash_id('voter1'), hash_id('other'), 'not-a-hash-id']
+
+    assert index.find_missing(database, first, wanted)[0] == [hash_id('other'), 'not-a-hash-id']
+    assert index.find_missing(database, second, wanted)[0] == [hash_id('voter1'), 'not-a-hash-id']
+
+
+def test_ballot_index_sees_ballots_appended_later(database, two_elections):
+    first, _ = two_elections
+    index = BallotIndex()
+    assert index.find_missing(database, first, [hash_id('late')])[0] == [hash_id('late')]
+    append_entries(database, first, entries(['late']))
+    assert index.find_missing(database, first, [hash_id('late')])[0] == []
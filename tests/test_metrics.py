@@ -0,0 +1,46 @@
+import re
+
+from metrics import EXPOSITION_CONTENT_TYPE, MetricsRegistry
+
+# A sample line: name, optional {label="value",...} and a value
+SAMPLE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{([a-zA-Z_][a-zA-Z0-9_]*="([^"\\]|\\.)*",?)*\})? \S+$')
+
+
+def test_histogram_exposition():
+    registry = MetricsRegistry()
+    histogram = registry.histogram('test_seconds', 'Test timings.', ('kind',), buckets=(0.1, 1.0))
+    histogram.observe(0.05, kind='a "quoted"\nkind')
+    histogram.observe(0.5, kind='a "quoted"\nkind')
+    histogram.observe(5, kind='a "quoted"\nkind')
+    registry.counter('test_total', 'Test events.').inc(3)
+    registry.callback('test_depth', 'Test queue depth.', lambda: 2)
+
+    assert registry.exposition().splitlines() == [
+        '# HELP test_depth Test queue depth.',
+        '# TYPE test_depth gauge',
+        'test_depth 2',
+        '# HELP test_seconds Test timings.',
+        '# TYPE test_seconds histogram',
+        'test_seconds_bucket{kind="a \\"quoted\\"\\nkind",le="0.1"} 1',
+        'test_seconds_bucket{kind="a \\"quoted\\"\\nkind",le="1.0"} 2',
+        'test_seconds_bucket{kind="a \\"quoted\\"\\nkind",le="+Inf"} 3',
+        'test_seconds_sum{kind="a \\"quoted\\"\\nkind"} 5.55',
+        'test_seconds_count{kind="a \\"quoted\\"\\nkind"} 3',
+        '# HELP test_total Test events.',
+        '# TYPE test_total counter',
+        'test_total 3',
+    ]
+
+
+def test_metrics_endpoint(login):
+    client = login('alice')
+    client.post('/vote', data={'candidate': 2})
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.headers['Content-Type'] == EXPOSITION_CONTENT_TYPE
+    text = response.get_data(as_text=True)
+    for line in text.splitlines():
+        assert line.startswith('# HELP ') or line.startswith('# TYPE ') or SAMPLE.match(line), line
+    assert re.search(r'^qvote_votes_cast_total [1-9]', text, re.MULTILINE)
+    assert re.search(r'^qvote_request_seconds_count\{.*endpoint="vote".*\} [1-9]', text, re.MULTILINE)
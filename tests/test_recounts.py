@@ -0,0 +1,76 @@
+import sqlite3
+import threading
+
+import app as qvote
+from conftest import wait_for_recounts
+from jobs import StateKeyedJob
+
+
+def test_results_page_shows_the_recount_and_revalidates(login):
+    client = login('alice')
+    client.post('/vote', data={'candidate': 3})
+
+    client.get('/results')  # Starts the recount shown on the page
+    wait_for_recounts()
+    status = client.get('/results/status').get_json()
+    assert (status['status'], status['last_state'], status['last_result']) == ('idle', [1, 1], [0, 0, 1, 0])
+
+    page = client.get('/results')
+    assert page.status_code == 200
+    assert b'Latest full quantum recount (1 vote(s))' in page.data
+    assert client.get('/results', headers={'If-None-Match': page.headers['ETag']}).status_code == 304
+
+
+def test_each_state_is_recounted_once_across_processes(database):
+    runs = []
+    started, release = threading.Event(), threading.Event()
+
+    def recount(state, progress):
+        runs.append(state)
+        started.set()
+        release.wait(5)
+        return [len(runs)]
+
+    # Two jobs of the same name stand for the same recount in two web workers
+    first = StateKeyedJob('recount-1', recount, qvote.open_db_connection)
+    second = StateKeyedJob('recount-1', recount, qvote.open_db_connection)
+    assert first.refresh(database, [1, 5])
+    started.wait(5)
+    assert not second.refresh(database, [1, 5])  # Running elsewhere
+    assert second.status(database)['status'] == 'running'
+    release.set()
+    first._executor.shutdown(wait=True)
+
+    assert not second.refresh(database, [1, 5])  # Already done
+    assert first.status(database) == second.status(database)
+    assert second.status(database)['last_result'] == [1]
+    assert runs == [[1, 5]]
+
+
+def test_stale_runs_are_claimed_again(database):
+    job = StateKeyedJob('recount-1', lambda state, progress: [], qvote.open_db_connection, stale_after=60)
+    database.execute("INSERT INTO jobs (name, running_state, heartbeat_at) VALUES ('recount-1', '[1, 5]', 0)")
+    database.commit()  # A run whose process died long ago
+
+    assert job.refresh(database, [1, 5])
+    job._executor.shutdown(wait=True)
+    assert job.status(database)['last_state'] == [1, 5]
+
+
+def test_recount_status_does_not_expose_tracebacks(login, monkeypatch):
+    def failing_recount(state, progress):
+        raise sqlite3.OperationalError(f"disk I/O error in {qvote.DATABASE_PATH}")
+
+    client = login('alice')
+    job = StateKeyedJob('recount-test', failing_recount, qvote.open_db_connection)
+    monkeypatch.setitem(qvote.RECOUNT_JOBS, qvote.DEFAULT_ELECTION_ID, job)
+    conn = qvote.open_db_connection()
+    job.refresh(conn, ['test', 1])
+    job._executor.shutdown(wait=True)
+    assert not job.refresh(conn, ['test', 1])  # A failed state is not retried
+    conn.close()
+
+    status = client.get('/results/status').get_json()
+    assert status['status'] == 'failed'
+    assert status['last_error'] == 'OperationalError'
+    assert qvote.DATABASE_PATH not in str(status)
@@ -0,0 +1,99 @@
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+import app as qvote
+from conftest import SRC_DIR
+
+# Schema of the databases created before the tally, election and ledger tables existed
+BASELINE_SCHEMA = '''
+CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT NOT NULL UNIQUE,
+                    password TEXT NOT NULL, has_voted BOOLEAN NOT NULL DEFAULT 0);
+CREATE TABLE votes (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, candidate INTEGER NOT NULL,
+                    FOREIGN KEY (user_id) REFERENCES users (id));
+'''
+
+
+@pytest.fixture
+def baseline_database(tmp_path, monkeypatch):
+    """A database with the baseline schema and votes; yields a function adding (username, candidate) votes."""
+    path = str(tmp_path / 'baseline.db')
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    monkeypatch.setattr(qvote, 'DATABASE_PATH', path)
+
+    def add_votes(*votes):
+        for username, candidate in votes:
+            user = conn.execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone()
+            user_id = user[0] if user else conn.execute(
+                "INSERT INTO users (username, password, has_voted) VALUES (?, 'x', 1)", (username,)).lastrowid
+            conn.execute('INSERT INTO votes (user_id, candidate) VALUES (?, ?)', (user_id, candidate))
+        conn.commit()
+    yield add_votes
+    conn.close()
+
+
+def test_importing_the_app_leaves_the_database_alone(tmp_path):
+    path = tmp_path / 'untouched.db'
+    subprocess.run([sys.executable, '-c', 'import app'], cwd=SRC_DIR, check=True,
+                   env={'QVOTE_DATABASE': str(path), 'PATH': ''})
+    assert not path.exists()
+
+
+def test_first_connection_migrates_a_baseline_database(baseline_database):
+    baseline_database(('alice', 2), ('bob', 0), ('carol', 2))
+    with qvote.app.app_context():
+        conn = qvote.get_db_connection()
+        assert qvote.read_tally(conn, qvote.DEFAULT_ELECTION_ID, 4) == {0: 1, 1: 0, 2: 2, 3: 0}
+        assert qvote.read_turnout(conn, qvote.DEFAULT_ELECTION_ID) == 3
+        assert conn.execute('SELECT COUNT(*) FROM ledger_entries').fetchone()[0] == 3
+
+
+def test_init_db_command(baseline_database):
+    result = qvote.app.test_cli_runner().invoke(args=['init-db'])
+    assert result.exit_code == 0, result.output
+    qvote.create_tables()  # Running it again changes nothing
+    conn = qvote.open_db_connection()
+    tables = {row['name'] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {'users', 'elections', 'candidates', 'votes', 'tallies', 'ledger_entries'} <= tables
+    assert conn.execute('SELECT COUNT(*) FROM elections').fetchone()[0] == 1
+    conn.close()
+
+
+def test_cast_votes_update_the_persisted_tally(database):
+    election = qvote.load_election(database, qvote.DEFAULT_ELECTION_ID)
+    for username, candidate in [('alice', 1), ('bob', 1), ('carol', 3)]:
+        user_id = database.execute("INSERT INTO users (username, password) VALUES (?, 'x')", (username,)).lastrowid
+        database.commit()
+        qvote.cast_vote(database, election, user_id, username, candidate)
+    assert qvote.read_tally(database, election['id'], 4) == {0: 0, 1: 2, 2: 0, 3: 1}
+    assert qvote.rebuild_tally(database) == {election['id']: {0: 0, 1: 2, 2: 0, 3: 1}}
+
+
+def test_migration_drops_duplicate_votes(baseline_database):
+    # Alice voted twice through the old check-then-insert race; her first vote counts
+    baseline_database(('alice', 1), ('bob', 0), ('alice', 3))
+    with qvote.app.app_context():
+        conn = qvote.get_db_connection()
+        assert qvote.read_tally(conn, qvote.DEFAULT_ELECTION_ID, 4) == {0: 1, 1: 1, 2: 0, 3: 0}
+        assert qvote.read_turnout(conn, qvote.DEFAULT_ELECTION_ID) == 2
+        assert conn.execute('SELECT COUNT(*) FROM ledger_entries').fetchone()[0] == 2
+
+
+def test_cast_vote_records_the_ballot_once(database):
+    election = qvote.load_election(database, qvote.DEFAULT_ELECTION_ID)
+    user_id = database.execute("INSERT INTO users (username, password) VALUES ('alice', 'x')").lastrowid
+    database.commit()
+
+    assert qvote.cast_vote(database, election, user_id, 'alice', 1)
+    assert not qvote.cast_vote(database, election, user_id, 'alice', 3)
+    assert qvote.read_tally(database, election['id'], 4) == {0: 0, 1: 1, 2: 0, 3: 0}
+    assert qvote.read_turnout(database, election['id']) == 1
+
+
+def test_elections_always_have_a_seed(database):
+    assert qvote.load_election(database, qvote.DEFAULT_ELECTION_ID)['seed'] is not None
+    with pytest.raises(sqlite3.IntegrityError):
+        database.execute("INSERT INTO elections (name) VALUES ('Unseeded')")
@@ -0,0 +1,66 @@
+import app as qvote
+from conftest import wait_for_recounts
+from snapshots import SnapshotCache
+
+
+def test_renders_once_per_key():
+    cache = SnapshotCache(maxsize=4)
+    renders = []
+
+    def render():
+        renders.append(1)
+        return 'page'
+
+    body, etag = cache.get(('results', 1, 0), render)
+    assert cache.get(('results', 1, 0), render) == (b'page', etag)
+    assert len(renders) == 1
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+def test_etag_follows_the_body():
+    cache = SnapshotCache()
+    assert cache.get('a', lambda: 'one')[1] != cache.get('b', lambda: 'two')[1]
+    assert cache.get('a', lambda: 'one')[1] == cache.get('c', lambda: 'one')[1]
+
+
+def test_evicts_least_recently_used():
+    cache = SnapshotCache(maxsize=2)
+    cache.get('a', lambda: 'a')
+    cache.get('b', lambda: 'b')
+    cache.get('a', lambda: 'unused')
+    cache.get('c', lambda: 'c')
+    assert cache.get('a', lambda: 'again')[0] == b'a'
+    assert cache.get('b', lambda: 'rerendered')[0] == b'rerendered'
+
+
+def test_shared_file_serves_other_processes(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    SnapshotCache(path=path).get('page', lambda: 'rendered once')
+    other = SnapshotCache(path=path)
+    assert other.get('page', lambda: 'rendered twice')[0] == b'rendered once'
+    assert other.stats()['shared_hits'] == 1
+
+
+def test_votes_bump_the_election_version(database):
+    election = qvote.load_election(database, qvote.DEFAULT_ELECTION_ID)
+    user_id = database.execute("INSERT INTO users (username, password) VALUES ('alice', 'x')").lastrowid
+    database.commit()
+
+    qvote.cast_vote(database, election, user_id, 'alice', 1)
+    updated = qvote.load_election(database, election['id'])
+    assert updated['version'] == election['version'] + 1
+    assert updated['modified_at'] >= election['modified_at']
+
+
+def test_results_page_changes_with_new_votes(login):
+    client = login('alice')
+    client.post('/vote', data={'candidate': 1})
+    client.get('/results')  # Starts the recount shown on the page
+    wait_for_recounts()
+    page = client.get('/results')
+    assert page.last_modified is not None
+    assert client.get('/results', headers={'If-None-Match': page.headers['ETag']}).status_code == 304
+
+    client = login('bob')
+    client.post('/vote', data={'candidate': 2})
+    assert client.get('/results', headers={'If-None-Match': page.headers['ETag']}).status_code == 200
@@ -0,0 +1,129 @@
+import numpy as np
+import pytest
+
+import app as qvote
+from tally import MAX_ESTIMATE_SHOTS, estimate_counts, outcome_distribution, shots_for_margin
+
+BALLOTS = [(f"voter{i}", i % 4) for i in range(40)]
+APPROVALS = [(1, 1, 0, 0), (0, 1, 1, 1), (1, 0, 0, 1)]
+
+
+def approval_tallyman(seed, voters=60):
+    tallyman = qvote.Tallyman(4, seed)
+    for i in range(voters):
+        voter = qvote.Voter(f"voter{i}", '0000', '0000')
+        tallyman.store_vote(voter.hash_id, voter.signed_vote_circuit(list(APPROVALS[i % len(APPROVALS)])))
+    return tallyman
+
+
+@pytest.mark.parametrize('options', [{'mode': 'batched'}, {'mode': 'batched', 'chunk_size': 7}, {'mode': 'serial'}])
+def test_single_choice_ballots_tally_to_their_candidate(options):
+    assert qvote.tally_ballots(BALLOTS, 4, seed=1, **options) == {0: 10, 1: 10, 2: 10, 3: 10}
+
+
+def test_candidates_beyond_a_power_of_two():
+    ballots = [(f"voter{i}", i % 5) for i in range(25)]
+    assert qvote.tally_ballots(ballots, 5, seed=1) == {candidate: 5 for candidate in range(5)}
+
+
+def test_seeded_tally_is_reproducible():
+    first = approval_tallyman(seed=42).tally_votes()
+    assert approval_tallyman(seed=42).tally_votes() == first
+    assert sum(first.values()) == 60
+
+
+def test_seeded_tally_does_not_depend_on_batching(database):
+    election = qvote.load_election(database, qvote.DEFAULT_ELECTION_ID)
+    for i, (username, candidate) in enumerate(BALLOTS):
+        database.execute('INSERT INTO users (username, password) VALUES (?, ?)', (username, 'x'))
+        database.execute('INSERT INTO votes (election_id, user_id, candidate) VALUES (?, ?, ?)',
+                         (election['id'], i + 1, candidate))
+    database.commit()
+
+    whole = qvote.tally_ballot_batches(database, election, batch_size=1000)
+    assert qvote.tally_ballot_batches(database, election, batch_size=3) == whole
+    assert whole == ({0: 10, 1: 10, 2: 10, 3: 10}, 40)
+
+
+def test_unknown_tally_mode():
+    with pytest.raises(ValueError):
+        qvote.tally_ballots(BALLOTS, 4, mode='quantum')
+
+
+def test_analytic_tally_matches_the_simulated_one():
+    assert qvote.tally_ballots(BALLOTS, 4, seed=1) == qvote.tally_ballots(BALLOTS, 4, seed=1, mode='batched')
+
+
+def test_outcome_distribution_of_an_approval_vote():
+    voter = qvote.Voter('voter', '0000', '0000')
+    distribution = outcome_distribution(voter.signed_vote_circuit([1, 1, 0, 0]))
+    assert distribution == pytest.approx([0.5, 0.5, 0, 0])
+
+
+def test_outcome_distribution_gives_up_on_unsupported_gates():
+    from qiskit import QuantumCircuit
+
+    circuit = QuantumCircuit(1, 1)
+    circuit.h(0)
+    circuit.measure(0, 0)
+    assert outcome_distribution(circuit) is None
+
+
+@pytest.mark.parametrize('workers', [0, 2])
+def test_parallel_tally_does_not_depend_on_the_worker_count(workers):
+    inline = qvote.tally_ballots(BALLOTS, 4, seed=1, mode='parallel', chunk_size=15, workers=0)
+    assert qvote.tally_ballots(BALLOTS, 4, seed=1, mode='parallel', chunk_size=15, workers=workers) == inline
+    assert inline == {0: 10, 1: 10, 2: 10, 3: 10}
+
+
+def test_rebuild_shards_on_workers_match_the_inline_rebuild(database):
+    election = qvote.load_election(database, qvote.DEFAULT_ELECTION_ID)
+    database.executemany('INSERT INTO users (username, password) VALUES (?, ?)',
+                         [(username, 'x') for username, _ in BALLOTS])
+    database.executemany('INSERT INTO votes (election_id, user_id, candidate) VALUES (?, ?, ?)',
+                         [(election['id'], i + 1, candidate) for i, (_, candidate) in enumerate(BALLOTS)])
+    database.commit()
+
+    inline = qvote.tally_ballot_batches(database, election, batch_size=15)
+    assert qvote.tally_ballot_batches(database, election, batch_size=15, workers=2) == inline
+
+
+def test_estimate_intervals_are_never_empty_at_certain_outcomes():
+    # A single-choice ballot always measures its candidate, so the frequencies are exactly 0 and 1
+    expected, low, high = estimate_counts(np.array([[0, 64, 0, 0]]), [10], 64)
+    assert list(expected) == [0, 10, 0, 0]
+    assert np.all(low <= expected) and np.all(expected <= high)
+    assert high[0] > 0 and low[1] < 10
+
+
+def test_estimate_intervals_cover_the_true_counts():
+    rng = np.random.default_rng(0)
+    covered = 0
+    for _ in range(500):
+        measured = rng.binomial(20, 0.05)
+        _, low, high = estimate_counts(np.array([[measured, 20 - measured]]), [100], 20)
+        covered += low[0] <= 5 <= high[0]
+    assert covered / 500 >= 0.93
+
+
+def test_shots_for_margin_bounds_the_interval_width():
+    shots = shots_for_margin([30, 70], margin=5)
+    _, low, high = estimate_counts(np.array([[shots // 2, shots - shots // 2]] * 2), [30, 70], shots)
+    assert np.all((high - low) / 2 <= 5)
+
+
+def test_shots_for_margin_refuses_margins_beyond_the_cap():
+    with pytest.raises(ValueError):
+        shots_for_margin([10 ** 6], margin=0.5)
+    assert shots_for_margin([10], margin=1) <= MAX_ESTIMATE_SHOTS
+
+
+def test_estimate_election(database):
+    election = qvote.load_election(database, qvote.DEFAULT_ELECTION_ID)
+    for i, (username, candidate) in enumerate(BALLOTS[:8]):
+        database.execute('INSERT INTO users (username, password) VALUES (?, ?)', (username, 'x'))
+        database.execute('INSERT INTO votes (election_id, user_id, candidate) VALUES (?, ?, ?)',
+                         (election['id'], i + 1, candidate))
+    estimate = qvote.estimate_election(database, election, shots=256)
+    assert estimate['shots'] == 256
+    assert [round(count['expected']) for count in estimate['counts'].values()] == [2, 2, 2, 2]